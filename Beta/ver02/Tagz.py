@@ -21,18 +21,31 @@ Created on Sat May 10 19:18:00 2025
 import os
 import json
 import re
-import tempfile
 import shutil
 import sys
 from datetime import datetime
 import configparser
 import subprocess
 import importlib.util
+import argparse
+import difflib
+import threading
+import queue
+import heapq
+import itertools
+import time
+import hashlib
+import io
+import codecs
+import functools
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter, OrderedDict
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import fitz
 import pygame
-from PIL import Image, ImageTk
+from PIL import Image, ImageTk, ImageDraw
 from PIL import ImageFile
 from PIL.Image import Resampling
 from humanize import naturalsize
@@ -42,7 +55,9 @@ from mutagen.flac import FLAC
 from mutagen.oggvorbis import OggVorbis
 from mutagen.aiff import AIFF
 from mutagen.wave import WAVE
+from mutagen import File as MutagenFile
 import cv2
+import numpy as np
 
 packages = ["os","json","re","tkinter","tempfile","shutil","sys","PIL",
             "pygame","threading","datetime","configparser","subprocess",
@@ -69,13 +84,192 @@ else:
 # Configuration file
 CONFIG_FILE = "tagz_config.ini"
 TAG_FILE = "tags.json"
+RULES_FILE = "tagz_rules.json"
+# Paths the auto-tagging rules have already been applied to, kept across
+# sessions so tags the user removed are not added back
+RULES_SEEN_FILE = "tagz_rules_seen.json"
+RULES_SEEN_LOCK = threading.Lock()
+# File list virtualization: above this many rows only the rows in (and just
+# below) the viewport are materialised in the Treeview.
+VIRTUAL_LIST_THRESHOLD = 2000
+VIRTUAL_LIST_OVERSCAN = 2
+# Name filter: wait this long after the last keystroke, then scan the file
+# list in chunks so that a newer query can cancel a stale pass.
+FILTER_DEBOUNCE_MS = 150
+FILTER_CHUNK_SIZE = 5000
+# Quiet period after the keyboard moves the list selection before the
+# preview follows it
+SELECT_DEBOUNCE_MS = 80
+# Quiet period after the preview pane is resized before it is redrawn
+PREVIEW_RESIZE_DEBOUNCE_MS = 120
+# Filename search: fuzzy matches need at least this similarity to a run of
+# words in the name
+FUZZY_MIN_SCORE = 0.75
+FUZZY_WORD_SPLIT = re.compile(r"[^0-9a-z]+")
+# Sorting: file types in display order, and how many sorted orders of the
+# current filter result to keep for quick column switching
+FILE_TYPE_ORDER = {file_type: rank for rank, file_type in enumerate(
+    ["video", "audio", "image", "document", "code", "archive", "ebook",
+     "font", "other"])}
+SORT_CACHE_SIZE = 8
+NATURAL_SORT_SPLIT = re.compile(r"(\d+)")
+# Background tasks: lower numbers run first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+SCHEDULER_THREADS = 4
+SCHEDULER_POLL_MS = 25
+# Tag files, moves and scans share one serial lane so they never race
+TAG_IO_LANE = "tags"
+# PyMuPDF documents are not thread-safe, so all PDF rendering runs on one
+# lane; open documents and rendered pages are kept in small LRUs
+PDF_LANE = "pdf"
+PDF_DOCUMENT_CACHE_SIZE = 4
+PDF_PAGE_CACHE_SIZE = 24
+# How long closing the window waits for the page being rendered before the
+# documents are closed (seconds)
+PDF_CLOSE_TIMEOUT = 2
+# Zoomed image views are built from ZOOM_TILE pixel tiles decoded on their
+# own lane; the tile cache holds a few screenfuls for the current viewport
+ZOOM_LANE = "zoom"
+ZOOM_TILE = 256
+ZOOM_CACHE_SCREENS = 3
+# Sources that cannot be decoded tile by tile are decoded whole, once, if
+# they have at most ZOOM_MAX_DECODE_PIXELS, and kept downscaled to at most
+# ZOOM_BASE_PIXELS; LARGE_IMAGE_LOCK guards lifting Pillow's
+# decompression bomb limit to open gigapixel files
+ZOOM_MAX_DECODE_PIXELS = 128 * 1024 * 1024
+ZOOM_BASE_PIXELS = 32 * 1024 * 1024
+LARGE_IMAGE_LOCK = threading.Lock()
+# Animated images: frames are decoded on their own lane into a per-file
+# cache of at most ANIMATION_CACHE_BYTES; delays are in milliseconds
+ANIMATION_LANE = "animation"
+ANIMATED_EXTS = {".gif", ".webp"}
+ANIMATION_CACHE_BYTES = 64 * 1024 * 1024
+ANIMATION_DEFAULT_DELAY = 100
+ANIMATION_MIN_DELAY = 20
+PREVIEW_DEADLINE = 20
+MEDIA_LENGTH_BATCH = 25
+# Embedded metadata: where it is cached, how often the cache is saved
+# while metadata is being read, and how many files each task reads
+METADATA_CACHE_FILE = "tagz_metadata.json"
+METADATA_SAVE_INTERVAL = 5
+METADATA_BATCH = 25
+# Treeview columns filled from embedded metadata, and the keys they show
+METADATA_COLUMNS = {"Artist": "artist", "Album": "album", "Camera": "camera",
+                    "Date": "date"}
+MP4_VIDEO_EXTS = {".mp4", ".m4v", ".mov"}
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_IFD = 0x8769
+EXIF_GPS_IFD = 0x8825
+EXIF_DATE = re.compile(r"(\d{4}):(\d{2}):(\d{2})[ T](\d{2}):(\d{2})")
+PDF_DATE = re.compile(r"(?:D:)?(\d{4})(\d{2})(\d{2})")
+# Images are decoded at no less than this multiple of the preview size
+# before the final resample, so draft()/reduce() never cost sharpness
+IMAGE_REDUCING_GAP = 2
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "I", "F")
+# Text previews read this much up front and this much more each time the
+# view is scrolled near the end of what has been loaded
+TEXT_PREVIEW_BYTES = 16 * 1024
+TEXT_CHUNK_BYTES = 64 * 1024
+TEXT_SNIFF_BYTES = 4096
+TEXT_BINARY_RATIO = 0.1
+TEXT_BOMS = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF32_LE, "utf-32-le"),
+             (codecs.BOM_UTF32_BE, "utf-32-be"),
+             (codecs.BOM_UTF16_LE, "utf-16-le"),
+             (codecs.BOM_UTF16_BE, "utf-16-be"))
+# Plain-text formats previewed as text whatever their file type
+TEXT_PREVIEW_EXTS = {".txt", ".md", ".csv", ".tsv", ".json", ".log", ".ini",
+                     ".cfg", ".yaml", ".yml", ".toml", ".rst", ".tex", ".h",
+                     ".hpp", ".cs", ".jsx", ".tsx", ".lua", ".pl", ".r", ".m",
+                     ".scala", ".bat", ".ps1", ".htm"}
+# Audio waveforms: decode rate, samples per min/max block while streaming,
+# and how much decoded audio is read from ffmpeg at a time
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_BLOCK = 80
+WAVEFORM_READ_BYTES = 256 * 1024
+WAVEFORM_COLOR = "#1f5fbf"
+# Gallery view: thumbnail size, cell padding and caption height in pixels,
+# thumbnails kept as PhotoImages, and placeholders for files without one
+GALLERY_TILE = 128
+GALLERY_PADDING = 8
+GALLERY_CAPTION = 18
+GALLERY_PHOTO_CACHE = 600
+GALLERY_ICONS = {"video": "🎬", "audio": "🎵", "image": "🖼", "document": "📄",
+                 "code": "📝", "archive": "🗜", "ebook": "📚", "font": "🔤",
+                 "other": "📁"}
+# Filename tag suggestions. Each pattern below stands in for one or more
+# of the original regexes whose matches it already covers.
+SUGGEST_SEPARATORS = re.compile(r"[ \-_.,:;+&#=()!?]+")
+SUGGEST_NON_DIGITS = re.compile(r"\D+")
+SUGGEST_DATE_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r"\b\d{4}-\d{2}-\d{2}\b",     # YYYY-MM-DD
+    r"\b\d{2}-\d{2}-\d{4}\b",     # DD-MM-YYYY or MM-DD-YYYY
+    r"\d{8}",                     # YYYYMMDD, with or without boundaries
+    r"\b\d{2}\.\d{2}\.\d{4}\b",   # DD.MM.YYYY
+    r"\b\d{4}\.\d{2}\.\d{2}\b",   # YYYY.MM.DD
+    r"\d{2}_\d{2}_\d{4}",          # DD_MM_YYYY
+    r"\d{4}_\d{2}_\d{2}",          # YYYY_MM_DD
+))
+SUGGEST_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+SUGGEST_DIMENSION = re.compile(r"\b\d+[xX]\d+\b")
+SUGGEST_RESOLUTION = re.compile(r"\d{3,4}p", re.IGNORECASE)
+SUGGEST_CACHE_SIZE = 20000
+# Bulk suggestions: filenames per process-pool task, the number of names
+# from which the pool is worth using, and rows listed in the preview
+BULK_SUGGEST_CHUNK = 2000
+BULK_SUGGEST_PROCESS_MIN = 5000
+BULK_PREVIEW_ROWS = 1000
+# Related-tag suggestions: how many to show, the lowest score shown, and
+# how often a tag or filename token must occur before it counts as evidence
+RELATED_TAG_LIMIT = 8
+RELATED_TAG_MIN_SCORE = 0.25
+RELATED_TAG_MIN_SUPPORT = 2
+# Auto-tagging rule patterns that refer to their own groups by number or
+# name cannot share one compiled regex; the combined regex names its own
+# groups with a prefix user patterns are unlikely to use
+RULE_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+RULE_GROUP_PREFIX = "_tagz_rule_"
+# Thumbnail cache defaults; both can be overridden in the config
+THUMBNAIL_CACHE_DIR = "tagz_thumbnails"
+THUMBNAIL_CACHE_MB = 256
+THUMBNAIL_INDEX_SAVE_INTERVAL = 5
+THUMBNAIL_FILE_NAME = re.compile(r"[0-9a-f]{40}\.(?:jpg|png)$")
+# Where video thumbnails are taken (seconds), the brightness below which a
+# frame counts as black, and where to look instead: fractions of the
+# duration for OpenCV, seconds past the offset for ffmpeg
+VIDEO_THUMBNAIL_OFFSET = 1.0
+VIDEO_BLACK_LEVEL = 16
+VIDEO_THUMBNAIL_FALLBACKS = (0.1, 0.25, 0.5)
+VIDEO_THUMBNAIL_STEPS = (4, 15)
+# Frames in the video filmstrip preview (0 turns it off) and the gap
+# between them in pixels
+VIDEO_FILMSTRIP_FRAMES = 6
+FILMSTRIP_GAP = 4
+# Decoded previews kept in memory, and how many rows either side of the
+# selection are rendered ahead of time
+PREVIEW_MEMORY_SIZE = 48
+PREFETCH_NEIGHBOURS = 4
+# Change events published on the EventBus
+EVENT_TAG_ADDED = "tag-added"
+EVENT_TAG_REMOVED = "tag-removed"
+EVENT_TAG_SET_CHANGED = "tag-set-changed"
+EVENT_FILE_MOVED = "file-moved"
+EVENT_METADATA_UPDATED = "metadata-updated"
 
-def list_files(directory):
+def list_files(directory, with_durations=True, token=None):
     """Returns a sorted list of files in the directory with metadata."""
     if not os.path.isdir(directory):
         return []
+    master_tags = read_tag_data(TAG_FILE)
+    local_tags = read_tag_data(os.path.join(directory, "local_tags.json"))
     files = []
     for file_name in os.listdir(directory):
+        if token is not None and token.is_cancelled():
+            return []
         file_path = os.path.join(directory, file_name)
         if os.path.isfile(file_path):
             name, ext = os.path.splitext(file_name)
@@ -83,6 +277,7 @@ def list_files(directory):
             file_type = get_file_type(file_name)
             file_info = {
                 "name": file_name,
+                "name_lower": file_name.lower(),
                 "basename": name,
                 "path": file_path,
                 "ext": ext.lower(),
@@ -90,16 +285,32 @@ def list_files(directory):
                 "human_size": naturalsize(size),
                 "type": file_type,
                 "length": 0,
-                "modified": os.path.getmtime(file_path)
+                "modified": os.path.getmtime(file_path),
+                # Filled in from the metadata cache or by update_metadata
+                "metadata": {}
             }
             # Get length for media files
-            if file_type in ["video", "audio"]:
+            if with_durations and file_type in ["video", "audio"]:
                 file_info["length"] = get_media_duration(file_path)
-            # Get tags
-            file_info["tags"] = get_tags_for_file(file_path)
+            # Get tags (master first, then unique local tags)
+            tags = list(master_tags.get(file_path, []))
+            for tag in local_tags.get(file_name, []):
+                if tag not in tags:
+                    tags.append(tag)
+            file_info["tags"] = tags
             files.append(file_info)
     return files
 
+def read_tag_data(tag_file):
+    """Reads a tags JSON file, returning {} if it is missing or corrupt."""
+    if not os.path.exists(tag_file):
+        return {}
+    with open(tag_file, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
 def get_media_duration(file_path):
     """Gets the duration of a media file using the appropriate library or
     ffprobe."""
@@ -154,6 +365,15 @@ def get_duration_with_ffprobe(file_path):
         print(f"Error converting ffprobe output to integer for {file_path}")
         return 0
 
+def get_media_durations(file_paths, token=None):
+    """Returns {path: duration} for a batch of media files."""
+    durations = {}
+    for file_path in file_paths:
+        if token is not None and token.is_cancelled():
+            break
+        durations[file_path] = get_media_duration(file_path)
+    return durations
+
 def get_file_type(file_name):
     """Determines file type based on the extension."""
     _, ext = os.path.splitext(file_name)
@@ -191,6 +411,130 @@ def get_file_type(file_name):
         return "font"
     return "other"
 
+def clean_metadata_text(value):
+    """Returns a tag value as stripped text: the first entry of a list,
+    without the NUL padding some cameras write."""
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ""
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return str(value).replace("\x00", "").strip()
+
+def read_image_metadata(file_path):
+    """Reads the camera, capture date and GPS presence from EXIF."""
+    with Image.open(file_path) as img:
+        exif = img.getexif()
+        if not exif:
+            return {}
+        metadata = {}
+        make = clean_metadata_text(exif.get(EXIF_MAKE, ""))
+        model = clean_metadata_text(exif.get(EXIF_MODEL, ""))
+        # Most models already start with the make ("Canon EOS R5")
+        if make and not model.lower().startswith(make.split()[0].lower()):
+            model = f"{make} {model}".strip()
+        if model:
+            metadata["camera"] = model
+        taken = clean_metadata_text(
+            exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+            or exif.get(EXIF_DATETIME, ""))
+        # EXIF dates look like "2021:05:03 10:11:12"
+        match = EXIF_DATE.match(taken)
+        if match:
+            metadata["date"] = "{}-{}-{} {}:{}".format(*match.groups())
+        if exif.get_ifd(EXIF_GPS_IFD):
+            metadata["gps"] = True
+        return metadata
+
+def read_audio_metadata(file_path):
+    """Reads artist, album, genre and date from ID3 frames, Vorbis
+    comments or MP4 atoms, through mutagen's common "easy" keys."""
+    audio = MutagenFile(file_path, easy=True)
+    if audio is None or not audio.tags:
+        return {}
+    metadata = {}
+    for key in ("artist", "album", "genre", "date"):
+        value = clean_metadata_text(audio.tags.get(key, ""))
+        if value:
+            metadata[key] = value
+    return metadata
+
+def read_pdf_metadata(file_path):
+    """Reads the document info of a PDF: author, title, keywords and
+    creation date. Only call this on the PDF lane."""
+    with fitz.open(file_path) as doc:
+        info = doc.metadata or {}
+    metadata = {}
+    for source, key in (("author", "artist"), ("title", "title")):
+        value = clean_metadata_text(info.get(source) or "")
+        if value:
+            metadata[key] = value
+    keywords = [keyword.strip() for keyword in re.split(
+        r"[,;]", info.get("keywords") or "") if keyword.strip()]
+    if keywords:
+        metadata["keywords"] = keywords
+    # PDF dates look like "D:20210503101112+01'00'"
+    match = PDF_DATE.match(info.get("creationDate") or "")
+    if match:
+        metadata["date"] = "{}-{}-{}".format(*match.groups())
+    return metadata
+
+def get_metadata_reader(file_path):
+    """Returns the function that reads a file's embedded metadata, or None
+    if there is none to read."""
+    ext = os.path.splitext(file_path)[1].lower()
+    file_type = get_file_type(file_path)
+    if file_type == "image" and ext != ".svg":
+        return read_image_metadata
+    elif file_type == "audio" or ext in MP4_VIDEO_EXTS:
+        return read_audio_metadata
+    elif ext == ".pdf":
+        return read_pdf_metadata
+    return None
+
+def read_file_metadata(file_path):
+    """Returns the embedded metadata of a file as a dict, with "year" taken
+    from the date; {} if it has none or cannot be read."""
+    reader = get_metadata_reader(file_path)
+    if reader is None:
+        return {}
+    try:
+        metadata = reader(file_path)
+    except Exception as e:
+        print(f"Error reading metadata for {file_path}: {e}")
+        return {}
+    year = SUGGEST_YEAR.search(metadata.get("date", ""))
+    if year:
+        metadata["year"] = year.group()
+    return metadata
+
+def read_metadata_batch(file_paths, token=None):
+    """Returns {path: metadata} for a batch of files."""
+    metadata = {}
+    for file_path in file_paths:
+        if token is not None and token.is_cancelled():
+            break
+        metadata[file_path] = read_file_metadata(file_path)
+    return metadata
+
+def format_metadata(metadata):
+    """Summarises metadata for the file info line."""
+    parts = [metadata[key] for key in ("artist", "album", "title", "genre",
+                                       "camera", "date") if key in metadata]
+    if metadata.get("gps"):
+        parts.append("GPS")
+    return " - ".join(parts)
+
+def metadata_suggested_tags(metadata):
+    """Suggests tags from embedded metadata: artist, album, genre, year,
+    camera, PDF keywords and whether the photo is geotagged."""
+    tags = [metadata[key].lower() for key in ("artist", "album", "genre",
+                                             "year", "camera")
+            if key in metadata]
+    tags += [keyword.lower() for keyword in metadata.get("keywords", [])]
+    if metadata.get("gps"):
+        tags.append("geotagged")
+    return tags
+
 def format_length(seconds):
     """Formats media duration as HH:MM:SS."""
     if seconds <= 0:
@@ -203,6 +547,55 @@ def format_length(seconds):
     else:
         return f"{minutes:02}:{secs:02}"
 
+def format_file_row(file):
+    """Returns the Treeview column values for a file record."""
+    modified_date = datetime.fromtimestamp(
+        file["modified"]).strftime("%Y-%m-%d %H:%M")
+    tags_str = ", ".join(file["tags"]) if file["tags"] else ""
+    length_str = format_length(
+        file["length"]) if file["length"] > 0 else "-"
+    ext = file["ext"][1:] if file["ext"] else ""
+    return (
+        file["basename"],
+        ext,
+        file["type"].capitalize(),
+        file["human_size"],
+        length_str,
+        modified_date,
+        tags_str,
+        *(file["metadata"].get(key, "") for key in METADATA_COLUMNS.values())
+    )
+
+def natural_sort_key(text):
+    """Returns a casefolded key that orders embedded numbers numerically,
+    so "file2" sorts before "file10"."""
+    parts = NATURAL_SORT_SPLIT.split(text.casefold())
+    # Digit runs always land on odd indices, so ints never meet strs
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return tuple(parts)
+
+def get_sort_key(file, column):
+    """Returns the sort key of a file record for a Treeview column. Keys
+    derived from the name are computed once per record and cached."""
+    if column == "Size":
+        return file["size"]
+    elif column == "Length":
+        return file["length"]
+    elif column == "Modified":
+        return file["modified"]
+    elif column == "Tags":
+        return len(file["tags"])
+    elif column in METADATA_COLUMNS:
+        return file["metadata"].get(METADATA_COLUMNS[column], "").casefold()
+    sort_keys = file.get("sort_keys")
+    if sort_keys is None:
+        sort_keys = file["sort_keys"] = {
+            "Name": natural_sort_key(file["basename"]),
+            "Ext": file["ext"].casefold(),
+            "Type": FILE_TYPE_ORDER.get(file["type"], len(FILE_TYPE_ORDER))
+        }
+    return sort_keys[column]
+
 def add_tag_to_file(file_path, tag):
     """Adds a tag to a file and updates JSON storage."""
     if not tag.strip():
@@ -277,6 +670,81 @@ def remove_tag_from_file(file_path, tag):
                 json.dump(local_tags_data, f, indent=4)
     return updated
 
+def apply_tag_changes(changes):
+    """Writes a batch of (file_path, tag, add) changes to the tag files,
+    reading and writing each tag file once."""
+    tag_files = {TAG_FILE: read_tag_data(TAG_FILE)}
+    dirty = set()
+    for file_path, tag, add in changes:
+        if not tag.strip():
+            continue
+        local_tag_file = os.path.join(os.path.dirname(file_path),
+                                      "local_tags.json")
+        if local_tag_file not in tag_files:
+            tag_files[local_tag_file] = read_tag_data(local_tag_file)
+        # The master file is keyed by path, local files by file name
+        for tag_file, key in ((TAG_FILE, file_path),
+                              (local_tag_file, os.path.basename(file_path))):
+            tags_data = tag_files[tag_file]
+            tags = tags_data.get(key, [])
+            if add and tag not in tags:
+                tags_data[key] = tags + [tag]
+                dirty.add(tag_file)
+            elif not add and tag in tags:
+                tags.remove(tag)
+                if not tags:
+                    tags_data.pop(key)
+                dirty.add(tag_file)
+    for tag_file in dirty:
+        with open(tag_file, "w") as f:
+            json.dump(tag_files[tag_file], f, indent=4)
+
+def move_files_with_tags(file_paths, destination_directory):
+    """Moves files into destination_directory, carrying their tags along.
+    Returns (old_path, new_path) for each moved file and a list of
+    errors."""
+    moved = []
+    errors = []
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        new_path = os.path.join(destination_directory, file_name)
+        original_tags = get_tags_for_file(file_path)
+        for tag in original_tags:
+            remove_tag_from_file(file_path, tag)
+        try:
+            shutil.move(file_path, new_path)
+            if os.path.exists(new_path):
+                print(f"File '{file_name}' moved successfully.")
+                moved.append((file_path, new_path))
+            else:
+                errors.append(f"File '{file_name}' was NOT moved "
+                              "successfully!")
+                new_path = file_path
+        except Exception as e:
+            errors.append(f"Error moving {file_name}: {e}")
+            new_path = file_path
+        # Re-apply the tags where the file ended up
+        for tag in original_tags:
+            add_tag_to_file(new_path, tag)
+    return moved, errors
+
+def rename_file_with_tags(file_path, new_name_with_ext):
+    """Renames a file, carrying its tags along. Returns the new path."""
+    new_file_path = os.path.join(os.path.dirname(file_path),
+                                 new_name_with_ext)
+    original_tags = get_tags_for_file(file_path)
+    for tag in original_tags:
+        remove_tag_from_file(file_path, tag)
+    try:
+        os.rename(file_path, new_file_path)
+    except OSError:
+        for tag in original_tags:
+            add_tag_to_file(file_path, tag)
+        raise
+    for tag in original_tags:
+        add_tag_to_file(new_file_path, tag)
+    return new_file_path
+
 def get_tags_for_file(file_path):
     """Retrieves the tags for a given file from both master and local JSON
     files."""
@@ -305,9 +773,60 @@ def get_tags_for_file(file_path):
                 pass
     return tags
 
+def extract_suggested_tags(filename):
+    """Single pass over a filename for generate_suggested_tags. Returns a
+    sorted tuple of tags."""
+    name, ext = os.path.splitext(filename)
+    tags = {part.lower() for part in SUGGEST_SEPARATORS.split(name)
+            if len(part) > 1}
+    if ext:
+        tags.add(ext[1:].lower())
+    digits = len(SUGGEST_NON_DIGITS.sub("", name))
+    if digits:
+        if digits >= 8:
+            for pattern in SUGGEST_DATE_PATTERNS:
+                for date in pattern.findall(name):
+                    tags.add(date)
+                    # First and last four digits, one of them the year
+                    tags.add(date[0:4])
+                    tags.add(date[-4:])
+        tags.update(SUGGEST_YEAR.findall(name))
+        if "x" in name or "X" in name:
+            tags.update(SUGGEST_DIMENSION.findall(name))
+        if "p" in name or "P" in name:
+            tags.update(res.lower()
+                        for res in SUGGEST_RESOLUTION.findall(name))
+    return tuple(sorted(tags))
+
+@functools.lru_cache(maxsize=SUGGEST_CACHE_SIZE)
+def cached_suggested_tags(filename):
+    """Memoized extract_suggested_tags."""
+    return extract_suggested_tags(filename)
+
 def generate_suggested_tags(filename):
-    """Generates suggested tags based on the filename and optional
-    directory."""
+    """Generates suggested tags based on the filename: the extension,
+    dates, years, dimensions, video resolutions and the words of the name.
+    Results are memoized per filename."""
+    return list(cached_suggested_tags(filename))
+
+def generate_suggested_tags_batch(filenames):
+    """Returns {filename: suggested tags} for many filenames."""
+    return {filename: list(cached_suggested_tags(filename))
+            for filename in dict.fromkeys(filenames)}
+
+def get_directory_tags(directory, full_path=False):
+    """Suggests the folder a file is in as a tag, or every folder on its
+    path with full_path."""
+    if not directory:
+        return []
+    if full_path:
+        return [part.lower() for part in os.path.normpath(directory).split(
+            os.sep) if part and part not in ["/", "\\", ""]]
+    return [os.path.basename(directory).lower()]
+
+def reference_suggested_tags(filename):
+    """Original multi-pass version of generate_suggested_tags, kept as the
+    baseline for benchmark_suggested_tags."""
     name, ext = os.path.splitext(filename)
     suggested_tags = set()
     if ext:
@@ -369,19 +888,46 @@ def generate_suggested_tags(filename):
             suggested_tags.add(part.lower())
     return sorted(list(suggested_tags))
 
+def benchmark_suggested_tags(filenames=None, repeat=5):
+    """Times generate_suggested_tags against the original implementation
+    on the same filenames (synthetic ones by default), after checking that
+    both give the same tags. Returns (old_seconds, new_seconds,
+    cached_seconds) for one pass over the names."""
+    if filenames is None:
+        words = ["holiday", "IMG", "final", "Report", "scan", "clip",
+                 "mix", "draft", "v2", "copy"]
+        formats = ["{w}_{n:04d}.jpg", "{w} {y}-{m:02d}-{d:02d} {w2}.mp4",
+                   "{w}-{y}{m:02d}{d:02d}-1920x1080.png",
+                   "{w2}.{d:02d}.{m:02d}.{y} ({w}) 720p.mkv",
+                   "{w}_{d:02d}_{m:02d}_{y}_{w2}.pdf", "{w}{n}.txt",
+                   "{w} & {w2} #{n}!.mp3"]
+        filenames = [
+            formats[i % len(formats)].format(
+                w=words[i % 10], w2=words[(i * 7) % 10], n=i,
+                y=1990 + i % 35, m=1 + i % 12, d=1 + i % 28)
+            for i in range(2000)]
+    for filename in filenames:
+        if reference_suggested_tags(filename) != \
+                list(extract_suggested_tags(filename)):
+            raise AssertionError(f"Suggestions differ for {filename!r}")
+
+    def best(func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for filename in filenames:
+                func(filename)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    cached_suggested_tags.cache_clear()
+    return (best(reference_suggested_tags), best(extract_suggested_tags),
+            best(generate_suggested_tags))
+
 def get_all_tags():
     """Returns a list of all tags used in the system."""
-    if not os.path.exists(TAG_FILE):
-        return []
-    with open(TAG_FILE, "r") as f:
-        try:
-            tags_data = json.load(f)
-            all_tags = set()
-            for file_tags in tags_data.values():
-                all_tags.update(file_tags)
-            return sorted(list(all_tags))
-        except json.JSONDecodeError:
-            return []
+    return sorted({tag for file_tags in read_tag_data(TAG_FILE).values()
+                   for tag in file_tags})
 
 def search_files_by_tags(files, tags):
     """Filter files by tags."""
@@ -394,109 +940,2111 @@ def search_files_by_tags(files, tags):
             filtered_files.append(file)
     return filtered_files
 
-class TagzApp:
-    """Class for tagging application"""
+def load_tag_rules(rules_file):
+    """Reads an auto-tagging rules file, returning [] if it is missing or
+    corrupt."""
+    if not os.path.exists(rules_file):
+        return []
+    with open(rules_file, "r") as f:
+        try:
+            rules = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error reading rules file {rules_file}")
+            return []
+    if not isinstance(rules, list):
+        print(f"Rules file {rules_file} must contain a list of rules")
+        return []
+    return rules
+
+def read_rules_seen(seen_file):
+    """Returns the set of paths the rules have already been applied to."""
+    paths = read_tag_data(seen_file)
+    return set(paths) if isinstance(paths, list) else set()
+
+def write_rules_seen(seen_file, paths):
+    """Writes the paths the rules have already been applied to."""
+    data = json.dumps(sorted(paths))
+    with RULES_SEEN_LOCK:
+        temp_path = seen_file + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(data)
+        os.replace(temp_path, seen_file)
+
+class TagRuleMatcher:
+    """User-defined auto-tagging rules compiled into one matcher. The name
+    and path patterns of all rules are joined into a single regex per field,
+    so a file costs two regex matches however many rules there are; type,
+    size and length conditions are only checked for rules whose patterns
+    matched. A rules file is a JSON list such as
+
+        [{"name": "IMG_*.jpg", "tags": ["photo"]},
+         {"path_regex": "/Podcasts/", "type": "audio",
+          "length": [600, null], "tags": ["podcast", "long"]}]
+
+    "name" and "path" are case-insensitive globs matched against the whole
+    value, "name_regex" and "path_regex" are searched anywhere in it, "type"
+    is a file type or list of them, and "size" (bytes) and "length"
+    (seconds) are [min, max] ranges where either end may be null. Every
+    condition in a rule must hold for its tags to be added."""
+    FIELDS = ("name", "path")
+
+    def __init__(self, rules):
+        self.rules = []
+        self.matchers = {}
+        self.separate = []
+        self.unpatterned = []
+        self.uses_length = False
+        pieces = {field: [] for field in self.FIELDS}
+        group_names = {field: set() for field in self.FIELDS}
+        for rule in rules:
+            parsed = self.parse_rule(rule)
+            if parsed is None:
+                continue
+            index = len(self.rules)
+            self.rules.append(parsed)
+            self.uses_length |= parsed["length"] is not None
+            if not parsed["patterns"]:
+                self.unpatterned.append(index)
+            for number, (field, source, search) in enumerate(
+                    parsed["patterns"]):
+                # Every pattern gets its own group, so a rule with both a
+                # glob and a regex on one field still combines
+                name = f"{RULE_GROUP_PREFIX}{index}_{number}"
+                piece = f"(?:(?=(?P<{name}>{source})))?"
+                # Back-references and inline flags break once the pattern
+                # is embedded in a bigger one, and group names of its own
+                # may clash with another pattern's, so those match alone
+                try:
+                    own_names = set(re.compile(piece).groupindex) - {name}
+                    combinable = not (
+                        RULE_BACKREFERENCE.search(source)
+                        or own_names & group_names[field]
+                        or any(own_name.startswith(RULE_GROUP_PREFIX)
+                               for own_name in own_names))
+                except re.error:
+                    combinable = False
+                if combinable:
+                    group_names[field] |= own_names
+                    pieces[field].append((index, piece, search))
+                else:
+                    self.separate.append((index, field, search))
+        for field, field_pieces in pieces.items():
+            if field_pieces:
+                self.matchers[field] = re.compile(
+                    "".join(piece for _, piece, _ in field_pieces))
+
+    def __len__(self):
+        return len(self.rules)
+
+    @staticmethod
+    def parse_rule(rule):
+        """Checks one rule, returning it in matcher form or None."""
+        if not isinstance(rule, dict):
+            print(f"Skipping rule {rule!r}: not an object")
+            return None
+        tags = rule.get("tags", [])
+        if isinstance(tags, str):
+            tags = [tags]
+        tags = [str(tag).strip() for tag in tags if str(tag).strip()]
+        if not tags:
+            print(f"Skipping rule {rule!r}: no tags")
+            return None
+        # (field, source for the combined regex, function matching the
+        # pattern on its own); globs must match the whole value, regexes
+        # anywhere in it
+        patterns = []
+        try:
+            for field in TagRuleMatcher.FIELDS:
+                if rule.get(field):
+                    source = f"(?i:{fnmatch.translate(rule[field])})"
+                    patterns.append((field, source,
+                                     re.compile(source).match))
+                pattern = rule.get(f"{field}_regex")
+                if pattern:
+                    source = f"(?s:.*?)(?:{pattern})"
+                    patterns.append((field, source,
+                                     re.compile(pattern).search))
+        except re.error as e:
+            print(f"Skipping rule {rule!r}: {e}")
+            return None
+        file_types = rule.get("type")
+        if isinstance(file_types, str):
+            file_types = [file_types]
+        ranges = {}
+        for key in ("size", "length"):
+            bounds = rule.get(key)
+            if bounds is not None and (
+                    not isinstance(bounds, list) or len(bounds) != 2
+                    or not all(bound is None or (
+                        isinstance(bound, (int, float))
+                        and not isinstance(bound, bool))
+                        for bound in bounds)):
+                print(f"Skipping rule {rule!r}: {key} must be [min, max] "
+                      "numbers or null")
+                return None
+            ranges[key] = bounds
+        return {"tags": tags, "patterns": patterns,
+                "types": set(file_types) if file_types else None,
+                "size": ranges["size"], "length": ranges["length"]}
+
+    @staticmethod
+    def in_range(value, bounds):
+        """Returns True if value lies within [min, max]; None is open."""
+        low, high = bounds
+        return ((low is None or value >= low)
+                and (high is None or value <= high))
+
+    def needs_length(self, file):
+        """Returns True if the file's duration is needed but not known."""
+        return (self.uses_length and file["type"] in ("audio", "video")
+                and not file["length"])
+
+    def match(self, file):
+        """Returns the tags the rules give a file record, in rule order."""
+        hits = Counter()
+        for field, regex in self.matchers.items():
+            groups = regex.match(file[field]).groupdict()
+            hits.update(int(name[len(RULE_GROUP_PREFIX):].split("_")[0])
+                        for name, value in groups.items()
+                        if value is not None
+                        and name.startswith(RULE_GROUP_PREFIX))
+        for index, field, search in self.separate:
+            if search(file[field]):
+                hits[index] += 1
+        candidates = sorted(self.unpatterned + [
+            index for index, count in hits.items()
+            if count == len(self.rules[index]["patterns"])])
+        tags = []
+        for index in candidates:
+            rule = self.rules[index]
+            if rule["types"] is not None and file["type"] not in rule["types"]:
+                continue
+            if rule["size"] is not None and not self.in_range(file["size"],
+                                                              rule["size"]):
+                continue
+            if (rule["length"] is not None
+                    and not self.in_range(file["length"], rule["length"])):
+                continue
+            for tag in rule["tags"]:
+                if tag not in tags:
+                    tags.append(tag)
+        return tags
+
+    def match_files(self, files, read_lengths=False, token=None):
+        """Returns ({path: tags}, pending paths) for a list of records.
+        Media files whose duration a rule needs are read on the spot with
+        read_lengths, and otherwise left pending for when it is known."""
+        results = {}
+        pending = []
+        for file in files:
+            if token is not None and token.is_cancelled():
+                return {}, []
+            if self.needs_length(file):
+                if not read_lengths:
+                    pending.append(file["path"])
+                    continue
+                file = dict(file, length=get_media_duration(file["path"]))
+            tags = self.match(file)
+            if tags:
+                results[file["path"]] = tags
+        return results, pending
+
+def scan_rule_tags(matcher, directory, token=None):
+    """Matches every file in a directory against the rules. Runs on the
+    worker pool; only the resulting TagStore.apply goes through the tag
+    lane, so tag edits are not held up by a long scan."""
+    return matcher.match_files(list_files(directory, False, token), True,
+                               token=token)
+
+def fit_image(img, width, height, resample=None):
+    """Scales a PIL image to fit within width x height."""
+    img_width, img_height = img.size
+    ratio = min(width / img_width, height / img_height)
+    new_width = max(1, int(img_width * ratio))
+    new_height = max(1, int(img_height * ratio))
+    if (new_width, new_height) == img.size:
+        return img
+    if resample is None:
+        resample = Resampling.LANCZOS
+    return img.resize((new_width, new_height), resample=resample)
+
+def decode_scaled(img, width, height, gap):
+    """Decodes an open image at a reduced size that stays at least gap
+    times the target: JPEGs via a DCT-scaled draft(), other formats with
+    Image.reduce() after decoding. Returns the decoded image."""
+    width, height = max(1, width), max(1, height)
+    if img.format == "JPEG":
+        img.draft(None, (int(width * gap), int(height * gap)))
+    img.load()
+    factor = int(min(img.width / (width * gap), img.height / (height * gap)))
+    if factor >= 2 and img.mode in REDUCIBLE_MODES:
+        return img.reduce(factor)
+    return img
+
+def read_exif_thumbnail(img):
+    """Returns the JPEG thumbnail embedded in an image's EXIF data, or
+    None if there is none."""
+    exif = img.info.get("exif")
+    if not exif:
+        return None
+    start = exif.find(b"\xff\xd8\xff", 6)
+    end = exif.rfind(b"\xff\xd9")
+    if start < 0 or end < start:
+        return None
+    try:
+        thumb = Image.open(io.BytesIO(exif[start:end + 2]))
+        thumb.load()
+        return thumb
+    except Exception:
+        return None
+
+def load_image_preview(file_path, width, height):
+    """Decodes an image and scales it to the preview size. Only as much
+    of the image is decoded as the final resample needs."""
+    with Image.open(file_path) as img:
+        return fit_image(decode_scaled(img, width, height,
+                                       IMAGE_REDUCING_GAP), width, height)
+
+def load_image_first_paint(file_path, width, height):
+    """Fast, lower quality decode for the first paint of a preview: the
+    EXIF thumbnail if there is one, else a JPEG draft at about the target
+    size with a bilinear resample. Returns (image, needs_refine), where
+    needs_refine says whether load_image_preview would look better, or
+    None for formats that must be decoded in full anyway, where a first
+    paint would only add a second decode."""
+    with Image.open(file_path) as img:
+        full_size = img.size
+        thumb = read_exif_thumbnail(img)
+        if thumb is not None:
+            return fit_image(thumb, width, height, Resampling.BILINEAR), True
+        if img.format != "JPEG":
+            return None
+        img = decode_scaled(img, width, height, 1)
+        needs_refine = (full_size[0] > width * IMAGE_REDUCING_GAP
+                        or full_size[1] > height * IMAGE_REDUCING_GAP)
+        return fit_image(img, width, height, Resampling.BILINEAR), needs_refine
+
+def frame_brightness(img):
+    """Returns the mean brightness (0-255) of a PIL image."""
+    small = img.convert("L").resize((32, 32), resample=Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    return sum(pixels) / len(pixels)
+
+def get_thumbnail_positions(offset, duration):
+    """Returns the times (in seconds) to try for a video thumbnail: the
+    configured offset, then points further in for when it is black."""
+    positions = [offset]
+    if duration:
+        positions = [min(offset, duration / 2)]
+        positions += [duration * fraction
+                      for fraction in VIDEO_THUMBNAIL_FALLBACKS]
+    return positions
+
+def get_video_duration_opencv(cap):
+    """Returns the duration of an open cv2.VideoCapture in seconds, or 0."""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    return frame_count / fps if fps and frame_count > 0 else 0
+
+def read_frame_opencv(cap, position, width, height):
+    """Seeks an open cv2.VideoCapture to position (seconds) and returns
+    that frame scaled down to fit width x height, or None."""
+    cap.set(cv2.CAP_PROP_POS_MSEC, position * 1000)
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    frame_height, frame_width = frame.shape[:2]
+    ratio = min(width / frame_width, height / frame_height, 1)
+    if ratio < 1:
+        # Shrink before the colour conversion; INTER_AREA is both fast and
+        # clean for downscaling
+        frame = cv2.resize(frame, (max(1, int(frame_width * ratio)),
+                                   max(1, int(frame_height * ratio))),
+                           interpolation=cv2.INTER_AREA)
+    # Convert from BGR to RGB
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+def grab_frame_opencv(file_path, width, height, offset):
+    """Seeks with OpenCV to the first non-black frame at or after the
+    offset and returns it scaled to the preview size, or None."""
+    cap = cv2.VideoCapture(file_path)
+    try:
+        if not cap.isOpened():
+            return None
+        duration = get_video_duration_opencv(cap)
+        best, best_brightness = None, -1
+        for position in get_thumbnail_positions(offset, duration):
+            img = read_frame_opencv(cap, position, width, height)
+            if img is None:
+                continue
+            brightness = frame_brightness(img)
+            if brightness >= VIDEO_BLACK_LEVEL:
+                return img
+            if brightness > best_brightness:
+                best, best_brightness = img, brightness
+        return best
+    finally:
+        cap.release()
+
+def grab_frame_ffmpeg(file_path, width, height, offset, keyframes_only=False):
+    """Has ffmpeg decode one frame at the offset, scaled to the preview
+    size, and pipe it back as a raw PPM image on stdout. With
+    keyframes_only, only keyframes are decoded, so the frame is the first
+    keyframe at or after the offset. Returns None if ffmpeg fails."""
+    scale = (f"scale={max(1, width)}:{max(1, height)}"
+             ":force_original_aspect_ratio=decrease")
+    skip = ["-skip_frame", "nokey"] if keyframes_only else []
+    result = subprocess.run([
+        "ffmpeg", "-v", "error", *skip, "-ss", f"{offset:.3f}",
+        "-i", file_path,
+        "-frames:v", "1", "-vf", scale,
+        "-f", "image2pipe", "-c:v", "ppm", "pipe:1"
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        print(f"ffmpeg error: {result.stderr.decode(errors='replace')}")
+        return None
+    img = Image.open(io.BytesIO(result.stdout))
+    img.load()
+    return img
+
+def load_video_preview(file_path, width, height,
+                       offset=VIDEO_THUMBNAIL_OFFSET):
+    """Grabs a video frame scaled to the preview size, with OpenCV or else
+    ffmpeg, skipping black frames where possible. Nothing is written to
+    disk. Returns None if neither can read the video."""
+    try:
+        img = grab_frame_opencv(file_path, width, height, offset)
+        if img is not None:
+            return fit_image(img, width, height)
+        print("OpenCV failed to read video frame, falling back to ffmpeg")
+    except Exception as e:
+        print(f"OpenCV error: {e}, falling back to ffmpeg")
+    try:
+        best, best_brightness = None, -1
+        # Without a known duration, step forward from the offset
+        for position in get_thumbnail_positions(offset, 0) + [
+                offset + step for step in VIDEO_THUMBNAIL_STEPS]:
+            img = grab_frame_ffmpeg(file_path, width, height, position)
+            if img is None:
+                continue
+            brightness = frame_brightness(img)
+            if brightness >= VIDEO_BLACK_LEVEL:
+                return fit_image(img, width, height)
+            if brightness > best_brightness:
+                best, best_brightness = img, brightness
+        if best is not None:
+            return fit_image(best, width, height)
+    except FileNotFoundError:
+        print("ffmpeg not found. "
+              "Please ensure it is installed and in your PATH.")
+    except Exception as e:
+        print(f"Error generating video thumbnail: {e}")
+    return None
+
+def get_filmstrip_layout(count, frame_size, width, height):
+    """Returns (columns, rows) of the grid that shows `count` frames of
+    frame_size as large as possible within width x height."""
+    frame_width, frame_height = frame_size
+    best, best_scale = (count, 1), 0
+    for columns in range(1, count + 1):
+        rows = -(-count // columns)
+        scale = min(width / (columns * frame_width),
+                    height / (rows * frame_height))
+        if scale > best_scale:
+            best, best_scale = (columns, rows), scale
+    return best
+
+def compose_filmstrip(frames, width, height):
+    """Tiles frames into one image that fits width x height."""
+    frame_size = frames[0].size
+    columns, rows = get_filmstrip_layout(len(frames), frame_size, width,
+                                         height)
+    tile_width = max(1, width // columns - FILMSTRIP_GAP)
+    tile_height = max(1, height // rows - FILMSTRIP_GAP)
+    strip = Image.new("RGB", (columns * (tile_width + FILMSTRIP_GAP),
+                              rows * (tile_height + FILMSTRIP_GAP)), "black")
+    for index, frame in enumerate(frames):
+        tile = fit_image(frame, tile_width, tile_height)
+        column, row = index % columns, index // columns
+        x = column * (tile_width + FILMSTRIP_GAP) + FILMSTRIP_GAP // 2 + (
+            tile_width - tile.width) // 2
+        y = row * (tile_height + FILMSTRIP_GAP) + FILMSTRIP_GAP // 2 + (
+            tile_height - tile.height) // 2
+        strip.paste(tile, (x, y))
+    return fit_image(strip, width, height)
+
+def load_video_filmstrip(file_path, width, height, count, duration=0,
+                         token=None):
+    """Renders `count` evenly spaced frames of a video as one image that
+    fits width x height. ffmpeg decodes keyframes only; OpenCV is used
+    when ffmpeg is missing. Returns None if cancelled through the token
+    or if fewer than two frames could be read."""
+    cap = None
+    try:
+        if not duration:
+            cap = cv2.VideoCapture(file_path)
+            duration = get_video_duration_opencv(cap)
+        if not duration:
+            return None
+        # Frames are read at about the tile size, not the canvas size
+        tile_width = max(1, width // 2)
+        tile_height = max(1, height // 2)
+        positions = [duration * (index + 0.5) / count
+                     for index in range(count)]
+        frames = []
+        use_ffmpeg = shutil.which("ffmpeg") is not None
+        for position in positions:
+            if token is not None and token.is_cancelled():
+                return None
+            if use_ffmpeg:
+                frame = grab_frame_ffmpeg(file_path, tile_width, tile_height,
+                                          position, keyframes_only=True)
+            else:
+                if cap is None:
+                    cap = cv2.VideoCapture(file_path)
+                frame = read_frame_opencv(cap, position, tile_width,
+                                          tile_height)
+            if frame is not None:
+                frames.append(frame)
+        if len(frames) < 2:
+            return None
+        return compose_filmstrip(frames, width, height)
+    finally:
+        if cap is not None:
+            cap.release()
+
+def read_audio_peaks(file_path, token=None):
+    """Stream-decodes an audio file with ffmpeg into mono 16-bit samples
+    and returns (minima, maxima) per WAVEFORM_BLOCK samples as NumPy
+    arrays, so memory stays small however long the file is. Returns None
+    if nothing could be decoded or the token was cancelled."""
+    process = subprocess.Popen([
+        "ffmpeg", "-v", "error", "-i", file_path, "-vn", "-ac", "1",
+        "-ar", str(WAVEFORM_SAMPLE_RATE), "-f", "s16le", "pipe:1"
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    minima, maxima = [], []
+    carry = np.empty(0, dtype=np.int16)
+    odd_byte = b""
+    try:
+        while True:
+            if token is not None and token.is_cancelled():
+                return None
+            data = process.stdout.read(WAVEFORM_READ_BYTES)
+            if not data:
+                break
+            data = odd_byte + data
+            odd_byte = data[len(data) - len(data) % 2:]
+            samples = np.concatenate((carry, np.frombuffer(
+                data[:len(data) - len(odd_byte)], dtype="<i2")))
+            usable = len(samples) - len(samples) % WAVEFORM_BLOCK
+            blocks = samples[:usable].reshape(-1, WAVEFORM_BLOCK)
+            minima.append(blocks.min(axis=1))
+            maxima.append(blocks.max(axis=1))
+            carry = samples[usable:]
+        if len(carry):
+            minima.append(carry.min(keepdims=True))
+            maxima.append(carry.max(keepdims=True))
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+    if not minima:
+        return None
+    return np.concatenate(minima), np.concatenate(maxima)
+
+def summarise_peaks(minima, maxima, buckets):
+    """Folds block peaks into at most `buckets` (min, max) pairs."""
+    buckets = max(1, min(buckets, len(minima)))
+    starts = np.linspace(0, len(minima), buckets + 1).astype(int)[:-1]
+    return (np.minimum.reduceat(minima, starts),
+            np.maximum.reduceat(maxima, starts))
+
+def render_waveform(file_path, width, height, token=None):
+    """Draws the waveform of an audio file as a width x height image, one
+    vertical min/max line per column. Returns None if it cannot be
+    decoded."""
+    peaks = read_audio_peaks(file_path, token)
+    if peaks is None:
+        return None
+    width, height = max(1, width), max(1, height)
+    minima, maxima = summarise_peaks(*peaks, width)
+    # Scale to the loudest peak so quiet recordings stay visible
+    scale = max(1, int(max(-int(minima.min()), int(maxima.max()))))
+    middle = height / 2
+    top = middle - maxima.astype(np.float64) / scale * middle * 0.9
+    bottom = middle - minima.astype(np.float64) / scale * middle * 0.9
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    draw.line([(0, middle), (width, middle)], fill="lightgray")
+    x_step = width / len(top)
+    for index, (y_top, y_bottom) in enumerate(zip(top, bottom)):
+        x = int(index * x_step)
+        draw.line([(x, y_top), (x, y_bottom)], fill=WAVEFORM_COLOR)
+    return img
+
+def render_pdf_page(doc, page_number, width, height):
+    """Renders one page of an open PDF directly at the scale that fits
+    width x height, so no resampling is needed afterwards."""
+    page = doc[page_number]
+    rect = page.rect
+    zoom = min(max(1, width) / rect.width, max(1, height) / rect.height)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+def render_pdf_preview(file_path, width, height):
+    """Renders the first page of a PDF scaled to the preview size.
+    Returns (image, page_count), or (None, 0) for an empty document."""
+    doc = fitz.open(file_path)
+    try:
+        if doc.page_count == 0:
+            return None, 0
+        return render_pdf_page(doc, 0, width, height), doc.page_count
+    finally:
+        doc.close()
+
+def get_preview_renderer(file, width, height,
+                         video_offset=VIDEO_THUMBNAIL_OFFSET):
+    """Returns (variant, create) for files whose preview is a rendered
+    image, for use with ThumbnailCache.get_or_create, or None."""
+    file_path = file["path"]
+    if file["type"] == "image":
+        return "image", lambda: (load_image_preview(file_path, width,
+                                                    height), None)
+    if file["type"] == "video":
+        return f"video@{video_offset:g}", lambda: (load_video_preview(
+            file_path, width, height, video_offset), None)
+    if file["type"] == "document" and file["ext"] == ".pdf":
+        return "pdf", lambda: render_pdf_preview(file_path, width, height)
+    return None
+
+def get_preview_lane(variant):
+    """Returns the lane a preview variant must be rendered on: PDF_LANE for
+    PDFs (including gallery tiles), since PyMuPDF is not thread-safe, and
+    None, the worker pool, for everything else."""
+    return PDF_LANE if variant.endswith("pdf") else None
+
+def detect_text_encoding(head):
+    """Guesses the encoding of a file from its first bytes. Returns
+    (encoding, bom_length), or (None, 0) if the data looks binary."""
+    for bom, encoding in TEXT_BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    if b"\0" in head:
+        return None, 0
+    control = sum(1 for byte in head
+                  if byte < 32 and byte not in b"\t\n\r\f\b\x1b")
+    if head and control / len(head) > TEXT_BINARY_RATIO:
+        return None, 0
+    try:
+        # Only the head is checked, so a sequence cut at its end is fine
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return "cp1252", 0
+
+def read_text_chunk(file_path, offset, encoding, size):
+    """Reads at most `size` bytes from offset and decodes them, leaving a
+    character split at the end of the chunk for the next read. Returns
+    (text, next_offset); next_offset is None at the end of the file."""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    text = decoder.decode(data, final=len(data) < size)
+    pending = len(decoder.getstate()[0])
+    next_offset = offset + len(data) - pending
+    if len(data) < size:
+        next_offset = None
+    return text, next_offset
+
+def read_text_preview(file_path):
+    """Returns the start of a text file for the preview as (text,
+    encoding, next_offset), or (None, None, None) for binary files. Only
+    the first TEXT_PREVIEW_BYTES are read."""
+    with open(file_path, "rb") as f:
+        head = f.read(TEXT_SNIFF_BYTES)
+    encoding, bom_length = detect_text_encoding(head)
+    if encoding is None:
+        return None, None, None
+    text, next_offset = read_text_chunk(file_path, bom_length, encoding,
+                                        TEXT_PREVIEW_BYTES)
+    return text, encoding, next_offset
+
+class MetadataCache:
+    """Embedded metadata of files, saved to a JSON file so it is read from
+    each file only once. Entries remember the file's size and mtime and
+    are dropped once the file changes or is gone from its directory. The
+    file is read by load(), meant for the tag I/O lane; nothing is saved
+    before that. Safe to use from worker threads."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Held while the file is written, so a save on the tag lane and the
+        # final one on close never interleave
+        self.save_lock = threading.Lock()
+        self.entries = {}
+        self.loaded = False
+        self.dirty = False
+        self.last_save = 0
+
+    def load(self):
+        """Reads the cache file, keeping entries added meanwhile."""
+        entries = read_tag_data(self.path)
+        with self.lock:
+            entries.update(self.entries)
+            self.entries = entries
+            self.loaded = True
+
+    def get(self, file):
+        """Returns the cached metadata of a file record, or None. An entry
+        left from an older version of the file is dropped."""
+        with self.lock:
+            entry = self.entries.get(file["path"])
+            if entry is None:
+                return None
+            if (entry["size"] != file["size"]
+                    or entry["modified"] != file["modified"]):
+                del self.entries[file["path"]]
+                self.dirty = True
+                return None
+        return entry["metadata"]
+
+    def prune(self, directory, file_paths):
+        """Drops the entries of files in directory that are not among
+        file_paths (deleted or renamed)."""
+        file_paths = set(file_paths)
+        # Paths are joined onto the directory as list_files does
+        directory = os.path.dirname(os.path.join(directory, ""))
+        with self.lock:
+            stale = [path for path in self.entries
+                     if os.path.dirname(path) == directory
+                     and path not in file_paths]
+            for path in stale:
+                del self.entries[path]
+            self.dirty |= bool(stale)
+
+    def put(self, file, metadata):
+        """Records the metadata read from a file."""
+        with self.lock:
+            self.entries[file["path"]] = {"size": file["size"],
+                                          "modified": file["modified"],
+                                          "metadata": metadata}
+            self.dirty = True
+
+    def save(self, force=False):
+        """Writes the cache, at most every few seconds unless forced."""
+        with self.save_lock:
+            with self.lock:
+                now = time.time()
+                if not self.loaded or not self.dirty or (
+                        not force and now - self.last_save <
+                        METADATA_SAVE_INTERVAL):
+                    return
+                self.last_save = now
+                self.dirty = False
+                data = json.dumps(self.entries)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+
+class ThumbnailCache:
+    """Disk cache of rendered previews with a byte budget.
+
+    Entries are keyed by source path, size and mtime plus the target size
+    and a variant name, so edited files and other canvas sizes get fresh
+    entries. An index file records each entry's size, last access and
+    metadata; the least recently used entries are evicted once the cache
+    grows past its budget. The most recently used images are also kept
+    decoded in memory, ready for ImageTk.PhotoImage. Safe to use from
+    worker threads.
+    """
+    def __init__(self, directory, max_bytes, memory_size=PREVIEW_MEMORY_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        # Held while the index is written, so saves from worker threads and
+        # the final one on close never interleave
+        self.save_lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.last_save = 0
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """Reads the index, dropping entries whose files are gone and
+        deleting files that no entry refers to (left behind when the app
+        stopped between writing a file and saving the index), so that
+        everything on disk counts against the budget."""
+        index = read_tag_data(self.index_path)
+        for key, entry in sorted(index.items(),
+                                 key=lambda item: item[1]["accessed"]):
+            if os.path.exists(os.path.join(self.directory, entry["file"])):
+                self.entries[key] = entry
+                self.total_bytes += entry["bytes"]
+        known = {entry["file"] for entry in self.entries.values()}
+        stale_index = os.path.basename(self.index_path) + ".tmp"
+        for file_name in os.listdir(self.directory):
+            # Only files the cache itself names are touched
+            if file_name == stale_index or (
+                    THUMBNAIL_FILE_NAME.match(file_name)
+                    and file_name not in known):
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass
+
+    def save_index(self, force=False):
+        """Writes the index, at most every few seconds unless forced."""
+        with self.save_lock:
+            with self.lock:
+                now = time.time()
+                if not force and now - self.last_save < \
+                        THUMBNAIL_INDEX_SAVE_INTERVAL:
+                    return
+                self.last_save = now
+                data = json.dumps(self.entries)
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(data)
+            os.replace(temp_path, self.index_path)
+
+    @staticmethod
+    def make_key(file_path, width, height, variant):
+        """Returns the cache key of a preview, or None if the source file
+        cannot be read."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        raw = (f"{file_path}|{stat.st_size}|{stat.st_mtime_ns}|"
+               f"{width}x{height}|{variant}")
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def remember(self, key, img, meta):
+        """Keeps a decoded image in the in-memory LRU, converted to a mode
+        PhotoImage takes as is. Returns (image, meta)."""
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.mode or img.mode == "P"
+                              else "RGB")
+        with self.lock:
+            self.memory[key] = (img, meta)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+        return img, meta
+
+    def peek(self, file_path, width, height, variant):
+        """Returns (image, meta) if it is decoded in memory, else None.
+        Cheap enough for the main thread."""
+        key = self.make_key(file_path, width, height, variant)
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.memory.move_to_end(key)
+            return cached
+
+    def get(self, key, in_memory=True):
+        """Returns (image, meta) for a key, or None on a miss."""
+        with self.lock:
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.memory.move_to_end(key)
+                return cached
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry["accessed"] = time.time()
+            self.entries.move_to_end(key)
+        try:
+            with Image.open(os.path.join(self.directory,
+                                         entry["file"])) as img:
+                img.load()
+                if not in_memory:
+                    return img, entry.get("meta")
+                return self.remember(key, img, entry.get("meta"))
+        except OSError:
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.total_bytes -= entry["bytes"]
+            return None
+
+    def put(self, key, img, meta=None):
+        """Stores an image and evicts old entries beyond the budget."""
+        if img.mode in ("RGB", "L"):
+            file_name = key + ".jpg"
+            save_args = {"format": "JPEG", "quality": 90}
+        else:
+            file_name = key + ".png"
+            save_args = {"format": "PNG"}
+            if img.mode not in ("RGBA", "LA", "P", "1"):
+                img = img.convert("RGBA")
+        path = os.path.join(self.directory, file_name)
+        img.save(path, **save_args)
+        size = os.path.getsize(path)
+        evicted = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old["bytes"]
+                # Stored before in the other format
+                if old["file"] != file_name:
+                    evicted.append(old["file"])
+            self.entries[key] = {"file": file_name, "bytes": size,
+                                 "accessed": time.time(), "meta": meta}
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, entry = self.entries.popitem(last=False)
+                self.total_bytes -= entry["bytes"]
+                evicted.append(entry["file"])
+        for file_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except OSError:
+                pass
+        self.save_index()
+
+    def lookup(self, file_path, width, height, variant):
+        """Returns a cached (image, meta), or None on a miss."""
+        key = self.make_key(file_path, width, height, variant)
+        return self.get(key) if key is not None else None
+
+    def get_or_create(self, file_path, width, height, variant, create,
+                      in_memory=True):
+        """Returns (image, meta) for a preview, from the cache or by calling
+        create(), which returns (image, meta). None images are not
+        cached. Without in_memory the result is only cached on disk, for
+        callers that keep their own copies."""
+        key = self.make_key(file_path, width, height, variant)
+        if key is not None:
+            cached = self.get(key, in_memory)
+            if cached is not None:
+                return cached
+        img, meta = create()
+        if img is not None and key is not None:
+            try:
+                self.put(key, img, meta)
+            except OSError as e:
+                print(f"Error caching thumbnail for {file_path}: {e}")
+            if in_memory:
+                return self.remember(key, img, meta)
+        return img, meta
+
+def open_large_image(file_path):
+    """Opens an image without Pillow's decompression bomb check, which
+    rejects gigapixel files outright. Only for readers that decode a
+    bounded part of the image: ImagePyramid decodes tiles in view, and
+    whole images only within ZOOM_MAX_DECODE_PIXELS. The limit is a
+    module global, so it is lifted under a lock for the open alone."""
+    with LARGE_IMAGE_LOCK:
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(file_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+
+def has_partial_tiles(img):
+    """Returns True if the current frame is stored as several tiles or
+    strips that Pillow decodes one by one. libtiff decodes a compressed
+    TIFF as a single tile covering the whole frame, so only uncompressed
+    tiles and strips qualify."""
+    return len(img.tile) > 1 and all(tile[0] != "libtiff"
+                                     for tile in img.tile)
+
+def move_tile(tile, extents):
+    """Returns a copy of a tile descriptor with new extents. Pillow 11+
+    uses ImageFile._Tile named tuples, older versions plain tuples."""
+    if hasattr(tile, "_replace"):
+        return tile._replace(extents=extents)
+    return (tile[0], extents) + tuple(tile[2:])
+
+def load_tiled_region(file_path, frame, box):
+    """Decodes the part of an uncompressed tiled or striped image (such as
+    a tiled TIFF) inside box, reading only the tiles that overlap it.
+    Returns None if the frame cannot be decoded in parts."""
+    left, top, right, bottom = box
+    with open_large_image(file_path) as img:
+        if frame:
+            img.seek(frame)
+        if not has_partial_tiles(img):
+            return None
+        tiles = [tile for tile in img.tile
+                 if tile[1][0] < right and tile[1][2] > left
+                 and tile[1][1] < bottom and tile[1][3] > top]
+        if not tiles:
+            return None
+        region_left = min(tile[1][0] for tile in tiles)
+        region_top = min(tile[1][1] for tile in tiles)
+        region_right = max(tile[1][2] for tile in tiles)
+        region_bottom = max(tile[1][3] for tile in tiles)
+        # Decode into an image just big enough for the overlapping tiles.
+        # Pillow has no public API for this; the frame is given the
+        # region's size and tiles relative to it before load()
+        img.tile = [move_tile(tile, (tile[1][0] - region_left,
+                                     tile[1][1] - region_top,
+                                     tile[1][2] - region_left,
+                                     tile[1][3] - region_top))
+                    for tile in tiles]
+        img._size = (region_right - region_left, region_bottom - region_top)
+        img.load()
+        return img.crop((left - region_left, top - region_top,
+                         right - region_left, bottom - region_top))
+
+class ImagePyramid:
+    """Tiles of a large image at the scales of a zoomed preview.
+
+    A tile at a given scale is cut from the smallest stored resolution that
+    is still sharp enough: the reduced-resolution pages of a pyramidal
+    TIFF if the file has them, else the full image. Uncompressed tiled
+    and striped sources only have the tiles under the requested region
+    decoded. Any other source (PNG, compressed TIFF, ...) is decoded
+    once, as a whole, and kept as a base level downscaled to
+    ZOOM_BASE_PIXELS, which caps max_scale for huge untiled images.
+    Sources over ZOOM_MAX_DECODE_PIXELS (after a DCT-reduced draft for
+    JPEGs) are not decoded at all. Rendered tiles are kept in an LRU
+    sized to the viewport. Tiles must be rendered on a single thread
+    (ZOOM_LANE). Only TIFF frames are looked at for reduced resolutions;
+    the frames of animated formats would each have to be decoded.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.tiles = OrderedDict()
+        self.max_tiles = 64
+        self.decoded = None
+        self.lock = threading.Lock()
+        with open_large_image(file_path) as img:
+            self.size = img.size
+            self.format = img.format
+            # (frame, width, partial) of each usable stored resolution,
+            # largest first; partial sources are decoded tile by tile,
+            # others at width as the base level
+            self.sources = []
+            frames = (getattr(img, "n_frames", 1)
+                      if img.format == "TIFF" else 1)
+            for frame in range(frames):
+                if frame:
+                    img.seek(frame)
+                width, height = img.size
+                if frame and (width >= self.size[0] or abs(
+                        width / height - self.size[0] / self.size[1]) >
+                        0.01):
+                    continue
+                if has_partial_tiles(img):
+                    self.sources.append((frame, width, True))
+                    continue
+                pixels = width * height
+                # JPEG drafts decode at down to 1/8 of the size
+                if pixels // (64 if img.format == "JPEG" else 1) <= \
+                        ZOOM_MAX_DECODE_PIXELS:
+                    ratio = min(1.0, (ZOOM_BASE_PIXELS / pixels) ** 0.5)
+                    self.sources.append(
+                        (frame, max(1, int(width * ratio)), False))
+            self.sources.sort(key=lambda source: -source[1])
+        # The largest scale that can be served sharply, or 0 if no
+        # resolution of the image can be decoded within the budget
+        self.max_scale = (min(1.0, self.sources[0][1] / self.size[0])
+                          if self.sources else 0)
+
+    def set_viewport(self, width, height):
+        """Sizes the tile cache to a few screenfuls of the viewport."""
+        per_screen = (width // ZOOM_TILE + 2) * (height // ZOOM_TILE + 2)
+        with self.lock:
+            self.max_tiles = per_screen * ZOOM_CACHE_SCREENS
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+
+    def peek(self, scale, column, row):
+        """Returns a rendered tile, or None."""
+        with self.lock:
+            tile = self.tiles.get((scale, column, row))
+            if tile is not None:
+                self.tiles.move_to_end((scale, column, row))
+            return tile
+
+    def read_region(self, box, scale):
+        """Returns the region box (full resolution coordinates) from the
+        smallest source that has at least `scale` resolution."""
+        frame, source_width, partial = self.sources[0]
+        for candidate in self.sources:
+            if candidate[1] >= self.size[0] * scale:
+                frame, source_width, partial = candidate
+        if partial:
+            ratio = source_width / self.size[0]
+            return load_tiled_region(
+                self.file_path, frame,
+                tuple(int(value * ratio) for value in box))
+        if self.decoded is None or self.decoded[0] != frame:
+            # Release the previous decode before making the next one
+            self.decoded = None
+            with open_large_image(self.file_path) as img:
+                if frame:
+                    img.seek(frame)
+                size = (source_width,
+                        max(1, source_width * img.height // img.width))
+                if img.width > source_width:
+                    img.draft(None, size)
+                img.load()
+                if img.size != size:
+                    # Keep only the base level; the full decode is freed
+                    img = img.resize(size, resample=Resampling.LANCZOS,
+                                     reducing_gap=2.0)
+                self.decoded = (frame, img)
+        img = self.decoded[1]
+        ratio = img.width / self.size[0]
+        return img.crop(tuple(int(value * ratio) for value in box))
+
+    def get_tile(self, scale, column, row):
+        """Renders tile (column, row) of the image scaled by `scale`."""
+        tile = self.peek(scale, column, row)
+        if tile is not None:
+            return tile
+        level_width = max(1, int(self.size[0] * scale))
+        level_height = max(1, int(self.size[1] * scale))
+        left, top = column * ZOOM_TILE, row * ZOOM_TILE
+        right = min(left + ZOOM_TILE, level_width)
+        bottom = min(top + ZOOM_TILE, level_height)
+        box = (left / scale, top / scale, right / scale, bottom / scale)
+        region = self.read_region(box, scale)
+        if region.mode not in ("RGB", "RGBA"):
+            region = region.convert("RGBA" if "A" in region.mode
+                                    or region.mode == "P" else "RGB")
+        size = (max(1, right - left), max(1, bottom - top))
+        factor = int(min(region.width / size[0], region.height / size[1]))
+        if factor >= 2:
+            region = region.reduce(factor)
+        tile = region.resize(size, resample=Resampling.LANCZOS)
+        with self.lock:
+            self.tiles[(scale, column, row)] = tile
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+class AnimationDecoder:
+    """Decodes the frames of an animated GIF or WebP on demand, scaled to
+    the preview size, into a bounded LRU of frames. Frames must be decoded
+    on a single thread (ANIMATION_LANE); peek() may be called from the
+    main thread."""
+    def __init__(self, file_path, width, height):
+        self.image = Image.open(file_path)
+        self.frame_count = getattr(self.image, "n_frames", 1)
+        self.width = max(1, width)
+        self.height = max(1, height)
+        self.max_frames = max(2, ANIMATION_CACHE_BYTES //
+                              (self.width * self.height * 4))
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+
+    def peek(self, index):
+        """Returns a decoded (frame, delay), or None."""
+        with self.lock:
+            cached = self.frames.get(index)
+            if cached is not None:
+                self.frames.move_to_end(index)
+            return cached
+
+    def decode(self, index):
+        """Returns (frame, delay) for a frame, decoding it if needed."""
+        cached = self.peek(index)
+        if cached is not None:
+            return cached
+        self.image.seek(index)
+        delay = self.image.info.get("duration") or ANIMATION_DEFAULT_DELAY
+        frame = fit_image(self.image.convert("RGBA"), self.width,
+                          self.height)
+        with self.lock:
+            self.frames[index] = (frame, delay)
+            while len(self.frames) > self.max_frames:
+                self.frames.popitem(last=False)
+        return frame, delay
+
+    def close(self):
+        """Closes the image file."""
+        self.image.close()
+
+class PdfRenderer:
+    """Renders PDF pages for the paged preview.
+
+    Keeps the most recently used documents open and the most recently
+    rendered pages in memory, both as LRUs. Rendering must run on a single
+    thread (PDF_LANE); peek() may be called from the main thread.
+    """
+    def __init__(self, documents=PDF_DOCUMENT_CACHE_SIZE,
+                 pages=PDF_PAGE_CACHE_SIZE):
+        self.max_documents = documents
+        self.max_pages = pages
+        self.documents = OrderedDict()
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_path, page_number, width, height):
+        """Returns the key of a rendered page, or None if the file cannot
+        be read."""
+        try:
+            mtime = os.stat(file_path).st_mtime_ns
+        except OSError:
+            return None
+        return (file_path, mtime, page_number, width, height)
+
+    def get_document(self, file_path, mtime):
+        """Returns an open document, reopening it if the file changed."""
+        cached = self.documents.get(file_path)
+        if cached is not None and cached[0] == mtime:
+            self.documents.move_to_end(file_path)
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        doc = fitz.open(file_path)
+        self.documents[file_path] = (mtime, doc)
+        while len(self.documents) > self.max_documents:
+            _, (_, old_doc) = self.documents.popitem(last=False)
+            old_doc.close()
+        return doc
+
+    def peek(self, file_path, page_number, width, height):
+        """Returns a rendered (image, page_count), or None."""
+        key = self.make_key(file_path, page_number, width, height)
+        with self.lock:
+            cached = self.pages.get(key)
+            if cached is not None:
+                self.pages.move_to_end(key)
+            return cached
+
+    def render(self, file_path, page_number, width, height):
+        """Returns (image, page_count) for a page, rendering it if it is
+        not cached. Raises IndexError for pages past the end."""
+        key = self.make_key(file_path, page_number, width, height)
+        if key is None:
+            raise FileNotFoundError(file_path)
+        cached = self.peek(file_path, page_number, width, height)
+        if cached is not None:
+            return cached
+        doc = self.get_document(file_path, key[1])
+        if not 0 <= page_number < doc.page_count:
+            raise IndexError(f"page {page_number + 1} of {doc.page_count}")
+        result = (render_pdf_page(doc, page_number, width, height),
+                  doc.page_count)
+        with self.lock:
+            self.pages[key] = result
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        return result
+
+    def close(self):
+        """Closes all open documents."""
+        for _, doc in self.documents.values():
+            doc.close()
+        self.documents.clear()
+
+class EventBus:
+    """Publishes change events to subscribers, coalesced per Tk idle
+    cycle: each subscriber is called at most once per cycle, with the list
+    of (event, args) it subscribed to, in publication order."""
     def __init__(self, root):
         self.root = root
-        self.root.title("Tagz - File Tagging App")
-        self.root.geometry("1200x800")
-        self.root.minsize(900, 600)
-        pygame.mixer.init()
-        self.audio_playing = False
-        self.current_audio = None
-        self.config = configparser.ConfigParser()
-        self.load_config()
-        self.current_directory = self.config.get("Settings", "last_directory",
-                                                 fallback=os.getcwd())
-        self.recent_directories = self.get_recent_directories()
-        self.files = []
-        self.filtered_files = []
-        self.current_file = None
-        self.search_tags = []
-        self.view_mode = tk.StringVar(value="local")
-        # Apply a theme (e.g., 'clam','alt','default',
-        #                      'classic','vista','xpams')
-        s = ttk.Style()
-        s.theme_use('clam')  # Try different themes
-        # --- OR ---
-        # Customize specific elements
-        # s.configure('TLabel', background='lightgray', padding=5)
-        # s.configure('TButton', padding=5, font=('Helvetica', 10))
-        self.init_ui()
-        self.root.after_idle(self.refresh_file_list)
-        self.root.after_idle(self.update_media_lengths)
+        self.subscribers = []
+        self.pending = []
+        self.flush_scheduled = False
 
-    def load_config(self):
-        """Load configuration from file."""
-        if os.path.exists(CONFIG_FILE):
-            self.config.read(CONFIG_FILE)
-        if not self.config.has_section("Settings"):
-            self.config.add_section("Settings")
-        if not self.config.has_section("RecentDirectories"):
-            self.config.add_section("RecentDirectories")
+    def subscribe(self, events, callback):
+        """Calls callback(events) for the given event names."""
+        self.subscribers.append((set(events), callback))
 
-    def save_config(self):
-        """Save configuration to file."""
-        with open(CONFIG_FILE, "w") as f:
-            self.config.write(f)
+    def publish(self, event, *args):
+        """Queues an event for delivery on the next idle cycle."""
+        self.pending.append((event, args))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after_idle(self.flush)
 
-    def get_recent_directories(self):
-        """Get list of recent directories from config."""
-        if not self.config.has_section("RecentDirectories"):
-            return []
-        return [dir for _, dir in self.config.items("RecentDirectories")]
+    def flush(self):
+        """Delivers the queued events."""
+        self.flush_scheduled = False
+        events, self.pending = self.pending, []
+        for names, callback in self.subscribers:
+            matching = [event for event in events if event[0] in names]
+            if matching:
+                try:
+                    callback(matching)
+                except Exception as e:
+                    print(f"Error handling events: {e}")
 
-    def add_recent_directory(self, directory):
-        """Add directory to recent list."""
-        if not self.config.has_section("RecentDirectories"):
-            self.config.add_section("RecentDirectories")
-        for key, value in self.config.items("RecentDirectories"):
-            if value == directory:
-                self.config.remove_option("RecentDirectories", key)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        self.config.set("RecentDirectories", timestamp, directory)
-        items = list(self.config.items("RecentDirectories"))
-        if len(items) > 10:
-            items.sort(reverse=True)
-            for key, _ in items[10:]:
-                self.config.remove_option("RecentDirectories", key)
-        self.recent_directories = self.get_recent_directories()
-        self.directory_dropdown["values"] = self.recent_directories
+class TagAssociations:
+    """Counts of which tags occur together and which filename tokens occur
+    with which tags, kept up to date one tag change at a time. Used to
+    suggest tags that files like the current one usually have."""
+    def __init__(self):
+        self.cooccurrence = {}
+        self.token_tags = {}
+        self.token_counts = Counter()
 
-    def init_ui(self):
-        """Initializes the user interface."""
-        self.top_frame = ttk.Frame(self.root)
-        self.top_frame.pack(fill="x", pady=5, padx=10)
-        self.middle_frame = tk.Frame(self.root)
-        self.middle_frame.pack(fill="both", expand=True, pady=5, padx=10)
-        self.bottom_frame = tk.Frame(self.root)
-        self.bottom_frame.pack(fill="x", pady=5, padx=10)
-        directory_frame = tk.Frame(self.top_frame)
-        directory_frame.pack(fill="x")
-        tk.Label(directory_frame, text="Directory:").pack(side="left", padx=5)
-        self.directory_var = tk.StringVar(value=self.current_directory)
-        self.directory_dropdown = ttk.Combobox(directory_frame,
-                                               textvariable=self.directory_var,
-                                               width=60)
-        self.directory_dropdown["values"] = self.recent_directories
-        self.directory_dropdown.pack(side="left", padx=5, fill="x",
-                                     expand=True)
-        self.directory_dropdown.bind("<Return>",
-                                     lambda e: self.change_directory())
-        tk.Button(directory_frame, text="Go",
-                  command=self.change_directory,
-                  bg="orange").pack(side="left", padx=5)
-        tk.Button(directory_frame, text="Browse...",
-                  command=self.browse_directory,
-                  bg="orange").pack(side="left", padx=5)
-        filter_frame = tk.Frame(self.top_frame)
-        filter_frame.pack(fill="x", pady=5)
+    @staticmethod
+    def get_tokens(file_path):
+        """Returns the filename tokens of a file (as used for suggested
+        tags)."""
+        return cached_suggested_tags(os.path.basename(file_path))
+
+    def rebuild(self, tags_by_path):
+        """Recounts everything from {path: tags}."""
+        self.cooccurrence = {}
+        self.token_tags = {}
+        self.token_counts = Counter()
+        for file_path, tags in tags_by_path.items():
+            for index, tag in enumerate(tags):
+                self.add_tag(file_path, tags[:index], tag)
+
+    def add_tag(self, file_path, existing_tags, tag):
+        """Records that a file with existing_tags gained tag."""
+        pairs = self.cooccurrence.setdefault(tag, Counter())
+        for other in existing_tags:
+            pairs[other] += 1
+            self.cooccurrence.setdefault(other, Counter())[tag] += 1
+        for token in self.get_tokens(file_path):
+            self.token_tags.setdefault(token, Counter())[tag] += 1
+            if not existing_tags:
+                self.token_counts[token] += 1
+
+    def remove_tag(self, file_path, remaining_tags, tag):
+        """Records that a file lost tag and still has remaining_tags."""
+        pairs = self.cooccurrence.get(tag, Counter())
+        for other in remaining_tags:
+            self.decrement(pairs, other)
+            self.decrement(self.cooccurrence.get(other, Counter()), tag)
+        if not pairs:
+            self.cooccurrence.pop(tag, None)
+        for token in self.get_tokens(file_path):
+            counts = self.token_tags.get(token)
+            if counts is not None:
+                self.decrement(counts, tag)
+                if not counts:
+                    del self.token_tags[token]
+            if not remaining_tags:
+                self.decrement(self.token_counts, token)
+
+    @staticmethod
+    def decrement(counter, key):
+        """Lowers a count, dropping it at zero."""
+        if counter.get(key, 0) > 1:
+            counter[key] -= 1
+        else:
+            counter.pop(key, None)
+
+    def move(self, old_path, new_path, tags):
+        """Re-counts a file's tokens after a rename."""
+        for index in range(len(tags) - 1, -1, -1):
+            self.remove_tag(old_path, tags[:index], tags[index])
+        for index, tag in enumerate(tags):
+            self.add_tag(new_path, tags[:index], tag)
+
+    def rank(self, file_path, current_tags, tag_counts,
+             limit=RELATED_TAG_LIMIT):
+        """Returns tags the file does not have, best first, scored by how
+        often they occur with its tags and with its filename tokens."""
+        scores = Counter()
+        for tag in current_tags:
+            support = tag_counts.get(tag, 0)
+            if support < RELATED_TAG_MIN_SUPPORT:
+                continue
+            for other, count in self.cooccurrence.get(tag, {}).items():
+                scores[other] += count / support
+        for token in self.get_tokens(file_path):
+            support = self.token_counts.get(token, 0)
+            if support < RELATED_TAG_MIN_SUPPORT:
+                continue
+            for other, count in self.token_tags.get(token, {}).items():
+                scores[other] += count / support
+        current = set(current_tags)
+        ranked = sorted((tag for tag, score in scores.items()
+                         if score >= RELATED_TAG_MIN_SCORE
+                         and tag not in current),
+                        key=lambda tag: (-scores[tag], tag))
+        return ranked[:limit]
+
+def read_tag_store(tag_file):
+    """Reads a tags file into ({path: tags}, tag counts, TagAssociations),
+    so the associations are counted off the main thread."""
+    tags_by_path = {path: list(tags)
+                    for path, tags in read_tag_data(tag_file).items()}
+    tag_counts = Counter(tag for tags in tags_by_path.values()
+                         for tag in tags)
+    associations = TagAssociations()
+    associations.rebuild(tags_by_path)
+    return tags_by_path, tag_counts, associations
+
+class TagStore:
+    """In-memory copy of the master tags file. Changes update memory at
+    once, publish tag events and are written to disk as one batch on the
+    tag I/O lane, so reading the tag set never touches the disk."""
+    def __init__(self, scheduler, events):
+        self.scheduler = scheduler
+        self.events = events
+        self.tags_by_path = {}
+        self.tag_counts = Counter()
+        self.sorted_tags = None
+        self.loaded = False
+        self.early_changes = []
+        self.associations = TagAssociations()
+
+    def load(self):
+        """Reads the tags file in the background."""
+        self.scheduler.submit(read_tag_store, TAG_FILE, lane=TAG_IO_LANE,
+                              on_done=self.on_loaded)
+
+    def on_loaded(self, result):
+        """Replaces the in-memory copy, keeping changes made meanwhile."""
+        self.tags_by_path, self.tag_counts, self.associations = result
+        self.loaded = True
+        for change in self.early_changes:
+            self.apply_in_memory(*change)
+        self.early_changes = []
+        self.sorted_tags = None
+        self.events.publish(EVENT_TAG_SET_CHANGED)
+
+    def all_tags(self):
+        """Returns a sorted list of all tags in the master file."""
+        if self.sorted_tags is None:
+            self.sorted_tags = sorted(self.tag_counts)
+        return self.sorted_tags
+
+    def apply_in_memory(self, file_path, tag, add):
+        """Applies one change; returns True if the tag set changed."""
+        tags = self.tags_by_path.setdefault(file_path, [])
+        set_changed = False
+        if add and tag not in tags:
+            self.associations.add_tag(file_path, tags, tag)
+            tags.append(tag)
+            self.tag_counts[tag] += 1
+            set_changed = self.tag_counts[tag] == 1
+        elif not add and tag in tags:
+            tags.remove(tag)
+            self.associations.remove_tag(file_path, tags, tag)
+            self.tag_counts[tag] -= 1
+            if not self.tag_counts[tag]:
+                del self.tag_counts[tag]
+                set_changed = True
+        if not tags:
+            del self.tags_by_path[file_path]
+        return set_changed
+
+    def apply(self, changes):
+        """Applies (file_path, tag, add) changes: memory first, then one
+        background write for the whole batch."""
+        changes = [change for change in changes if change[1].strip()]
+        if not changes:
+            return
+        set_changed = False
+        for file_path, tag, add in changes:
+            if not self.loaded:
+                self.early_changes.append((file_path, tag, add))
+            set_changed |= self.apply_in_memory(file_path, tag, add)
+            self.events.publish(EVENT_TAG_ADDED if add else EVENT_TAG_REMOVED,
+                                file_path, tag)
+        if set_changed:
+            self.sorted_tags = None
+            self.events.publish(EVENT_TAG_SET_CHANGED)
+        self.scheduler.submit(apply_tag_changes, changes, lane=TAG_IO_LANE)
+
+    def related_tags(self, file_path):
+        """Returns tags that often go with the file's tags and name."""
+        return self.associations.rank(
+            file_path, self.tags_by_path.get(file_path, []), self.tag_counts)
+
+    def move(self, old_path, new_path):
+        """Records that a file (and its tags, already moved on disk) now
+        lives at new_path."""
+        tags = self.tags_by_path.pop(old_path, None)
+        if tags is not None:
+            self.tags_by_path[new_path] = tags
+            self.associations.move(old_path, new_path, tags)
+        self.events.publish(EVENT_FILE_MOVED, old_path, new_path)
+
+class CancelToken:
+    """Cooperative cancellation flag for background tasks, optionally with
+    a deadline (in seconds) after which the task counts as cancelled."""
+    def __init__(self, deadline=None):
+        self.cancelled = False
+        self.deadline = None
+        if deadline is not None:
+            self.deadline = time.monotonic() + deadline
+
+    def cancel(self):
+        """Marks the task as cancelled."""
+        self.cancelled = True
+
+    def is_cancelled(self):
+        """True if cancelled or past the deadline."""
+        return self.cancelled or (self.deadline is not None
+                                  and time.monotonic() > self.deadline)
+
+class TaskScheduler:
+    """Runs blocking work off the Tk main thread.
+
+    Tasks go into a priority queue served by a pool of worker threads, or
+    into a named serial lane when their order matters. CPU-bound tasks can
+    be sent on to a process pool. Results come back through one completion
+    queue that the main thread polls with root.after, so callbacks may
+    touch Tk widgets. Callbacks of cancelled or expired tasks are dropped.
+    """
+    def __init__(self, root, threads=SCHEDULER_THREADS,
+                 poll_ms=SCHEDULER_POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.completed = queue.Queue()
+        self.lanes = {}
+        self.process_pool = None
+        self.process_pool_lock = threading.Lock()
+        self.running = True
+        for _ in range(threads):
+            threading.Thread(target=self.worker_loop, daemon=True).start()
+        self.root.after(self.poll_ms, self.poll)
+
+    def submit(self, func, *args, priority=PRIORITY_NORMAL, on_done=None,
+               on_error=None, token=None, deadline=None, lane=None,
+               process=False, pass_token=False):
+        """Queues func(*args) and returns its CancelToken. on_done(result)
+        or on_error(exception) run on the main thread. With pass_token the
+        token is passed as a `token` keyword for cooperative checks."""
+        if token is None:
+            token = CancelToken(deadline)
+        elif deadline is not None:
+            token.deadline = time.monotonic() + deadline
+        task = (func, args, on_done, on_error, token, process, pass_token)
+        if lane is not None:
+            self.get_lane(lane).put(task)
+        else:
+            with self.condition:
+                heapq.heappush(self.heap,
+                               (priority, next(self.counter), task))
+                self.condition.notify()
+        return token
+
+    def get_lane(self, name):
+        """Returns the queue of a serial lane, starting its thread."""
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = self.lanes[name] = queue.Queue()
+            threading.Thread(target=self.lane_loop, args=(lane,),
+                             daemon=True).start()
+        return lane
+
+    def worker_loop(self):
+        """Runs queued tasks in priority order."""
+        while True:
+            with self.condition:
+                while self.running and not self.heap:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                _, _, task = heapq.heappop(self.heap)
+            self.run_task(task)
+
+    def lane_loop(self, lane):
+        """Runs the tasks of one lane in submission order."""
+        while self.running:
+            task = lane.get()
+            if task is None:
+                return
+            self.run_task(task)
+
+    def get_process_pool(self):
+        """Returns the process pool, creating it on first use."""
+        with self.process_pool_lock:
+            if self.process_pool is None:
+                self.process_pool = ProcessPoolExecutor()
+            return self.process_pool
+
+    def run_task(self, task):
+        """Runs one task and queues its result for the main thread."""
+        func, args, on_done, on_error, token, process, pass_token = task
+        if token.is_cancelled():
+            return
+        try:
+            if process:
+                # The chunk runs in another process; its result is handed
+                # back from the pool's callback, not by holding this thread
+                future = self.get_process_pool().submit(func, *args)
+                future.add_done_callback(functools.partial(
+                    self.on_process_done, on_done, on_error, token))
+                return
+            if pass_token:
+                result = func(*args, token=token)
+            else:
+                result = func(*args)
+        except Exception as e:
+            self.completed.put((on_error, e, token, True))
+            return
+        self.completed.put((on_done, result, token, False))
+
+    def on_process_done(self, on_done, on_error, token, future):
+        """Queues the outcome of a process pool task for the main thread."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.completed.put((on_error, error, token, True))
+        else:
+            self.completed.put((on_done, future.result(), token, False))
+
+    def poll(self):
+        """Delivers finished tasks to their callbacks on the main thread."""
+        while True:
+            try:
+                callback, value, token, failed = self.completed.get_nowait()
+            except queue.Empty:
+                break
+            if token.is_cancelled():
+                continue
+            if callback is None:
+                if failed:
+                    print(f"Background task error: {value}")
+                continue
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Error handling background task result: {e}")
+        if self.running:
+            self.root.after(self.poll_ms, self.poll)
+
+    def wait_for_lane(self, name, timeout):
+        """Blocks until the tasks queued on a lane so far have run, or for
+        at most timeout seconds. Returns True if the lane caught up."""
+        done = threading.Event()
+        self.submit(done.set, lane=name)
+        return done.wait(timeout)
+
+    def shutdown(self):
+        """Stops the workers; queued tasks are abandoned."""
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        for lane in self.lanes.values():
+            lane.put(None)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+class FileNameIndex:
+    """Trigram index over file names (and optionally full paths) supporting
+    substring, prefix and typo-tolerant fuzzy search."""
+    def __init__(self, include_paths=False):
+        self.include_paths = include_paths
+        self.postings = {}
+        self.texts = {}
+
+    @staticmethod
+    def trigrams(text, padded=True):
+        """Returns the set of trigrams of text; padding adds word-start and
+        word-end trigrams so short names and prefixes are indexed too."""
+        if padded:
+            text = f"  {text} "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def build(self, files):
+        """Indexes a list of file records from scratch."""
+        self.postings = {}
+        self.texts = {}
+        for file in files:
+            self.add(file["path"], file["name"])
+
+    def add(self, path, name):
+        """Adds or re-indexes a single file."""
+        if path in self.texts:
+            self.remove(path)
+        text = path.lower() if self.include_paths else name.lower()
+        self.texts[path] = text
+        for gram in self.trigrams(text):
+            self.postings.setdefault(gram, set()).add(path)
+
+    def remove(self, path):
+        """Removes a file from the index."""
+        text = self.texts.pop(path, None)
+        if text is None:
+            return
+        for gram in self.trigrams(text):
+            paths = self.postings.get(gram)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.postings[gram]
+
+    def find_substring(self, query):
+        """Returns the set of paths whose text contains query."""
+        query = query.lower()
+        grams = self.trigrams(query, padded=False)
+        if not grams:
+            # Too short for trigrams: a linear scan is cheap enough
+            return {path for path, text in self.texts.items()
+                    if query in text}
+        postings = sorted((self.postings.get(gram, set()) for gram in grams),
+                          key=len)
+        candidates = set(postings[0])
+        for paths in postings[1:]:
+            candidates &= paths
+            if not candidates:
+                return candidates
+        return {path for path in candidates if query in self.texts[path]}
+
+    def find_prefix(self, query):
+        """Returns the set of paths whose text starts with query."""
+        query = query.lower()
+        grams = self.trigrams(query)
+        # Drop the trailing padded trigram, the prefix continues past it
+        grams.discard(f"{query[-2:]} " if len(query) > 1 else f" {query} ")
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            paths = self.postings.get(gram, set())
+            candidates = set(paths) if candidates is None else candidates & paths
+            if not candidates:
+                return set()
+        if candidates is None:
+            candidates = set(self.texts)
+        return {path for path in candidates
+                if self.texts[path].startswith(query)}
+
+    def find_fuzzy(self, query, min_score=FUZZY_MIN_SCORE):
+        """Returns {path: score} for paths containing a likely typo of query.
+        Trigram overlap picks the candidates, which are then scored by
+        similarity against runs of words in the name."""
+        query = query.lower()
+        query_grams = self.trigrams(query)
+        min_shared = max(1, int(len(query_grams) * 0.3))
+        hits = Counter()
+        for gram in query_grams:
+            hits.update(self.postings.get(gram, ()))
+        query_words = FUZZY_WORD_SPLIT.split(query.strip())
+        query_text = " ".join(word for word in query_words if word)
+        window = max(1, len(query_text.split()))
+        scores = {}
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(query_text)
+        for path, shared in hits.items():
+            if shared < min_shared:
+                continue
+            words = [word for word in
+                     FUZZY_WORD_SPLIT.split(self.texts[path]) if word]
+            best = 0.0
+            for i in range(max(1, len(words) - window + 1)):
+                matcher.set_seq1(" ".join(words[i:i + window]))
+                if matcher.real_quick_ratio() > best \
+                        and matcher.quick_ratio() > best:
+                    best = max(best, matcher.ratio())
+            if best >= min_score:
+                scores[path] = best
+        return scores
+
+    def search(self, query, limit=None, fuzzy=True):
+        """Returns paths ranked exact, prefix, word-start, substring and then
+        fuzzy matches, best first."""
+        query = query.lower().strip()
+        if not query:
+            return []
+        ranked = {}
+        for path in self.find_substring(query):
+            text = self.texts[path]
+            name = os.path.basename(text) if self.include_paths else text
+            stem = os.path.splitext(name)[0]
+            position = text.find(query)
+            if name == query or stem == query:
+                tier = 0
+            elif name.startswith(query):
+                tier = 1
+            elif position == 0 or not text[position - 1].isalnum():
+                # The start of the text counts as a word start
+                tier = 2
+            else:
+                tier = 3
+            ranked[path] = (tier, 0.0, len(text))
+        if fuzzy:
+            for path, score in self.find_fuzzy(query).items():
+                if path not in ranked:
+                    ranked[path] = (4, -score, len(self.texts[path]))
+        results = sorted(ranked, key=lambda path: (ranked[path], path))
+        return results[:limit] if limit else results
+
+def search_files(files, query="", tags=None, index=None, fuzzy=True,
+                 limit=None):
+    """Headless search: files matching query (ranked) and all of tags.
+    An existing FileNameIndex over files may be passed to avoid a rebuild."""
+    files = search_files_by_tags(files, tags or [])
+    if not query:
+        return files[:limit] if limit else files
+    if index is None:
+        index = FileNameIndex()
+        index.build(files)
+    files_by_path = {file["path"]: file for file in files}
+    results = [files_by_path[path]
+               for path in index.search(query, fuzzy=fuzzy)
+               if path in files_by_path]
+    return results[:limit] if limit else results
+
+def load_tagged_files():
+    """Returns lightweight file records for every path in the global tags
+    file, without touching the files themselves."""
+    if not os.path.exists(TAG_FILE):
+        return []
+    with open(TAG_FILE, "r") as f:
+        try:
+            tags_data = json.load(f)
+        except json.JSONDecodeError:
+            return []
+    files = []
+    for file_path, tags in tags_data.items():
+        file_name = os.path.basename(file_path)
+        files.append({
+            "name": file_name,
+            "name_lower": file_name.lower(),
+            "path": file_path,
+            "tags": tags
+        })
+    return files
+
+def run_headless_search(argv):
+    """Command line search over the global tags file."""
+    parser = argparse.ArgumentParser(
+        prog="Tagz.py --search",
+        description="Search tagged files by name and tags.")
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--tag", action="append", default=[],
+                        help="require this tag (repeatable)")
+    parser.add_argument("--paths", action="store_true",
+                        help="match against full paths, not just names")
+    parser.add_argument("--exact", action="store_true",
+                        help="disable fuzzy matching")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+    files = search_files_by_tags(load_tagged_files(), args.tag)
+    index = FileNameIndex(include_paths=args.paths)
+    index.build(files)
+    for file in search_files(files, args.query, index=index,
+                             fuzzy=not args.exact, limit=args.limit):
+        print(f"{file['path']}\t{', '.join(file['tags'])}")
+    return 0
+
+class TagChipPanel:
+    """A row of tag chips inside a frame. Chip widgets are pooled and the
+    desired tag list is diffed against what is shown, so only chips that
+    changed are created, reconfigured or hidden."""
+    def __init__(self, frame, command, title=None, empty_text=None,
+                 removable=False):
+        self.frame = frame
+        self.command = command
+        self.title = title
+        self.empty_text = empty_text
+        self.removable = removable
+        self.header = tk.Label(frame)
+        self.header_visible = False
+        self.shown = []
+        self.chips = {}
+        self.free_chips = []
+
+    def create_chip(self):
+        """Creates a chip widget; its tag is looked up when clicked so that
+        pooled chips can be reassigned to other tags."""
+        chip = {"tag": None}
+        if self.removable:
+            chip["widget"] = tk.Frame(self.frame, bd=1, relief="raised",
+                                      padx=2, pady=2)
+            chip["label"] = tk.Label(chip["widget"])
+            chip["label"].pack(side="left")
+            tk.Button(chip["widget"], text="✕", bd=0, padx=2, pady=0,
+                      command=lambda: self.command(chip["tag"])
+                      ).pack(side="left")
+        else:
+            chip["widget"] = tk.Button(
+                self.frame, padx=5, pady=2,
+                command=lambda: self.command(chip["tag"]))
+            chip["label"] = chip["widget"]
+        return chip
+
+    def set_header(self, text):
+        """Shows text before the chips, or hides the header if None."""
+        if text is None:
+            if self.header_visible:
+                self.header.pack_forget()
+                self.header_visible = False
+            return
+        if self.header.cget("text") != text:
+            self.header.config(text=text)
+        if not self.header_visible:
+            if self.shown:
+                self.header.pack(side="left", padx=5,
+                                 before=self.chips[self.shown[0]]["widget"])
+            else:
+                self.header.pack(side="left", padx=5)
+            self.header_visible = True
+
+    def set_tags(self, tags):
+        """Shows exactly tags, in order, touching only the chips that
+        differ from the current display."""
+        tags = list(dict.fromkeys(tags))
+        if tags == self.shown:
+            self.set_header(self.title if tags else self.empty_text)
+            return
+        new_tags = set(tags)
+        # Hide chips for tags that are gone and return them to the pool
+        for tag in self.shown:
+            if tag not in new_tags:
+                chip = self.chips.pop(tag)
+                chip["widget"].pack_forget()
+                self.free_chips.append(chip)
+        kept = [tag for tag in self.shown if tag in new_tags]
+        # Kept chips only need re-packing if their relative order changed
+        if kept != [tag for tag in tags if tag in self.chips]:
+            for tag in kept:
+                self.chips[tag]["widget"].pack_forget()
+            kept = []
+        packed = set(kept)
+        # New chips are packed in front of the next chip that stays
+        next_kept = [None] * len(tags)
+        following = None
+        for index in range(len(tags) - 1, -1, -1):
+            next_kept[index] = following
+            if tags[index] in packed:
+                following = tags[index]
+        for index, tag in enumerate(tags):
+            chip = self.chips.get(tag)
+            if chip is None:
+                chip = (self.free_chips.pop() if self.free_chips
+                        else self.create_chip())
+                chip["tag"] = tag
+                chip["label"].config(text=tag)
+                self.chips[tag] = chip
+            if tag not in packed:
+                if next_kept[index] is None:
+                    chip["widget"].pack(side="left", padx=2, pady=2)
+                else:
+                    chip["widget"].pack(
+                        side="left", padx=2, pady=2,
+                        before=self.chips[next_kept[index]]["widget"])
+        self.shown = tags
+        self.set_header(self.title if tags else self.empty_text)
+
+    def clear(self):
+        """Hides all chips and the header."""
+        self.set_tags([])
+        self.set_header(None)
+
+class TagzApp:
+    """Class for tagging application"""
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Tagz - File Tagging App")
+        self.root.geometry("1200x800")
+        self.root.minsize(900, 600)
+        pygame.mixer.init()
+        self.audio_playing = False
+        self.current_audio = None
+        self.config = configparser.ConfigParser()
+        self.load_config()
+        self.current_directory = self.config.get("Settings", "last_directory",
+                                                 fallback=os.getcwd())
+        self.recent_directories = self.get_recent_directories()
+        self.files = []
+        self.filtered_files = []
+        # O(1) lookups used by all selection-driven operations
+        self.files_by_path = {}
+        self.item_by_path = {}
+        self.path_by_item = {}
+        self.current_file = None
+        self.search_tags = []
+        # Debounced, incremental name filter state
+        self.filter_after_id = None
+        self.filter_generation = 0
+        self.name_filter_text = ""
+        self.name_filter_matches = None
+        self.name_index = None
+        self.name_index_generation = 0
+        self.view_mode = tk.StringVar(value="local")
+        # Virtual list state: selection is tracked by path because rows are
+        # recycled as the viewport scrolls.
+        self.virtual_list_active = False
+        self.virtual_offset = 0
+        self.virtual_row_items = []
+        self.selected_paths = set()
+        self.virtual_anchor_index = 0
+        self.virtual_cursor_index = 0
+        # Blocking work (scans, durations, tag I/O, previews) runs on the
+        # scheduler; these tokens cancel work that has become stale
+        self.scheduler = TaskScheduler(self.root)
+        # Tag changes, moves and metadata updates are published as events;
+        # panels subscribe and redraw once per idle cycle
+        self.events = EventBus(self.root)
+        self.tag_store = TagStore(self.scheduler, self.events)
+        self.tag_store.load()
+        self.thumbnail_cache = ThumbnailCache(
+            self.config.get("Settings", "thumbnail_cache_dir",
+                            fallback=THUMBNAIL_CACHE_DIR),
+            self.config.getint("Settings", "thumbnail_cache_mb",
+                               fallback=THUMBNAIL_CACHE_MB) * 1024 * 1024)
+        self.video_thumbnail_offset = self.config.getfloat(
+            "Settings", "video_thumbnail_offset",
+            fallback=VIDEO_THUMBNAIL_OFFSET)
+        self.pdf_renderer = PdfRenderer()
+        self.pdf_token = None
+        self.pdf_page = 0
+        self.pdf_page_count = 0
+        self.video_filmstrip_frames = self.config.getint(
+            "Settings", "video_filmstrip_frames",
+            fallback=VIDEO_FILMSTRIP_FRAMES)
+        # Auto-tagging rules, recompiled when the rules file changes; files
+        # waiting on a duration are tagged when it arrives. The paths
+        # already seen are loaded in the background (None until then)
+        self.rules_file = self.config.get("Settings", "rules_file",
+                                          fallback=RULES_FILE)
+        self.tag_rules = None
+        self.tag_rules_mtime = None
+        self.rules_seen_file = self.config.get(
+            "Settings", "rules_seen_file", fallback=RULES_SEEN_FILE)
+        self.rules_seen_paths = None
+        self.rules_seen_changed = False
+        self.scheduler.submit(read_rules_seen, self.rules_seen_file,
+                              lane=TAG_IO_LANE, on_done=self.on_rules_seen)
+        self.rules_pending_paths = set()
+        self.rules_token = None
+        self.bulk_token = None
+        self.bulk_suggestions = {}
+        self.bulk_pending = 0
+        self.metadata_cache = MetadataCache(
+            self.config.get("Settings", "metadata_cache_file",
+                            fallback=METADATA_CACHE_FILE))
+        # Queued ahead of the first scan on the same lane, so the cache is
+        # filled by the time files are listed
+        self.scheduler.submit(self.metadata_cache.load, lane=TAG_IO_LANE)
+        self.metadata_token = None
+        self.metadata_pdf_paths = []
+        self.scan_token = None
+        self.lengths_token = None
+        self.preview_token = None
+        # Waveforms of long recordings and filmstrips of long videos
+        # outlast PREVIEW_DEADLINE, so they get their own tokens that only
+        # a new selection cancels
+        self.waveform_token = None
+        self.filmstrip_token = None
+        self.prefetch_token = None
+        self.prefetch_direction = 1
+        self.last_preview_index = None
+        self.filtered_positions = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Apply a theme (e.g., 'clam','alt','default',
+        #                      'classic','vista','xpams')
+        s = ttk.Style()
+        s.theme_use('clam')  # Try different themes
+        # --- OR ---
+        # Customize specific elements
+        # s.configure('TLabel', background='lightgray', padding=5)
+        # s.configure('TButton', padding=5, font=('Helvetica', 10))
+        self.init_ui()
+        self.events.subscribe([EVENT_TAG_ADDED, EVENT_TAG_REMOVED,
+                               EVENT_METADATA_UPDATED],
+                              self.on_file_rows_changed)
+        self.events.subscribe([EVENT_TAG_ADDED, EVENT_TAG_REMOVED],
+                              self.on_current_file_tags_changed)
+        self.events.subscribe([EVENT_METADATA_UPDATED],
+                              self.on_current_file_metadata_changed)
+        self.events.subscribe([EVENT_TAG_SET_CHANGED],
+                              self.on_tag_set_changed)
+        self.events.subscribe([EVENT_FILE_MOVED],
+                              lambda events: self.refresh_file_list())
+        self.root.after_idle(self.refresh_file_list)
+
+    def on_close(self):
+        """Stops background work and closes the window."""
+        # Drop the queued PDF work and let the page being rendered finish,
+        # so no render uses a document after it is closed
+        for token in (self.preview_token, self.prefetch_token,
+                      self.gallery_token, self.pdf_token,
+                      self.metadata_token):
+            if token is not None:
+                token.cancel()
+        pdf_idle = self.scheduler.wait_for_lane(PDF_LANE, PDF_CLOSE_TIMEOUT)
+        self.scheduler.shutdown()
+        self.thumbnail_cache.save_index(force=True)
+        self.metadata_cache.save(force=True)
+        if self.rules_seen_changed:
+            write_rules_seen(self.rules_seen_file, self.rules_seen_paths)
+        if pdf_idle:
+            self.pdf_renderer.close()
+        self.root.destroy()
+
+    def load_config(self):
+        """Load configuration from file."""
+        if os.path.exists(CONFIG_FILE):
+            self.config.read(CONFIG_FILE)
+        if not self.config.has_section("Settings"):
+            self.config.add_section("Settings")
+        if not self.config.has_section("RecentDirectories"):
+            self.config.add_section("RecentDirectories")
+
+    def save_config(self):
+        """Save configuration to file."""
+        with open(CONFIG_FILE, "w") as f:
+            self.config.write(f)
+
+    def get_recent_directories(self):
+        """Get list of recent directories from config."""
+        if not self.config.has_section("RecentDirectories"):
+            return []
+        return [dir for _, dir in self.config.items("RecentDirectories")]
+
+    def add_recent_directory(self, directory):
+        """Add directory to recent list."""
+        if not self.config.has_section("RecentDirectories"):
+            self.config.add_section("RecentDirectories")
+        for key, value in self.config.items("RecentDirectories"):
+            if value == directory:
+                self.config.remove_option("RecentDirectories", key)
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        self.config.set("RecentDirectories", timestamp, directory)
+        items = list(self.config.items("RecentDirectories"))
+        if len(items) > 10:
+            items.sort(reverse=True)
+            for key, _ in items[10:]:
+                self.config.remove_option("RecentDirectories", key)
+        self.recent_directories = self.get_recent_directories()
+        self.directory_dropdown["values"] = self.recent_directories
+
+    def init_ui(self):
+        """Initializes the user interface."""
+        self.top_frame = ttk.Frame(self.root)
+        self.top_frame.pack(fill="x", pady=5, padx=10)
+        self.middle_frame = tk.Frame(self.root)
+        self.middle_frame.pack(fill="both", expand=True, pady=5, padx=10)
+        self.bottom_frame = tk.Frame(self.root)
+        self.bottom_frame.pack(fill="x", pady=5, padx=10)
+        directory_frame = tk.Frame(self.top_frame)
+        directory_frame.pack(fill="x")
+        tk.Label(directory_frame, text="Directory:").pack(side="left", padx=5)
+        self.directory_var = tk.StringVar(value=self.current_directory)
+        self.directory_dropdown = ttk.Combobox(directory_frame,
+                                               textvariable=self.directory_var,
+                                               width=60)
+        self.directory_dropdown["values"] = self.recent_directories
+        self.directory_dropdown.pack(side="left", padx=5, fill="x",
+                                     expand=True)
+        self.directory_dropdown.bind("<Return>",
+                                     lambda e: self.change_directory())
+        tk.Button(directory_frame, text="Go",
+                  command=self.change_directory,
+                  bg="orange").pack(side="left", padx=5)
+        tk.Button(directory_frame, text="Browse...",
+                  command=self.browse_directory,
+                  bg="orange").pack(side="left", padx=5)
+        filter_frame = tk.Frame(self.top_frame)
+        filter_frame.pack(fill="x", pady=5)
         tk.Label(filter_frame, text="Filter:").pack(side="left", padx=5)
         self.filter_var = tk.StringVar()
         self.filter_entry = tk.Entry(filter_frame,
                                      textvariable=self.filter_var)
         self.filter_entry.pack(side="left", padx=5, fill="x", expand=True)
-        self.filter_entry.bind("<KeyRelease>", lambda e: self.apply_filters())
+        self.filter_entry.bind("<KeyRelease>", self.schedule_filter)
         tk.Label(filter_frame, text="Tag Filter:").pack(side="left", padx=5)
         self.tag_filter_var = tk.StringVar()
         self.tag_filter_combo = ttk.Combobox(filter_frame,
@@ -512,6 +3060,9 @@ class TagzApp:
                   bg="orange").pack(side="left", padx=5)
         self.active_filters_frame = tk.Frame(self.top_frame)
         self.active_filters_frame.pack(fill="x", pady=5)
+        self.active_filters_panel = TagChipPanel(
+            self.active_filters_frame, self.remove_tag_filter,
+            title="Active Tag Filters:", removable=True)
         self.update_active_filters_display()
         self.current_directory_label = ttk.Label(
             self.top_frame,
@@ -563,17 +3114,71 @@ class TagzApp:
         tk.Button(button_frame, text="Open Folder",
                   command=self.open_containing_folder,
                   bg="yellow").pack(side="left", padx=5)
+        self.gallery_button = tk.Button(button_frame, text="Gallery",
+                                        command=self.toggle_gallery,
+                                        bg="lightblue")
+        self.gallery_button.pack(side="left", padx=5)
+        tk.Button(button_frame, text="Apply Rules...",
+                  command=self.apply_rules_dialog,
+                  bg="lightblue").pack(side="left", padx=5)
+        tk.Button(button_frame, text="Apply Suggestions...",
+                  command=self.suggest_tags_in_bulk,
+                  bg="lightblue").pack(side="left", padx=5)
         self.create_file_tree(file_list_frame)
+        self.create_gallery(file_list_frame)
         preview_frame = tk.LabelFrame(self.middle_frame, text="File Preview")
         preview_frame.grid(row=0, column=1, sticky="nsew", padx=(5, 0))
         self.preview_canvas = tk.Canvas(preview_frame, bg="white")
         self.preview_canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        self.preview_source = None
+        self.preview_size = None
+        # Canvas size the current preview was rendered for; None while the
+        # canvas is too small to render into
+        self.preview_render_size = None
+        self.preview_resize_after_id = None
+        self.preview_canvas.bind("<Configure>", self.on_preview_configure)
+        # Zoom and pan for images larger than the preview
+        self.zoom = None
+        self.zoom_token = None
+        self.zoom_render_pending = False
+        # Animated GIF/WebP playback, paused while the preview is hidden
+        self.animation = None
+        self.root.bind("<Unmap>", self.on_preview_visibility, add="+")
+        self.root.bind("<Map>", self.on_preview_visibility, add="+")
+        self.preview_canvas.bind("<MouseWheel>", self.on_preview_zoom)
+        self.preview_canvas.bind("<Button-4>", self.on_preview_zoom)
+        self.preview_canvas.bind("<Button-5>", self.on_preview_zoom)
+        self.preview_canvas.bind("<ButtonPress-1>", self.on_preview_press)
+        self.preview_canvas.bind("<B1-Motion>", self.on_preview_drag)
+        self.preview_canvas.bind("<Double-Button-1>",
+                                 lambda e: self.reset_zoom())
         self.media_controls_frame = tk.Frame(preview_frame)
         self.media_controls_frame.pack(fill="x", padx=10, pady=5)
         self.play_button = tk.Button(self.media_controls_frame, text="▶ Play",
                                      command=self.toggle_media_playback)
         self.play_button.pack(side="left", padx=5)
         self.play_button.pack_forget()
+        self.pdf_prev_button = tk.Button(
+            self.media_controls_frame, text="◀ Prev",
+            command=lambda: self.show_pdf_page(self.pdf_page - 1))
+        self.pdf_page_var = tk.StringVar()
+        self.pdf_page_label = tk.Label(self.media_controls_frame,
+                                       textvariable=self.pdf_page_var)
+        self.text_preview_frame = tk.Frame(self.preview_canvas)
+        self.text_preview = tk.Text(self.text_preview_frame, wrap="none",
+                                    font=("Courier", 10), bg="white",
+                                    relief="flat")
+        text_scroll_y = ttk.Scrollbar(self.text_preview_frame,
+                                      command=self.text_preview.yview)
+        self.text_preview.config(yscrollcommand=lambda first, last: (
+            text_scroll_y.set(first, last),
+            self.on_text_preview_scroll(float(last))))
+        text_scroll_y.pack(side="right", fill="y")
+        self.text_preview.pack(side="left", fill="both", expand=True)
+        self.text_preview_state = None
+        self.pdf_next_button = tk.Button(
+            self.media_controls_frame, text="Next ▶",
+            command=lambda: self.show_pdf_page(self.pdf_page + 1))
         tagging_frame = tk.LabelFrame(self.bottom_frame, text="Tagging")
         tagging_frame.pack(fill="x", pady=5)
         self.file_info_var = tk.StringVar(value="No file selected")
@@ -590,6 +3195,9 @@ class TagzApp:
         self.current_tags_frame = tk.Frame(tagging_frame)
         self.current_tags_frame.pack(fill="x", padx=10, pady=5)
         self.current_tags_frame.config(bg="darkgreen")
+        self.current_tags_panel = TagChipPanel(
+            self.current_tags_frame, self.remove_tag, title="Current Tags:",
+            empty_text="No tags", removable=True)
         add_tag_frame = tk.Frame(tagging_frame)
         add_tag_frame.pack(fill="x", padx=10, pady=5)
         tk.Label(add_tag_frame,
@@ -610,37 +3218,69 @@ class TagzApp:
         suggested_frame.pack(fill="x", padx=10, pady=5)
         self.suggested_tags_frame = tk.Frame(suggested_frame, bg="lightgreen")
         self.suggested_tags_frame.pack(fill="x", padx=5, pady=5)
+        # Tags learned from similar files go above the filename ones
+        related_tags_frame = tk.Frame(self.suggested_tags_frame,
+                                      bg="lightgreen")
+        related_tags_frame.pack(fill="x")
+        self.related_tags_panel = TagChipPanel(
+            related_tags_frame, self.quick_add_tag, title="Related:")
+        name_tags_frame = tk.Frame(self.suggested_tags_frame, bg="lightgreen")
+        name_tags_frame.pack(fill="x")
+        self.suggested_tags_panel = TagChipPanel(
+            name_tags_frame, self.quick_add_tag,
+            empty_text="No suggestions")
         popular_frame = tk.LabelFrame(tagging_frame, text="Popular Tags")
         popular_frame.pack(fill="x", padx=10, pady=5)
         self.popular_tags_frame = tk.Frame(popular_frame, bg="lightblue")
         self.popular_tags_frame.pack(fill="x", padx=5, pady=5)
+        self.popular_tags_panel = TagChipPanel(
+            self.popular_tags_frame, self.quick_add_tag,
+            empty_text="No tags in system")
         self.update_popular_tags()
         self.update_tag_filter_combo()
         self.update_active_filters_display()
 
     def select_all_files(self):
         """Selects all files in the treeview."""
-        self.file_tree.selection_set(self.file_tree.get_children())
+        if self.virtual_list_active:
+            self.selected_paths = {file["path"]
+                                   for file in self.filtered_files}
+            self.render_virtual_rows()
+        else:
+            self.file_tree.selection_set(self.file_tree.get_children())
+        self.render_gallery()
 
     def select_none_files(self):
         """Deselects all files in the treeview."""
-        self.file_tree.selection_set()
+        if self.virtual_list_active:
+            self.selected_paths = set()
+            self.render_virtual_rows()
+        else:
+            self.file_tree.selection_set()
+        self.render_gallery()
 
     def select_similar_files(self):
         """Selects files with the same extension as the first selected file."""
-        selected_items = self.file_tree.selection()
-        if not selected_items:
-            return
-        first_item = selected_items[0]
-        first_file_path = self.file_tree.item(first_item, 'tags')[0]
-        _, first_ext = os.path.splitext(first_file_path)
-        similar_items = []
-        for item in self.file_tree.get_children():
-            file_path = self.file_tree.item(item, 'tags')[0]
-            _, ext = os.path.splitext(file_path)
+        selected_paths = self.get_selected_paths()
+        if not selected_paths:
+            return
+        _, first_ext = os.path.splitext(selected_paths[0])
+        similar_paths = []
+        for file in self.filtered_files:
+            _, ext = os.path.splitext(file["path"])
             if ext.lower() == first_ext.lower():
-                similar_items.append(item)
-        self.file_tree.selection_set(similar_items)
+                similar_paths.append(file["path"])
+        self.reselect_files_in_treeview(similar_paths)
+
+    def get_selected_paths(self):
+        """Returns the paths of all selected files in list order, including
+        rows scrolled out of a virtualized list."""
+        if self.virtual_list_active:
+            return [file["path"] for file in self.filtered_files
+                    if file["path"] in self.selected_paths]
+        return [self.path_by_item[item]
+                for item in self.file_tree.selection()
+                if item in self.path_by_item]
 
     def move_selected_files_dialog(self):
         """Opens a dialog to select a destination directory for moving files.
@@ -648,68 +3288,50 @@ class TagzApp:
         destination_directory = filedialog.askdirectory(
             title="Select Destination Directory")
         if destination_directory:
-            selected_items = self.file_tree.selection()
-            if not selected_items:
+            files_to_move = self.get_selected_paths()
+            if not files_to_move:
                 messagebox.showinfo("Info", "No files selected to move.")
                 return
-            files_to_move = [
-                self.file_tree.item(item,
-                                    'tags')[0] for item in selected_items]
             self.move_files(files_to_move, destination_directory)
 
     def move_files(self, file_paths, destination_directory):
-        """Moves the given files to the destination directory and updates tags,
-        preserving tags by temporarily storing and re-applying them.
-        Includes verification."""
-        tags_to_reapply = {}
-        move_successful = True
-        for file_path in file_paths:
-            try:
-                file_name = os.path.basename(file_path)
-                new_path = os.path.join(destination_directory, file_name)
-                original_tags = get_tags_for_file(file_path)
-                if original_tags:
-                    tags_to_reapply[new_path] = original_tags
-                    for tag in original_tags:
-                        remove_tag_from_file(file_path, tag)
-                shutil.move(file_path, new_path)
-                if os.path.exists(new_path):
-                    print(f"File '{file_name}' moved successfully.")
-                else:
-                    print(
-                        f"Error: File '{file_name}' "
-                        f"was NOT moved successfully!")
-                    move_successful = False  # Set the flag
-                    continue  # Skip re-tagging this file
-            except Exception as e:
-                messagebox.showerror(
-                    "Error",
-                    f"Error moving {os.path.basename(file_path)}: {e}")
-                move_successful = False
-                continue
-        if move_successful:
-            for new_path, tags in tags_to_reapply.items():
-                for tag in tags:
-                    add_tag_to_file(new_path, tag)
+        """Moves the given files to the destination directory in the
+        background, carrying their tags along."""
+        self.scheduler.submit(
+            move_files_with_tags, file_paths, destination_directory,
+            lane=TAG_IO_LANE, on_done=self.on_files_moved,
+            on_error=lambda e: messagebox.showerror(
+                "Error", f"Error moving files: {e}"))
+
+    def on_files_moved(self, result):
+        """Reports the outcome of move_files; the file-moved events
+        trigger a single rescan."""
+        moved, errors = result
+        for old_path, new_path in moved:
+            self.tag_store.move(old_path, new_path)
+        for error in errors:
+            print(error)
+        if errors:
+            messagebox.showwarning(
+                "Warning", "Some files may not have been moved correctly.\n\n"
+                + "\n".join(errors[:10]))
+            if not moved:
+                self.refresh_file_list()
+        else:
             messagebox.showinfo("Success",
                                 "Files moved and tags updated successfully.")
-        else:
-            messagebox.showwarning(
-                "Warning", "Some files may not have been moved correctly.")
-        self.refresh_file_list()
-        self.update_popular_tags()
 
     def rename_selected_file_dialog(self):
         """Opens a dialog to renaming a file."""
-        selected_item = self.file_tree.selection()
-        if not selected_item:
+        selected_paths = self.get_selected_paths()
+        if not selected_paths:
             messagebox.showinfo("Info", "No file selected to rename.")
             return
-        if len(selected_item) > 1:
+        if len(selected_paths) > 1:
             messagebox.showerror("Warning",
                                  "Please select only one file to rename.")
             return
-        file_path = self.file_tree.item(selected_item[0], 'tags')[0]
+        file_path = selected_paths[0]
         current_name_with_ext = os.path.basename(file_path)
         new_name_with_ext = simpledialog.askstring(
             "Rename File",
@@ -720,119 +3342,80 @@ class TagzApp:
             self.rename_selected_file(file_path, new_name_with_ext)
 
     def rename_selected_file(self, file_path, new_name_with_ext):
-        """Renames the given file, preserving tags,
-        using existing functions."""
-        tags_to_reapply = {}
-        rename_successful = True
-        try:
-            original_tags = get_tags_for_file(file_path)
-            if original_tags:
-                new_file_path = os.path.join(os.path.dirname(file_path),
-                                             new_name_with_ext)
-                tags_to_reapply[new_file_path] = original_tags
-                for tag in original_tags:
-                    remove_tag_from_file(file_path, tag)
-            os.rename(file_path, new_file_path)
-            if os.path.exists(new_file_path):
-                print(f"File '{os.path.basename(file_path)}' "
-                      f"renamed successfully to '{new_name_with_ext}'.")
-            else:
-                print(f"Error: File '{os.path.basename(file_path)}'"
-                      f" was NOT renamed successfully!")
-                rename_successful = False
-        except Exception as e:
-            messagebox.showerror(
-                "Error", f"Error renaming {os.path.basename(file_path)}: {e}")
-            rename_successful = False
-        if rename_successful:
-            for new_file_path, tags in tags_to_reapply.items():
-                for tag in tags:
-                    add_tag_to_file(new_file_path, tag)
+        """Renames the given file in the background, preserving tags."""
+        old_name = os.path.basename(file_path)
+
+        def on_renamed(new_file_path):
+            print(f"File '{old_name}' renamed successfully to "
+                  f"'{new_name_with_ext}'.")
             messagebox.showinfo(
                 "Success",
-                f"Renamed '{os.path.basename(file_path)}' to "
-                f"'{new_name_with_ext}' and updated tags.")
-        else:
+                f"Renamed '{old_name}' to '{new_name_with_ext}' and "
+                "updated tags.")
+            self.tag_store.move(file_path, new_file_path)
+
+        def on_error(e):
+            messagebox.showerror("Error", f"Error renaming {old_name}: {e}")
             messagebox.showwarning("Warning",
                                    "File may not have been renamed correctly.")
-        self.refresh_file_list()
-        self.update_popular_tags()
+            self.refresh_file_list()
+
+        self.scheduler.submit(rename_file_with_tags, file_path,
+                              new_name_with_ext, lane=TAG_IO_LANE,
+                              on_done=on_renamed, on_error=on_error)
 
     def add_tag_to_selected(self):
         """Adds a tag to all selected files."""
         tag = self.tag_entry_var.get().strip()
         if not tag:
             return
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_file_paths = self.get_selected_paths()
+        if not selected_file_paths:
             messagebox.showinfo("Info", "Please select one or more files.")
             return
-        selected_file_paths = [
-            self.file_tree.item(item, 'tags')[0] for item in selected_items]
-        for item in selected_items:
-            file_path = self.file_tree.item(item, 'tags')[0]
-            for file in self.files:
-                if file["path"] == file_path:
-                    if add_tag_to_file(file["path"], tag):
-                        file["tags"].append(tag)
-        self.update_file_tree()
-        self.update_current_tags()
-        self.update_suggested_tags()
-        self.update_popular_tags()
-        self.update_tag_filter_combo()
+        self.change_tags(selected_file_paths, tag, True)
         self.tag_entry_var.set("")
-        self.reselect_files_in_treeview(selected_file_paths)
 
     def remove_tag_from_selected(self):
         """Removes a tag from all selected files."""
         tag = self.tag_entry_var.get().strip()
         if not tag:
             return
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_file_paths = self.get_selected_paths()
+        if not selected_file_paths:
             messagebox.showinfo("Info", "Please select one or more files.")
             return
-        selected_file_paths = [
-            self.file_tree.item(item, 'tags')[0] for item in selected_items]
-        for item in selected_items:
-            file_path = self.file_tree.item(item, 'tags')[0]
-            for file in self.files: # Use self.files
-                if file["path"] == file_path:
-                    if remove_tag_from_file(file["path"], tag):
-                        file["tags"] = [t for t in file["tags"] if t != tag]
-        self.update_file_tree()
-        self.update_current_tags()
-        self.update_suggested_tags()
-        self.update_popular_tags()
-        self.update_tag_filter_combo()
+        self.change_tags(selected_file_paths, tag, False)
         self.tag_entry_var.set("")
-        self.reselect_files_in_treeview(selected_file_paths)
 
     def reselect_files_in_treeview(self, file_paths):
         """Re-selects files in the treeview based on their file paths."""
-        items_to_select = []
-        for item in self.file_tree.get_children():
-            item_path = self.file_tree.item(item, 'tags')[0]
-            if item_path in file_paths:
-                items_to_select.append(item)
-        self.file_tree.selection_set(items_to_select)
+        if self.virtual_list_active:
+            visible_paths = {file["path"] for file in self.filtered_files}
+            self.selected_paths = set(file_paths) & visible_paths
+            self.render_virtual_rows()
+        else:
+            items_to_select = [self.item_by_path[path] for path in file_paths
+                               if path in self.item_by_path]
+            self.file_tree.selection_set(items_to_select)
+        self.render_gallery()
 
     def create_file_tree(self, parent):
         """Creates the file treeview with scrollbars."""
-        tree_frame = tk.Frame(parent)
+        tree_frame = self.tree_frame = tk.Frame(parent)
         tree_frame.pack(fill="both", expand=True)
         # Scrollbars
-        tree_scroll_y = ttk.Scrollbar(tree_frame)
-        tree_scroll_y.pack(side="right", fill="y")
+        self.tree_scroll_y = ttk.Scrollbar(tree_frame)
+        self.tree_scroll_y.pack(side="right", fill="y")
         tree_scroll_x = ttk.Scrollbar(tree_frame, orient="horizontal")
         tree_scroll_x.pack(side="bottom", fill="x")
         # Treeview
         self.file_tree = ttk.Treeview(
             tree_frame,
             columns=("Name", "Ext", "Type", "Size", "Length", "Modified",
-                     "Tags"),
+                     "Tags", *METADATA_COLUMNS),
             show="headings",
-            yscrollcommand=tree_scroll_y.set,
+            yscrollcommand=self.on_tree_yview_changed,
             xscrollcommand=tree_scroll_x.set
         )
         # Configure columns
@@ -844,6 +3427,10 @@ class TagzApp:
             "Length": {"width": 80, "anchor": "center"},
             "Modified": {"width": 150, "anchor": "center"},
             "Tags": {"width": 200, "anchor": "w"},
+            "Artist": {"width": 120, "anchor": "w"},
+            "Album": {"width": 120, "anchor": "w"},
+            "Camera": {"width": 120, "anchor": "w"},
+            "Date": {"width": 120, "anchor": "center"},
         }
         for col, config in column_configs.items():
             self.file_tree.heading(col, text=col,
@@ -852,12 +3439,448 @@ class TagzApp:
             self.file_tree.column(col, width=config["width"],
                                   anchor=config["anchor"])
         self.file_tree.pack(fill="both", expand=True)
-        tree_scroll_y.config(command=self.file_tree.yview)
+        self.tree_scroll_y.config(command=self.on_tree_scroll)
         tree_scroll_x.config(command=self.file_tree.xview)
         self.file_tree.bind("<ButtonRelease-1>", self.on_file_select)
+        self.file_tree.bind("<<TreeviewSelect>>", self.schedule_file_select)
+        self.select_after_id = None
         self.file_tree.bind("<Double-1>", self.open_file)
-        self.sort_column = "Name"
-        self.sort_ascending = True
+        # Virtual list mode drives scrolling, clicks and keyboard navigation
+        # itself; in normal mode these handlers fall through to the defaults.
+        self.file_tree.bind("<Button-1>", self.on_tree_click)
+        self.file_tree.bind("<Shift-Button-1>", self.on_tree_click)
+        self.file_tree.bind("<Control-Button-1>", self.on_tree_click)
+        self.file_tree.bind("<MouseWheel>", self.on_virtual_wheel)
+        self.file_tree.bind("<Button-4>", self.on_virtual_wheel)
+        self.file_tree.bind("<Button-5>", self.on_virtual_wheel)
+        for key in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>",
+                    "<End>"):
+            self.file_tree.bind(key, self.on_virtual_key)
+        self.file_tree.bind("<Configure>",
+                            lambda e: self.render_virtual_rows())
+        # Sort order is a list of (column, ascending); Shift-clicking a
+        # heading adds a secondary column. It persists in the config.
+        self.sort_columns = self.load_sort_columns()
+        self.filter_version = 0
+        self.sort_cache = OrderedDict()
+        self.sorted_key = None
+        self.update_sort_headings()
+
+    def create_gallery(self, parent):
+        """Creates the thumbnail gallery, shown instead of the file tree in
+        gallery mode. Only the tiles in view exist as canvas items; they
+        are recycled as the gallery scrolls."""
+        self.gallery_frame = tk.Frame(parent)
+        self.gallery_scroll_y = ttk.Scrollbar(self.gallery_frame,
+                                              command=self.on_gallery_scroll)
+        self.gallery_scroll_y.pack(side="right", fill="y")
+        self.gallery_canvas = tk.Canvas(self.gallery_frame, bg="white",
+                                        highlightthickness=0,
+                                        takefocus=True)
+        self.gallery_canvas.pack(fill="both", expand=True)
+        self.gallery_active = False
+        self.gallery_row = 0
+        self.gallery_tiles = []
+        self.gallery_photos = OrderedDict()
+        self.gallery_token = None
+        self.gallery_visible_paths = ()
+        self.gallery_anchor_index = 0
+        self.gallery_cursor_index = 0
+        self.gallery_canvas.bind("<Configure>",
+                                 lambda e: self.render_gallery())
+        self.gallery_canvas.bind("<Button-1>", self.on_gallery_click)
+        self.gallery_canvas.bind("<Control-Button-1>", self.on_gallery_click)
+        self.gallery_canvas.bind("<Shift-Button-1>", self.on_gallery_click)
+        self.gallery_canvas.bind("<Double-1>", self.open_file)
+        self.gallery_canvas.bind("<MouseWheel>", self.on_gallery_wheel)
+        self.gallery_canvas.bind("<Button-4>", self.on_gallery_wheel)
+        self.gallery_canvas.bind("<Button-5>", self.on_gallery_wheel)
+        for key in ("<Up>", "<Down>", "<Left>", "<Right>", "<Prior>",
+                    "<Next>", "<Home>", "<End>"):
+            self.gallery_canvas.bind(key, self.on_gallery_key)
+
+    def toggle_gallery(self):
+        """Switches the file list between the tree and the gallery."""
+        self.gallery_active = not self.gallery_active
+        if self.gallery_active:
+            self.tree_frame.pack_forget()
+            self.gallery_frame.pack(fill="both", expand=True)
+            self.gallery_button.config(text="List")
+            self.gallery_canvas.focus_set()
+            self.render_gallery()
+        else:
+            if self.gallery_token is not None:
+                self.gallery_token.cancel()
+            self.gallery_visible_paths = ()
+            self.gallery_frame.pack_forget()
+            self.tree_frame.pack(fill="both", expand=True)
+            self.gallery_button.config(text="Gallery")
+
+    def get_gallery_layout(self):
+        """Returns (columns, visible_rows, cell_width, cell_height)."""
+        cell_width = GALLERY_TILE + GALLERY_PADDING
+        cell_height = GALLERY_TILE + GALLERY_CAPTION + GALLERY_PADDING
+        columns = max(1, self.gallery_canvas.winfo_width() // cell_width)
+        rows = max(1, -(-self.gallery_canvas.winfo_height() // cell_height))
+        return columns, rows, cell_width, cell_height
+
+    def render_gallery(self):
+        """Lays out the tiles of the rows in view, recycling canvas items,
+        and requests the thumbnails that are not loaded yet."""
+        if not self.gallery_active:
+            return
+        canvas = self.gallery_canvas
+        columns, rows, cell_width, cell_height = self.get_gallery_layout()
+        total_rows = -(-len(self.filtered_files) // columns)
+        self.gallery_row = min(self.gallery_row,
+                               max(0, total_rows - rows + 1))
+        start = self.gallery_row * columns
+        window = self.filtered_files[start:start + rows * columns]
+        tiles = self.gallery_tiles
+        while len(tiles) < len(window):
+            tiles.append({
+                "frame": canvas.create_rectangle(0, 0, 0, 0, width=0),
+                "image": canvas.create_image(0, 0, anchor="center"),
+                "icon": canvas.create_text(0, 0, font=("Arial", 32)),
+                "caption": canvas.create_text(0, 0, font=("Arial", 9),
+                                              width=GALLERY_TILE),
+                "path": None})
+        selected = self.get_selected_path_set()
+        for tile in tiles[len(window):]:
+            for name in ("frame", "image", "icon", "caption"):
+                canvas.itemconfigure(tile[name], state="hidden")
+            tile["path"] = None
+        for index, (tile, file) in enumerate(zip(tiles, window)):
+            x = (index % columns) * cell_width + GALLERY_PADDING // 2
+            y = (index // columns) * cell_height + GALLERY_PADDING // 2
+            center_x = x + GALLERY_TILE // 2
+            center_y = y + GALLERY_TILE // 2
+            canvas.coords(tile["frame"], x - 2, y - 2, x + GALLERY_TILE + 2,
+                          y + GALLERY_TILE + GALLERY_CAPTION + 2)
+            canvas.coords(tile["image"], center_x, center_y)
+            canvas.coords(tile["icon"], center_x, center_y)
+            canvas.coords(tile["caption"], center_x,
+                          y + GALLERY_TILE + GALLERY_CAPTION // 2)
+            canvas.itemconfigure(
+                tile["frame"], state="normal",
+                fill="lightblue" if file["path"] in selected else "")
+            canvas.itemconfigure(tile["caption"], state="normal",
+                                 text=file["name"])
+            tile["path"] = file["path"]
+            self.show_gallery_thumbnail(tile, file)
+        self.gallery_scroll_y.set(
+            *((self.gallery_row / total_rows,
+               min(1, (self.gallery_row + rows) / total_rows))
+              if total_rows else (0, 1)))
+        self.load_gallery_thumbnails(window)
+
+    def show_gallery_thumbnail(self, tile, file):
+        """Shows a tile's thumbnail if it is loaded, else a type icon."""
+        canvas = self.gallery_canvas
+        photo = self.gallery_photos.get(file["path"])
+        if photo is not None:
+            self.gallery_photos.move_to_end(file["path"])
+            canvas.itemconfigure(tile["image"], image=photo, state="normal")
+            canvas.itemconfigure(tile["icon"], state="hidden")
+        else:
+            canvas.itemconfigure(tile["image"], state="hidden")
+            canvas.itemconfigure(
+                tile["icon"], state="normal",
+                text=GALLERY_ICONS.get(file["type"], GALLERY_ICONS["other"]))
+
+    def load_gallery_thumbnails(self, window):
+        """Requests thumbnails for the files in view. Requests for files
+        scrolled out of view are cancelled before they start."""
+        visible_paths = tuple(file["path"] for file in window)
+        if visible_paths == self.gallery_visible_paths:
+            return
+        self.gallery_visible_paths = visible_paths
+        if self.gallery_token is not None:
+            self.gallery_token.cancel()
+        token = self.gallery_token = CancelToken()
+        for file in window:
+            if file["path"] in self.gallery_photos:
+                continue
+            renderer = get_preview_renderer(file, GALLERY_TILE, GALLERY_TILE,
+                                            self.video_thumbnail_offset)
+            if renderer is None:
+                continue
+            variant, create = renderer
+            self.scheduler.submit(
+                self.thumbnail_cache.get_or_create, file["path"],
+                GALLERY_TILE, GALLERY_TILE, "tile-" + variant, create, False,
+                priority=PRIORITY_NORMAL, token=token,
+                lane=get_preview_lane(variant),
+                on_done=lambda result, f=file: self.on_gallery_thumbnail(
+                    f, result[0]),
+                on_error=lambda e: print(f"Thumbnail error: {e}"))
+
+    def on_gallery_thumbnail(self, file, img):
+        """Stores a loaded thumbnail and shows it if its tile is in view."""
+        if img is None:
+            return
+        self.gallery_photos[file["path"]] = ImageTk.PhotoImage(
+            fit_image(img, GALLERY_TILE, GALLERY_TILE))
+        while len(self.gallery_photos) > GALLERY_PHOTO_CACHE:
+            self.gallery_photos.popitem(last=False)
+        for tile in self.gallery_tiles:
+            if tile["path"] == file["path"]:
+                self.show_gallery_thumbnail(tile, file)
+
+    def get_selected_path_set(self):
+        """Returns the selected paths as a set."""
+        if self.virtual_list_active:
+            return self.selected_paths
+        return set(self.get_selected_paths())
+
+    def scroll_gallery_to(self, row):
+        """Moves the gallery so that `row` is the top row."""
+        columns, rows, _, _ = self.get_gallery_layout()
+        total_rows = -(-len(self.filtered_files) // columns)
+        row = min(max(0, row), max(0, total_rows - rows + 1))
+        if row != self.gallery_row:
+            self.prefetch_direction = 1 if row > self.gallery_row else -1
+            self.gallery_row = row
+            self.render_gallery()
+
+    def on_gallery_scroll(self, *args):
+        """Scrollbar command for the gallery."""
+        columns, rows, _, _ = self.get_gallery_layout()
+        total_rows = -(-len(self.filtered_files) // columns)
+        if args[0] == "moveto":
+            row = int(float(args[1]) * total_rows)
+        elif args[2] == "pages":
+            row = self.gallery_row + int(args[1]) * max(1, rows - 1)
+        else:
+            row = self.gallery_row + int(args[1])
+        self.scroll_gallery_to(row)
+
+    def on_gallery_wheel(self, event):
+        """Scrolls the gallery with the mouse wheel."""
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_gallery_to(self.gallery_row - 1)
+        else:
+            self.scroll_gallery_to(self.gallery_row + 1)
+        return "break"
+
+    def on_gallery_click(self, event):
+        """Applies click, Ctrl-click and Shift-click selection in the
+        gallery to the file list's selection."""
+        self.gallery_canvas.focus_set()
+        columns, _, cell_width, cell_height = self.get_gallery_layout()
+        column = event.x // cell_width
+        if column >= columns:
+            return "break"
+        index = (self.gallery_row + event.y // cell_height) * columns + column
+        if index >= len(self.filtered_files):
+            return "break"
+        file_path = self.filtered_files[index]["path"]
+        if event.state & 0x0004:
+            selected = self.get_selected_path_set()
+            paths = [p for p in self.get_selected_paths() if p != file_path]
+            if file_path not in selected:
+                paths.append(file_path)
+        elif event.state & 0x0001:
+            low, high = sorted((self.gallery_anchor_index, index))
+            paths = [file["path"] for file in self.filtered_files[low:high + 1]]
+        else:
+            paths = [file_path]
+            self.gallery_anchor_index = index
+        self.gallery_cursor_index = index
+        self.select_from_gallery(paths, file_path)
+        return "break"
+
+    def on_gallery_key(self, event):
+        """Keyboard navigation in the gallery."""
+        if not self.filtered_files:
+            return "break"
+        columns, rows, _, _ = self.get_gallery_layout()
+        index = self.gallery_cursor_index
+        moves = {"Left": index - 1, "Right": index + 1,
+                 "Up": index - columns, "Down": index + columns,
+                 "Prior": index - columns * rows,
+                 "Next": index + columns * rows,
+                 "Home": 0, "End": len(self.filtered_files) - 1}
+        index = min(max(0, moves[event.keysym]),
+                    len(self.filtered_files) - 1)
+        self.gallery_cursor_index = self.gallery_anchor_index = index
+        row = index // columns
+        if row < self.gallery_row:
+            self.gallery_row = row
+        elif row >= self.gallery_row + rows - 1:
+            self.gallery_row = row - rows + 2
+        file_path = self.filtered_files[index]["path"]
+        self.select_from_gallery([file_path], file_path)
+        return "break"
+
+    def select_from_gallery(self, file_paths, current_path):
+        """Makes a gallery selection the file list's selection, so that
+        the tagging actions apply to it, and shows the current file."""
+        index = self.get_filtered_index(current_path)
+        if self.virtual_list_active and index is not None:
+            self.virtual_cursor_index = self.virtual_anchor_index = index
+        self.reselect_files_in_treeview(file_paths)
+        self.show_current_file(current_path)
+
+    def on_tree_scroll(self, *args):
+        """Scrollbar command: scrolls the Treeview or the virtual window."""
+        if args[0] == "scroll":
+            self.prefetch_direction = 1 if int(args[1]) > 0 else -1
+        if not self.virtual_list_active:
+            self.file_tree.yview(*args)
+            return
+        total = len(self.filtered_files)
+        rows = self.get_virtual_visible_rows()
+        if args[0] == "moveto":
+            offset = int(float(args[1]) * total)
+        elif args[2] == "pages":
+            offset = self.virtual_offset + int(args[1]) * rows
+        else:
+            offset = self.virtual_offset + int(args[1])
+        self.scroll_virtual_to(offset)
+
+    def on_tree_yview_changed(self, first, last):
+        """Treeview yscrollcommand; ignored while the list is virtual."""
+        if not self.virtual_list_active:
+            self.tree_scroll_y.set(first, last)
+
+    def get_virtual_visible_rows(self):
+        """Returns how many rows fit in the Treeview viewport."""
+        row_height = 20
+        heading_height = 24
+        if self.virtual_row_items:
+            bbox = self.file_tree.bbox(self.virtual_row_items[0])
+            if bbox:
+                heading_height, row_height = bbox[1], bbox[3]
+        tree_height = self.file_tree.winfo_height()
+        return max(1, (tree_height - heading_height) // row_height)
+
+    def scroll_virtual_to(self, offset):
+        """Moves the virtual window so that row `offset` is at the top."""
+        rows = self.get_virtual_visible_rows()
+        max_offset = max(0, len(self.filtered_files) - rows)
+        offset = min(max(0, offset), max_offset)
+        if offset != self.virtual_offset:
+            self.prefetch_direction = 1 if offset > self.virtual_offset else -1
+            self.virtual_offset = offset
+            self.render_virtual_rows()
+
+    def render_virtual_rows(self):
+        """Materialises the rows of `filtered_files` around the viewport,
+        recycling existing Treeview items instead of recreating them."""
+        if not self.virtual_list_active:
+            return
+        total = len(self.filtered_files)
+        rows = self.get_virtual_visible_rows()
+        self.virtual_offset = min(self.virtual_offset, max(0, total - rows))
+        window = self.filtered_files[
+            self.virtual_offset:
+            self.virtual_offset + rows + VIRTUAL_LIST_OVERSCAN]
+        items = self.virtual_row_items
+        # Grow or shrink the item pool to the window size
+        while len(items) < len(window):
+            items.append(self.file_tree.insert("", "end"))
+        if len(items) > len(window):
+            self.file_tree.delete(*items[len(window):])
+            for item in items[len(window):]:
+                self.path_by_item.pop(item, None)
+            del items[len(window):]
+        self.item_by_path = {}
+        selected_items = []
+        for item, file in zip(items, window):
+            values = format_file_row(file)
+            if self.path_by_item.get(item) != file["path"]:
+                self.file_tree.item(item, values=values,
+                                    tags=(file["path"],))
+                self.path_by_item[item] = file["path"]
+            elif self.file_tree.item(item, "values") != values:
+                self.file_tree.item(item, values=values)
+            self.item_by_path[file["path"]] = item
+            if file["path"] in self.selected_paths:
+                selected_items.append(item)
+        self.file_tree.selection_set(selected_items)
+        self.file_tree.yview_moveto(0)
+        if total:
+            self.tree_scroll_y.set(
+                self.virtual_offset / total,
+                min(1.0, (self.virtual_offset + rows) / total))
+        else:
+            self.tree_scroll_y.set(0, 1)
+
+    def on_virtual_wheel(self, event):
+        """Scrolls the virtual window with the mouse wheel."""
+        if not self.virtual_list_active:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            step = -3
+        else:
+            step = 3
+        self.scroll_virtual_to(self.virtual_offset + step)
+        return "break"
+
+    def on_tree_click(self, event):
+        """Handles Shift-click on headings (secondary sort) and applies
+        click, Ctrl-click and Shift-click selection to the path-based
+        selection of the virtual list."""
+        region = self.file_tree.identify_region(event.x, event.y)
+        if region == "heading" and event.state & 0x0001:
+            column_index = int(self.file_tree.identify_column(event.x)[1:])
+            self.sort_by_column(self.file_tree["columns"][column_index - 1],
+                                extend=True)
+            return "break"
+        if not self.virtual_list_active:
+            return None
+        if region != "cell":
+            return None
+        item = self.file_tree.identify_row(event.y)
+        if not item or item not in self.virtual_row_items:
+            return "break"
+        index = self.virtual_offset + self.virtual_row_items.index(item)
+        path = self.filtered_files[index]["path"]
+        if event.state & 0x0001:  # Shift
+            start = min(self.virtual_anchor_index, index)
+            end = max(self.virtual_anchor_index, index)
+            range_paths = {file["path"]
+                           for file in self.filtered_files[start:end + 1]}
+            if event.state & 0x0004:  # Control
+                self.selected_paths |= range_paths
+            else:
+                self.selected_paths = range_paths
+        elif event.state & 0x0004:
+            if path in self.selected_paths:
+                self.selected_paths.discard(path)
+            else:
+                self.selected_paths.add(path)
+            self.virtual_anchor_index = index
+        else:
+            self.selected_paths = {path}
+            self.virtual_anchor_index = index
+        self.virtual_cursor_index = index
+        self.file_tree.focus(item)
+        self.render_virtual_rows()
+        return "break"
+
+    def on_virtual_key(self, event):
+        """Keyboard navigation over the whole virtual list."""
+        if not self.virtual_list_active or not self.filtered_files:
+            return None
+        rows = self.get_virtual_visible_rows()
+        index = self.virtual_cursor_index
+        moves = {"Up": index - 1, "Down": index + 1,
+                 "Prior": index - rows, "Next": index + rows,
+                 "Home": 0, "End": len(self.filtered_files) - 1}
+        index = min(max(0, moves[event.keysym]),
+                    len(self.filtered_files) - 1)
+        self.virtual_cursor_index = index
+        self.virtual_anchor_index = index
+        self.selected_paths = {self.filtered_files[index]["path"]}
+        if index < self.virtual_offset:
+            self.virtual_offset = index
+        elif index >= self.virtual_offset + rows:
+            self.virtual_offset = index - rows + 1
+        self.render_virtual_rows()
+        self.on_file_select(event)
+        return "break"
 
     def browse_directory(self):
         """Opens a dialog to select a directory."""
@@ -884,28 +3907,63 @@ class TagzApp:
                                  f"Directory does not exist: {directory}")
 
     def refresh_file_list(self):
-        """Refreshes the file list in the treeview."""
+        """Refreshes the file list in the treeview. The scan runs in the
+        background; a newer refresh cancels an older one."""
+        if self.scan_token is not None:
+            self.scan_token.cancel()
         if self.view_mode.get() == "local":
             # Ensure current_directory is valid
             if not os.path.isdir(self.current_directory):
                 messagebox.showerror("Error",
                                      f"Directory does not exist: "
                                      "{self.current_directory}")
-                self.files = []
                 self.current_directory = os.getcwd()
                 self.directory_var.set(self.current_directory)
-                self.current_directory_label.config(text=f"Directory: "
-                                                    "{self.current_directory}")
-            else:
-                self.files = list_files(self.current_directory)
+                self.on_files_loaded([])
+                return
+            self.scan_token = self.scheduler.submit(
+                list_files, self.current_directory, False,
+                lane=TAG_IO_LANE, pass_token=True,
+                on_done=self.on_files_loaded, on_error=self.on_scan_error)
         else:
-            self.files = self.get_global_files()  # Fetch global files
-        self.filtered_files = search_files_by_tags(self.files,
-                                                   self.search_tags)
+            self.scan_token = self.scheduler.submit(
+                self.get_global_files, lane=TAG_IO_LANE,
+                on_done=self.on_files_loaded, on_error=self.on_scan_error)
+        self.current_directory_label.config(text="Scanning...")
+
+    def on_files_loaded(self, files):
+        """Shows the result of a scan and starts filling in durations."""
+        self.files = files
+        self.index_files()
+        self.update_metadata()
+        self.set_filtered_files(search_files_by_tags(self.files,
+                                                     self.search_tags))
         self.update_file_tree()
         self.update_current_directory_label()
         self.update_suggested_tags()
         self.update_popular_tags()
+        self.update_media_lengths()
+        self.auto_tag_new_files()
+
+    def on_scan_error(self, error):
+        """Reports a failed scan."""
+        messagebox.showerror("Error", str(error))
+        self.on_files_loaded([])
+
+    def index_files(self):
+        """Rebuilds the path-to-record lookup for the current file list."""
+        self.files_by_path = {file["path"]: file for file in self.files}
+        # Previous name-filter results and the name index refer to the old
+        # list; the index is rebuilt in chunks between UI events
+        self.name_filter_text = ""
+        self.name_filter_matches = None
+        self.name_index = None
+        self.name_index_generation += 1
+        self.root.after_idle(self.build_name_index_chunk,
+                             self.name_index_generation, FileNameIndex(), 0)
+        if (self.current_file
+                and self.current_file["path"] in self.files_by_path):
+            self.current_file = self.files_by_path[self.current_file["path"]]
 
     def update_current_directory_label(self):
         """Updates the directory label or displays the view mode."""
@@ -931,12 +3989,15 @@ class TagzApp:
                                 size = os.path.getsize(file_path)
                                 file_type = get_file_type(
                                     os.path.basename(file_path))
-                                length = get_media_duration(file_path)
+                                # Filled in by update_media_lengths
+                                length = 0
                                 modified = (os.path.getmtime(file_path)
                                 if os.path.exists(file_path)
                                 else 0)
                                 global_files.append({
                                     "name": os.path.basename(file_path),
+                                    "name_lower": os.path.basename(
+                                        file_path).lower(),
                                     "basename": name,
                                     "path": file_path,
                                     "ext": ext.lower(),
@@ -945,6 +4006,7 @@ class TagzApp:
                                     "type": file_type,
                                     "length": length,
                                     "modified": modified,
+                                    "metadata": {},
                                     "tags": tags,
                                     "directory": os.path.dirname(file_path)
                                 })
@@ -953,109 +4015,687 @@ class TagzApp:
                         except Exception as e:
                             print(f"Error processing file {file_path}: {e}")
                 except json.JSONDecodeError:
-                    messagebox.showerror(
-                        "Error",
-                        "Error reading tags.json. File may be corrupted."
-                    )
+                    # Runs on a worker thread; reported by on_scan_error
+                    raise ValueError(
+                        "Error reading tags.json. File may be corrupted.")
         return global_files
 
     def update_media_lengths(self):
-        """Updates the length of media files in the background."""
+        """Updates the length of media files in the background, in batches
+        so that durations appear as they are found."""
+        if self.lengths_token is not None:
+            self.lengths_token.cancel()
+        self.lengths_token = CancelToken()
+        paths = [file["path"] for file in self.files
+                 if file["type"] in ["audio", "video"] and not file["length"]]
+        for start in range(0, len(paths), MEDIA_LENGTH_BATCH):
+            self.scheduler.submit(
+                get_media_durations, paths[start:start + MEDIA_LENGTH_BATCH],
+                priority=PRIORITY_LOW, token=self.lengths_token,
+                pass_token=True, on_done=self.on_media_lengths)
+
+    def update_metadata(self):
+        """Fills in embedded metadata: from the cache at once, otherwise
+        read in batches in the background. PDFs are read on the PDF lane
+        because PyMuPDF is not thread-safe."""
+        if self.metadata_token is not None:
+            self.metadata_token.cancel()
+        self.metadata_token = CancelToken()
+        if self.view_mode.get() == "local":
+            self.scheduler.submit(
+                self.metadata_cache.prune, self.current_directory,
+                [file["path"] for file in self.files], lane=TAG_IO_LANE)
+        paths = []
+        pdf_paths = []
         for file in self.files:
-            if file["type"] in ["audio", "video"]:
-                file["length"] = get_media_duration(file["path"])
-        self.update_file_tree()
+            metadata = self.metadata_cache.get(file)
+            if metadata is not None:
+                file["metadata"] = metadata
+            elif get_metadata_reader(file["path"]) is not None:
+                if file["ext"] == ".pdf":
+                    pdf_paths.append(file["path"])
+                else:
+                    paths.append(file["path"])
+        for start in range(0, len(paths), METADATA_BATCH):
+            self.scheduler.submit(
+                read_metadata_batch, paths[start:start + METADATA_BATCH],
+                priority=PRIORITY_LOW, token=self.metadata_token,
+                pass_token=True, on_done=self.on_metadata)
+        # The PDF lane is FIFO, so queue one batch at a time to keep page
+        # renders from waiting behind every metadata read
+        self.metadata_pdf_paths = pdf_paths
+        self.submit_pdf_metadata()
+
+    def submit_pdf_metadata(self):
+        """Queues the next batch of PDF metadata reads on the PDF lane."""
+        batch = self.metadata_pdf_paths[:METADATA_BATCH]
+        del self.metadata_pdf_paths[:METADATA_BATCH]
+        if batch:
+            self.scheduler.submit(
+                read_metadata_batch, batch, lane=PDF_LANE,
+                token=self.metadata_token, pass_token=True,
+                on_done=self.on_pdf_metadata)
+
+    def on_pdf_metadata(self, metadata_by_path):
+        """Applies a batch of PDF metadata and queues the next one."""
+        self.on_metadata(metadata_by_path)
+        self.submit_pdf_metadata()
+
+    def on_metadata(self, metadata_by_path):
+        """Applies a batch of metadata to the file records and the cache."""
+        for file_path, metadata in metadata_by_path.items():
+            file = self.files_by_path.get(file_path)
+            if not file:
+                continue
+            self.metadata_cache.put(file, metadata)
+            if file["metadata"] != metadata:
+                file["metadata"] = metadata
+                self.events.publish(EVENT_METADATA_UPDATED, file_path)
+        self.scheduler.submit(self.metadata_cache.save, lane=TAG_IO_LANE)
+
+    def on_media_lengths(self, durations):
+        """Applies a batch of durations to the file records."""
+        for file_path, length in durations.items():
+            file = self.files_by_path.get(file_path)
+            if file and file["length"] != length:
+                file["length"] = length
+                self.events.publish(EVENT_METADATA_UPDATED, file_path)
+        ready = [self.files_by_path[file_path] for file_path in durations
+                 if file_path in self.rules_pending_paths
+                 and file_path in self.files_by_path]
+        if ready:
+            self.rules_pending_paths.difference_update(
+                file["path"] for file in ready)
+            rules = self.get_tag_rules()
+            self.on_auto_rule_tags(({file["path"]: rules.match(file)
+                                     for file in ready}, []))
+
+    def get_tag_rules(self):
+        """Returns the compiled auto-tagging rules, recompiling them when
+        the rules file has changed."""
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            mtime = None
+        if self.tag_rules is None or mtime != self.tag_rules_mtime:
+            self.tag_rules = TagRuleMatcher(
+                load_tag_rules(self.rules_file) if mtime else [])
+            self.tag_rules_mtime = mtime
+        return self.tag_rules
+
+    def on_rules_seen(self, paths):
+        """Takes the paths seen in earlier sessions, then auto-tags the
+        files listed meanwhile."""
+        if self.rules_seen_paths is not None:
+            paths |= self.rules_seen_paths
+        self.rules_seen_paths = paths
+        self.auto_tag_new_files()
+
+    def auto_tag_new_files(self):
+        """Applies the rules in the background to files that have never
+        been seen before and that have no tags yet."""
+        if self.rules_seen_paths is None:
+            return
+        new_files = [file for file in self.files
+                     if file["path"] not in self.rules_seen_paths]
+        if not new_files:
+            return
+        self.rules_seen_paths.update(file["path"] for file in new_files)
+        self.rules_seen_changed = True
+        self.scheduler.submit(write_rules_seen, self.rules_seen_file,
+                              list(self.rules_seen_paths), lane=TAG_IO_LANE)
+        rules = self.get_tag_rules()
+        new_files = [file for file in new_files if not file["tags"]]
+        if not rules or not new_files:
+            return
+        self.scheduler.submit(rules.match_files, new_files,
+                              priority=PRIORITY_LOW, pass_token=True,
+                              on_done=self.on_auto_rule_tags)
+
+    def on_auto_rule_tags(self, result):
+        """Adds the tags the rules found for new files, leaving out files
+        the user has tagged since they were matched."""
+        tags_by_path, pending = result
+        untagged = {}
+        for file_path, tags in tags_by_path.items():
+            file = self.files_by_path.get(file_path)
+            if not (file["tags"] if file else
+                    self.tag_store.tags_by_path.get(file_path)):
+                untagged[file_path] = tags
+        self.on_rule_tags((untagged, pending))
+
+    def apply_rules_dialog(self):
+        """Applies the rules to the selected files, or to a whole directory
+        when nothing is selected."""
+        rules = self.get_tag_rules()
+        if not rules:
+            messagebox.showinfo("Info", f"No tagging rules found in "
+                                f"{os.path.abspath(self.rules_file)}.")
+            return
+        if self.rules_token is not None:
+            self.rules_token.cancel()
+        selected_paths = self.get_selected_paths()
+        if selected_paths:
+            files = [self.files_by_path[file_path]
+                     for file_path in selected_paths
+                     if file_path in self.files_by_path]
+            self.rules_token = self.scheduler.submit(
+                rules.match_files, files, True, pass_token=True,
+                on_done=lambda result: self.on_rule_tags(result, True))
+            return
+        directory = filedialog.askdirectory(
+            title="Apply Tagging Rules to Directory",
+            initialdir=self.current_directory)
+        if directory:
+            self.rules_token = self.scheduler.submit(
+                scan_rule_tags, rules, os.path.normpath(directory),
+                priority=PRIORITY_LOW, pass_token=True,
+                on_done=lambda result: self.on_rule_tags(result, True),
+                on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def on_rule_tags(self, result, report=False):
+        """Adds the tags found by the rules as one batch of changes."""
+        tags_by_path, pending = result
+        self.rules_pending_paths.update(pending)
+        changes = self.add_tags_to_files(tags_by_path)
+        if report:
+            tagged = len({file_path for file_path, _, _ in changes})
+            messagebox.showinfo(
+                "Rules Applied",
+                f"Added {len(changes)} tags to {tagged} files.")
+
+    def add_tags_to_files(self, tags_by_path):
+        """Adds {path: tags} as one batch of store changes, skipping tags a
+        file already has. Returns the changes made."""
+        changes = []
+        for file_path, tags in tags_by_path.items():
+            file = self.files_by_path.get(file_path)
+            current_tags = (file["tags"] if file else
+                            self.tag_store.tags_by_path.get(file_path, []))
+            for tag in tags:
+                if tag not in current_tags:
+                    changes.append((file_path, tag, True))
+                    if file:
+                        file["tags"].append(tag)
+        self.tag_store.apply(changes)
+        return changes
+
+    def suggest_tags_in_bulk(self):
+        """Works out the filename and folder suggestions for the selected
+        files, or for every listed file when nothing is selected, and shows
+        them for review. Large sets are split across the process pool."""
+        selected_paths = self.get_selected_paths()
+        if selected_paths:
+            files = [self.files_by_path[file_path]
+                     for file_path in selected_paths
+                     if file_path in self.files_by_path]
+        else:
+            files = list(self.files)
+        if not files:
+            messagebox.showinfo("Info", "No files to tag.")
+            return
+        if self.bulk_token is not None:
+            self.bulk_token.cancel()
+        self.bulk_token = CancelToken()
+        self.bulk_suggestions = {}
+        names = list(dict.fromkeys(file["name"] for file in files))
+        # Starting worker processes costs more than a small set takes
+        process = len(names) >= BULK_SUGGEST_PROCESS_MIN
+        chunk_size = BULK_SUGGEST_CHUNK if process else len(names)
+        chunks = [names[start:start + chunk_size]
+                  for start in range(0, len(names), chunk_size)]
+        self.bulk_pending = len(chunks)
+        full_path = self.full_path_tags_var.get()
+        for chunk in chunks:
+            self.scheduler.submit(
+                generate_suggested_tags_batch, chunk, token=self.bulk_token,
+                process=process, on_error=self.on_bulk_suggestions_error,
+                on_done=lambda suggestions: self.on_bulk_suggestions(
+                    files, full_path, suggestions))
+        self.current_directory_label.config(
+            text=f"Suggesting tags for {len(files)} files...")
+
+    def on_bulk_suggestions(self, files, full_path, suggestions):
+        """Collects one chunk of suggestions; once all are in, works out
+        the new tags for each file and shows the preview."""
+        self.bulk_suggestions.update(suggestions)
+        self.bulk_pending -= 1
+        if self.bulk_pending:
+            return
+        self.update_current_directory_label()
+        directory_tags = {}
+        proposals = {}
+        for file in files:
+            directory = os.path.dirname(file["path"])
+            if directory not in directory_tags:
+                directory_tags[directory] = get_directory_tags(directory,
+                                                               full_path)
+            tags = [tag for tag in dict.fromkeys(
+                        self.bulk_suggestions[file["name"]]
+                        + metadata_suggested_tags(file["metadata"])
+                        + directory_tags[directory])
+                    if tag not in file["tags"]]
+            if tags:
+                proposals[file["path"]] = tags
+        self.bulk_suggestions = {}
+        if not proposals:
+            messagebox.showinfo("Info", "No new tags to suggest.")
+            return
+        self.show_bulk_suggestions(proposals)
+
+    def on_bulk_suggestions_error(self, error):
+        """Abandons a bulk suggestion run after a failed chunk."""
+        self.bulk_token.cancel()
+        self.update_current_directory_label()
+        messagebox.showerror("Error", str(error))
+
+    def show_bulk_suggestions(self, proposals):
+        """Shows the proposed tags per file in a table. Tags unticked in
+        the list are left out; Apply adds the rest to every file in one
+        batch."""
+        window = tk.Toplevel(self.root)
+        window.title("Apply Suggested Tags")
+        window.geometry("900x500")
+        window.transient(self.root)
+        tag_counts = Counter(tag for tags in proposals.values()
+                             for tag in tags)
+        tag_order = [tag for tag, _ in tag_counts.most_common()]
+        shown = list(proposals)[:BULK_PREVIEW_ROWS]
+        summary = f"{len(proposals)} files would get new tags."
+        if len(shown) < len(proposals):
+            summary += f" Showing the first {len(shown)}."
+        tk.Label(window, text=summary, anchor="w").pack(fill="x", padx=10,
+                                                        pady=5)
+        content = tk.Frame(window)
+        content.pack(fill="both", expand=True, padx=10)
+        tags_frame = tk.LabelFrame(content, text="Tags to apply")
+        tags_frame.pack(side="right", fill="y", padx=(5, 0))
+        tag_list = tk.Listbox(tags_frame, selectmode="multiple",
+                              exportselection=False, width=28)
+        tags_scroll = ttk.Scrollbar(tags_frame, command=tag_list.yview)
+        tag_list.config(yscrollcommand=tags_scroll.set)
+        tags_scroll.pack(side="right", fill="y")
+        tag_list.pack(side="left", fill="y")
+        for tag in tag_order:
+            tag_list.insert("end", f"{tag} ({tag_counts[tag]})")
+        tag_list.selection_set(0, "end")
+        table = ttk.Treeview(content, columns=("File", "Tags"),
+                             show="headings")
+        table.heading("File", text="File")
+        table.heading("Tags", text="Proposed Tags")
+        table.column("File", width=300)
+        table.column("Tags", width=300)
+        table_scroll = ttk.Scrollbar(content, command=table.yview)
+        table.config(yscrollcommand=table_scroll.set)
+        table_scroll.pack(side="right", fill="y")
+        table.pack(side="left", fill="both", expand=True)
+        rows = {file_path: table.insert(
+                    "", "end", values=(os.path.basename(file_path),
+                                       ", ".join(proposals[file_path])))
+                for file_path in shown}
+
+        def get_chosen_tags():
+            return {tag_order[index] for index in tag_list.curselection()}
+
+        def update_rows(event=None):
+            chosen = get_chosen_tags()
+            for file_path, item in rows.items():
+                table.set(item, "Tags", ", ".join(
+                    tag for tag in proposals[file_path] if tag in chosen))
+
+        def apply_tags():
+            chosen = get_chosen_tags()
+            window.destroy()
+            changes = self.add_tags_to_files(
+                {file_path: [tag for tag in tags if tag in chosen]
+                 for file_path, tags in proposals.items()})
+            tagged = len({file_path for file_path, _, _ in changes})
+            messagebox.showinfo(
+                "Suggestions Applied",
+                f"Added {len(changes)} tags to {tagged} files.")
+
+        tag_list.bind("<<ListboxSelect>>", update_rows)
+        button_frame = tk.Frame(window)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        tk.Button(button_frame, text="Cancel", command=window.destroy,
+                  bg="orange").pack(side="right", padx=5)
+        tk.Button(button_frame, text="Apply", command=apply_tags,
+                  bg="yellow").pack(side="right", padx=5)
+
+    def schedule_filter(self, event=None):
+        """Debounces the name filter so a burst of keystrokes triggers a
+        single filter pass."""
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(FILTER_DEBOUNCE_MS,
+                                               self.apply_filters)
 
     def apply_filters(self):
         """Apply all filters to the file list."""
-        filtered_files = self.files
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+            self.filter_after_id = None
+        # Any pass still running for an older query is now stale
+        self.filter_generation += 1
         filter_text = self.filter_var.get().lower()
-        if filter_text:
-            filtered_files = [file for file in filtered_files
-                             if filter_text in file["name"].lower()]
+        if not filter_text:
+            self.finish_filters(self.files)
+            return
+        if len(filter_text) >= 3 and self.name_index is not None:
+            self.apply_indexed_filter(filter_text)
+            return
+        candidates = self.files
+        if (self.name_filter_matches is not None
+                and self.name_filter_text
+                and filter_text.startswith(self.name_filter_text)):
+            # The new query extends the previous one: narrow its results
+            candidates = self.name_filter_matches
+        self.filter_names_chunk(self.filter_generation, filter_text,
+                                candidates, 0, [])
+
+    def build_name_index_chunk(self, generation, index, start):
+        """Indexes one chunk of file names; the index is published once the
+        whole list is done. Until then the filter uses the chunked scan."""
+        if generation != self.name_index_generation:
+            return
+        end = start + FILTER_CHUNK_SIZE
+        for file in self.files[start:end]:
+            index.add(file["path"], file["name"])
+        if end < len(self.files):
+            self.root.after(1, self.build_name_index_chunk, generation,
+                            index, end)
+            return
+        self.name_index = index
+
+    def apply_indexed_filter(self, filter_text):
+        """Filters by name through the trigram index, falling back to fuzzy
+        matches when nothing contains the query (e.g. on a typo)."""
+        index = self.name_index
+        paths = index.find_substring(filter_text)
+        if paths:
+            matches = [self.files_by_path[path] for path in paths]
+            self.name_filter_text = filter_text
+            self.name_filter_matches = matches
+        else:
+            matches = [self.files_by_path[path]
+                       for path in index.search(filter_text)]
+        self.finish_filters(matches)
+
+    def filter_names_chunk(self, generation, filter_text, candidates, start,
+                           matches):
+        """Scans one chunk of candidates for the name filter and schedules
+        the next chunk, giving the event loop a chance to run in between."""
+        if generation != self.filter_generation:
+            return
+        end = start + FILTER_CHUNK_SIZE
+        matches.extend(file for file in candidates[start:end]
+                       if filter_text in file["name_lower"])
+        if end < len(candidates):
+            self.root.after(1, self.filter_names_chunk, generation,
+                            filter_text, candidates, end, matches)
+            return
+        self.name_filter_text = filter_text
+        self.name_filter_matches = matches
+        self.finish_filters(matches)
+
+    def finish_filters(self, filtered_files):
+        """Applies the tag filters to the name matches and shows them."""
         if self.search_tags:
             filtered_files = search_files_by_tags(
                 filtered_files, self.search_tags)
-        self.filtered_files = filtered_files
+        self.set_filtered_files(filtered_files)
         self.update_file_tree()
 
+    def set_filtered_files(self, filtered_files):
+        """Replaces the filtered list; sort orders cached for the previous
+        filter result no longer apply."""
+        self.filtered_files = list(filtered_files)
+        self.filtered_positions = None
+        self.filter_version += 1
+        self.sort_cache.clear()
+        self.sorted_key = None
+
     def update_file_tree(self):
         """Updates the file tree with the current filtered list."""
-        self.file_tree.delete(*self.file_tree.get_children())
         self.sort_files()
+        virtual = len(self.filtered_files) > VIRTUAL_LIST_THRESHOLD
+        if virtual != self.virtual_list_active:
+            # Carry the selection across the mode switch
+            selected_paths = self.get_selected_paths()
+            self.file_tree.delete(*self.file_tree.get_children())
+            self.virtual_row_items = []
+            self.item_by_path = {}
+            self.path_by_item = {}
+            self.virtual_list_active = virtual
+            self.virtual_offset = 0
+            self.selected_paths = set(selected_paths)
+        if self.virtual_list_active:
+            self.render_virtual_rows()
+            self.render_gallery()
+            return
+        selected_paths = self.get_selected_paths()
+        self.file_tree.delete(*self.file_tree.get_children())
+        self.item_by_path = {}
+        self.path_by_item = {}
         for file in self.filtered_files:
-            modified_date = datetime.fromtimestamp(
-                file["modified"]).strftime("%Y-%m-%d %H:%M")
-            tags_str = ", ".join(file["tags"]) if file["tags"] else ""
-            length_str = format_length(
-                file["length"]) if file["length"] > 0 else "-"
-            ext = file["ext"][1:] if file["ext"] else ""
-            self.file_tree.insert(
-                "", "end", 
-                values=(
-                    file["basename"],
-                    ext,
-                    file["type"].capitalize(),
-                    file["human_size"],
-                    length_str,
-                    modified_date,
-                    tags_str
-                ),
-                tags=(file["path"],)#,
+            item = self.file_tree.insert(
+                "", "end",
+                values=format_file_row(file),
+                tags=(file["path"],)
             )
+            self.item_by_path[file["path"]] = item
+            self.path_by_item[item] = file["path"]
+        self.reselect_files_in_treeview(selected_paths)
+
+    def get_filtered_index(self, file_path):
+        """Returns the row of a file in the displayed list, or None."""
+        if self.filtered_positions is None:
+            self.filtered_positions = {
+                file["path"]: index
+                for index, file in enumerate(self.filtered_files)}
+        return self.filtered_positions.get(file_path)
+
+    def update_file_rows(self, file_paths):
+        """Redraws only the rows of the given files, unless the change may
+        have moved them, in which case the list is re-sorted."""
+        if self.sorted_key is None:
+            self.update_file_tree()
+        elif self.virtual_list_active:
+            if not self.item_by_path.keys().isdisjoint(file_paths):
+                self.render_virtual_rows()
+        else:
+            for file_path in file_paths:
+                item = self.item_by_path.get(file_path)
+                file = self.files_by_path.get(file_path)
+                if item and file:
+                    self.file_tree.item(item, values=format_file_row(file))
 
     def sort_files(self):
-        """Sort the filtered files based on current sort column."""
-        reverse = not self.sort_ascending
-        if self.sort_column == "Name":
-            self.filtered_files.sort(
-                key=lambda x: x["basename"].lower(), reverse=reverse)
-        elif self.sort_column == "Ext":
-            self.filtered_files.sort(
-                key=lambda x: x["ext"].lower(), reverse=reverse)
-        elif self.sort_column == "Type":
-            self.filtered_files.sort(
-                key=lambda x: x["type"], reverse=reverse)
-        elif self.sort_column == "Size":
-            self.filtered_files.sort(
-                key=lambda x: x["size"], reverse=reverse)
-        elif self.sort_column == "Length":
-            self.filtered_files.sort(
-                key=lambda x: x["length"], reverse=reverse)
-        elif self.sort_column == "Modified":
-            self.filtered_files.sort(
-                key=lambda x: x["modified"], reverse=reverse)
-        elif self.sort_column == "Tags":
-            self.filtered_files.sort(
-                key=lambda x: len(x["tags"]), reverse=reverse)
-
-    def sort_by_column(self, column):
-        """Sorts the treeview by the specified column."""
-        if self.sort_column == column:
-            self.sort_ascending = not self.sort_ascending
+        """Sort the filtered files based on the current sort columns. Does
+        nothing if the list is already in that order, and reuses orders
+        cached for the current filter result."""
+        spec = tuple(self.sort_columns)
+        key = (self.filter_version, spec)
+        if key == self.sorted_key:
+            return
+        ordered = self.sort_cache.get(key)
+        if ordered is None:
+            ordered = list(self.filtered_files)
+            columns = [column for column, _ in spec]
+            # Stable sorts from the last key to the first, with the name as
+            # the final tie-break
+            if "Name" not in columns:
+                ordered.sort(key=lambda f: get_sort_key(f, "Name"))
+            for column, ascending in reversed(spec):
+                ordered.sort(key=lambda f, c=column: get_sort_key(f, c),
+                             reverse=not ascending)
+            self.sort_cache[key] = ordered
+            if len(self.sort_cache) > SORT_CACHE_SIZE:
+                self.sort_cache.popitem(last=False)
+        else:
+            self.sort_cache.move_to_end(key)
+        self.filtered_files = ordered
+        self.filtered_positions = None
+        self.sorted_key = key
+
+    def invalidate_sort(self, column):
+        """Drops cached orders that depend on a column whose values changed;
+        changes to other columns leave the current order untouched."""
+        for key in list(self.sort_cache):
+            if any(c == column for c, _ in key[1]):
+                del self.sort_cache[key]
+        if self.sorted_key and any(c == column
+                                   for c, _ in self.sorted_key[1]):
+            self.sorted_key = None
+
+    def sort_by_column(self, column, extend=False):
+        """Sorts the treeview by the specified column. With extend, the
+        column is added as (or toggled as) a secondary sort column."""
+        columns = [c for c, _ in self.sort_columns]
+        if column in columns:
+            index = columns.index(column)
+            if extend or index == 0:
+                ascending = not self.sort_columns[index][1]
+                self.sort_columns[index] = (column, ascending)
+            if not extend:
+                self.sort_columns = [self.sort_columns[index]]
+        elif extend:
+            self.sort_columns.append((column, True))
         else:
-            self.sort_column = column
-            self.sort_ascending = True
+            self.sort_columns = [(column, True)]
+        self.save_sort_columns()
+        self.update_sort_headings()
         self.update_file_tree()
 
+    def update_sort_headings(self):
+        """Marks the sort columns and directions in the Treeview headings."""
+        sort_columns = dict(self.sort_columns)
+        order = [c for c, _ in self.sort_columns]
+        for column in self.file_tree["columns"]:
+            text = column
+            if column in sort_columns:
+                text += " ▲" if sort_columns[column] else " ▼"
+                if len(order) > 1:
+                    text += str(order.index(column) + 1)
+            self.file_tree.heading(column, text=text)
+
+    def load_sort_columns(self):
+        """Reads the saved sort order, e.g. "Type:asc,Size:desc"."""
+        saved = self.config.get("Settings", "sort_columns",
+                                fallback="Name:asc")
+        sort_columns = []
+        for part in saved.split(","):
+            column, _, direction = part.partition(":")
+            if (column in self.file_tree["columns"]
+                    and column not in dict(sort_columns)):
+                sort_columns.append((column, direction != "desc"))
+        return sort_columns or [("Name", True)]
+
+    def save_sort_columns(self):
+        """Persists the sort order so it survives refreshes and restarts."""
+        self.config.set("Settings", "sort_columns", ",".join(
+            f"{column}:{'asc' if ascending else 'desc'}"
+            for column, ascending in self.sort_columns))
+        self.save_config()
+
     def on_file_select(self, event):
         """Handles file selection in the treeview."""
+        if self.virtual_list_active:
+            # The clicked/cursor row may have scrolled out of the window
+            selected_paths = self.get_selected_paths()
+            if not selected_paths:
+                return
+            file_path = selected_paths[0]
+            if self.virtual_cursor_index < len(self.filtered_files):
+                cursor_path = self.filtered_files[
+                    self.virtual_cursor_index]["path"]
+                if cursor_path in self.selected_paths:
+                    file_path = cursor_path
+        else:
+            selection = self.file_tree.selection()
+            if not selection or selection[0] not in self.path_by_item:
+                return
+            file_path = self.path_by_item[selection[0]]
+        self.show_current_file(file_path)
+
+    def schedule_file_select(self, event=None):
+        """Debounces selection changes in the normal list, so that arrow
+        keys update the preview once the cursor rests. Clicks are already
+        handled by on_file_select; the virtual list handles its own keys."""
+        if self.virtual_list_active:
+            return
+        if self.select_after_id is not None:
+            self.root.after_cancel(self.select_after_id)
+        self.select_after_id = self.root.after(SELECT_DEBOUNCE_MS,
+                                               self.follow_tree_selection)
+
+    def follow_tree_selection(self):
+        """Shows the first selected file unless the current file is still
+        selected. <<TreeviewSelect>> also fires for selection_set, so this
+        leaves the gallery, Select All and re-selection after tagging
+        alone."""
+        self.select_after_id = None
         selection = self.file_tree.selection()
-        if not selection:
+        if not selection or selection[0] not in self.path_by_item:
             return
-        item_id = selection[0]
-        item_tags = self.file_tree.item(item_id, "tags")
-        if not item_tags:
+        if (self.current_file
+                and self.item_by_path.get(self.current_file["path"])
+                in selection):
             return
-        file_path = item_tags[0]
-        for file in self.filtered_files:
-            if file["path"] == file_path:
-                self.current_file = file
-                break
+        self.show_current_file(self.path_by_item[selection[0]])
+
+    def show_current_file(self, file_path):
+        """Makes a file the current one: its info, tags, suggestions and
+        preview are shown."""
+        if file_path in self.files_by_path:
+            self.current_file = self.files_by_path[file_path]
         self.update_file_info()
         self.update_current_tags()
         self.update_suggested_tags()
         self.preview_file()
+        self.prefetch_neighbours()
+
+    def prefetch_neighbours(self):
+        """Renders the previews of the rows around the selection in the
+        background, leading in the direction the user is moving through
+        the list, so that the next selection paints from memory."""
+        if self.prefetch_token is not None:
+            self.prefetch_token.cancel()
+        if not self.current_file:
+            return
+        index = self.get_filtered_index(self.current_file["path"])
+        if index is None:
+            return
+        if self.last_preview_index is not None and \
+                index != self.last_preview_index:
+            self.prefetch_direction = (1 if index > self.last_preview_index
+                                       else -1)
+        self.last_preview_index = index
+        width = self.preview_canvas.winfo_width()
+        height = self.preview_canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return
+        token = self.prefetch_token = CancelToken()
+        steps = range(1, PREFETCH_NEIGHBOURS + 1)
+        # Rows ahead are queued first so they are rendered first
+        rows = [index + self.prefetch_direction * step for step in steps]
+        rows += [index - self.prefetch_direction * step for step in steps]
+        for row in rows:
+            if not 0 <= row < len(self.filtered_files):
+                continue
+            file = self.filtered_files[row]
+            renderer = get_preview_renderer(file, width, height,
+                                            self.video_thumbnail_offset)
+            if renderer is None:
+                continue
+            variant, create = renderer
+            if self.thumbnail_cache.peek(file["path"], width, height,
+                                         variant) is not None:
+                continue
+            self.scheduler.submit(self.thumbnail_cache.get_or_create,
+                                  file["path"], width, height, variant,
+                                  create, priority=PRIORITY_LOW, token=token,
+                                  lane=get_preview_lane(variant))
 
     def update_file_info(self):
         """Updates the file info display."""
@@ -1065,99 +4705,53 @@ class TagzApp:
         file = self.current_file
         file_type = file["type"].capitalize()
         size = file["human_size"]
+        info = f"{file['name']} - {file_type} - {size}"
         if file["type"] in ["video", "audio"]:
-            length = format_length(file["length"])
-            self.file_info_var.set(
-                f"{file['name']} - {file_type} - {size} - {length}")
-        else:
-            self.file_info_var.set(f"{file['name']} - {file_type} - {size}")
+            info += f" - {format_length(file['length'])}"
+        if file["metadata"]:
+            info += f" - {format_metadata(file['metadata'])}"
+        self.file_info_var.set(info)
 
     def update_current_tags(self):
         """Updates the display of the current file's tags."""
-        # Clear the current tags
-        for widget in self.current_tags_frame.winfo_children():
-            widget.destroy()
         if not self.current_file:
+            self.current_tags_panel.clear()
             return
-        # Add tags
-        file_tags = self.current_file.get("tags", [])
-        if not file_tags:
-            tk.Label(self.current_tags_frame,
-                     text="No tags").pack(side="left", padx=5)
-            return
-        tk.Label(self.current_tags_frame,
-                 text="Current Tags:").pack(side="left", padx=5)
-        for tag in file_tags:
-            tag_frame = tk.Frame(self.current_tags_frame,
-                                 bd=1, relief="raised", padx=2, pady=2)
-            tag_frame.pack(side="left", padx=2, pady=2)
-            tk.Label(tag_frame, text=tag).pack(side="left")
-            remove_btn = tk.Button(
-                tag_frame, text="✕", bd=0, padx=2, pady=0,
-                command=lambda t=tag: self.remove_tag(t)
-            )
-            remove_btn.pack(side="left")
+        self.current_tags_panel.set_tags(self.current_file.get("tags", []))
 
     def update_suggested_tags(self):
         """Updates the suggested tags based on the current file."""
-        # Clear the suggested tags
-        for widget in self.suggested_tags_frame.winfo_children():
-            widget.destroy()
         if not self.current_file:
+            self.related_tags_panel.clear()
+            self.suggested_tags_panel.clear()
             return
+        related = self.tag_store.related_tags(self.current_file["path"])
+        self.related_tags_panel.set_tags(related)
         filename = self.current_file["name"]
         full_path = self.current_file["path"]
         directory = os.path.dirname(full_path)
-        # Generate tags from filename
-        suggested_name = generate_suggested_tags(filename)
-        # Add directory tags (depending on toggle)
-        if directory:
-            if self.full_path_tags_var.get():
-                parts = os.path.normpath(directory).split(os.sep)
-                for part in parts:
-                    if part and part not in ["/", "\\", ""]:
-                        suggested_name.append(part.lower())
-            else:
-                last_folder = os.path.basename(directory)
-                suggested_name.append(last_folder.lower())
-        suggested = list(set(suggested_name))
-        # Remove tags that are already applied
+        # Generate tags from filename and embedded metadata, then directory
+        # tags (depending on toggle)
+        suggested_name = (generate_suggested_tags(filename)
+                          + metadata_suggested_tags(
+                              self.current_file["metadata"])
+                          + get_directory_tags(
+                              directory, self.full_path_tags_var.get()))
+        # Remove tags that are already applied; keep a stable order so the
+        # chip panel can reuse chips between selections
         current_tags = self.current_file.get("tags", [])
-        suggested = [tag for tag in suggested if tag not in current_tags]
-        if not suggested:
-            tk.Label(self.suggested_tags_frame,
-                     text="No suggestions").pack(side="left", padx=5)
-            return
-        for tag in suggested:
-            tag_button = tk.Button(
-                self.suggested_tags_frame, text=tag, padx=5, pady=2,
-                command=lambda t=tag: self.quick_add_tag(t)
-            )
-            tag_button.pack(side="left", padx=2, pady=2)
+        suggested = [tag for tag in dict.fromkeys(suggested_name)
+                     if tag not in current_tags and tag not in related]
+        self.suggested_tags_panel.set_tags(suggested)
 
     def update_popular_tags(self):
         """Updates the display of popular tags."""
-        # Clear the popular tags
-        for widget in self.popular_tags_frame.winfo_children():
-            widget.destroy()
-        # Get all tags
-        all_tags = get_all_tags()
-        if not all_tags:
-            tk.Label(self.popular_tags_frame,
-                     text="No tags in system").pack(side="left", padx=5)
-            return
         # Display top 10 tags
-        for tag in all_tags[:10]:
-            tag_button = tk.Button(
-                self.popular_tags_frame, text=tag, padx=5, pady=2,
-                command=lambda t=tag: self.quick_add_tag(t)
-            )
-            tag_button.pack(side="left", padx=2, pady=2)
+        self.popular_tags_panel.set_tags(self.tag_store.all_tags()[:10])
 
     def update_tag_filter_combo(self):
         """Updates the tag filter combobox with all available tags."""
-        all_tags = get_all_tags()
-        self.tag_filter_combo["values"] = all_tags
+        self.tag_filter_combo["values"] = self.tag_store.all_tags()
 
     def add_tag_filter(self):
         """Adds a tag to the search filters."""
@@ -1170,23 +4764,7 @@ class TagzApp:
 
     def update_active_filters_display(self):
         """Updates the display of active tag filters."""
-        # Clear the active filters
-        for widget in self.active_filters_frame.winfo_children():
-            widget.destroy()
-        if not self.search_tags:
-            return
-        tk.Label(self.active_filters_frame,
-                 text="Active Tag Filters:").pack(side="left", padx=5)
-        for tag in self.search_tags:
-            tag_frame = tk.Frame(self.active_filters_frame, bd=1,
-                                 relief="raised", padx=2, pady=2)
-            tag_frame.pack(side="left", padx=2, pady=2)
-            tk.Label(tag_frame, text=tag).pack(side="left")
-            remove_btn = tk.Button(
-                tag_frame, text="✕", bd=0, padx=2, pady=0,
-                command=lambda t=tag: self.remove_tag_filter(t)
-            )
-            remove_btn.pack(side="left")
+        self.active_filters_panel.set_tags(self.search_tags)
 
     def remove_tag_filter(self, tag):
         """Removes a tag from the search filters."""
@@ -1210,72 +4788,109 @@ class TagzApp:
         tag = self.tag_entry_var.get().strip()
         if not tag:
             return
-        if add_tag_to_file(self.current_file["path"], tag):
-            # Update the file's tags
-            self.current_file["tags"].append(tag)
-            # Update UI
+        self.change_tags([self.current_file["path"]], tag, True)
+        self.tag_entry_var.set("")
+
+    def change_tags(self, file_paths, tag, add):
+        """Adds or removes a tag on files. The records change immediately;
+        the tag store publishes the events that redraw the affected views
+        and saves the whole batch in the background."""
+        changes = []
+        for file_path in file_paths:
+            file = self.files_by_path.get(file_path)
+            if not file:
+                continue
+            if add and tag not in file["tags"]:
+                file["tags"].append(tag)
+            elif not add:
+                file["tags"] = [t for t in file["tags"] if t != tag]
+            changes.append((file_path, tag, add))
+        self.tag_store.apply(changes)
+
+    def on_file_rows_changed(self, events):
+        """Redraws the rows of files whose tags or metadata changed."""
+        names = {name for name, _ in events}
+        if EVENT_TAG_ADDED in names or EVENT_TAG_REMOVED in names:
+            self.invalidate_sort("Tags")
+        if EVENT_METADATA_UPDATED in names:
+            for column in ("Length", *METADATA_COLUMNS):
+                self.invalidate_sort(column)
+        self.update_file_rows({args[0] for _, args in events})
+
+    def on_current_file_tags_changed(self, events):
+        """Redraws the tag panels if the current file's tags changed."""
+        if not self.current_file:
+            return
+        if any(args[0] == self.current_file["path"] for _, args in events):
             self.update_current_tags()
             self.update_suggested_tags()
-            self.update_file_tree()
-            self.update_popular_tags()
-            self.update_tag_filter_combo()
-            self.update_active_filters_display()
-            self.tag_entry_var.set("")
+
+    def on_current_file_metadata_changed(self, events):
+        """Redraws the file info and suggestions if the current file's
+        metadata changed."""
+        if not self.current_file:
+            return
+        if any(args[0] == self.current_file["path"] for _, args in events):
+            self.update_file_info()
+            self.update_suggested_tags()
+
+    def on_tag_set_changed(self, events):
+        """Redraws the views listing all tags."""
+        self.update_popular_tags()
+        self.update_tag_filter_combo()
 
     def quick_add_tag(self, tag):
         """Quickly adds a tag from suggestions orpopular tags to selected
         files."""
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_file_paths = self.get_selected_paths()
+        if not selected_file_paths:
             messagebox.showinfo("Info", "Please select one or more files.")
             return
-        selected_file_paths = [
-            self.file_tree.item(item, 'tags')[0] for item in selected_items]
-        for item in selected_items:
-            file_path = self.file_tree.item(item, 'tags')[0]
-            for file in self.files:
-                if file["path"] == file_path:
-                    if add_tag_to_file(file["path"], tag):
-                        if tag not in file["tags"]:
-                            file["tags"].append(tag)
-        self.update_file_tree()
-        self.update_current_tags()
-        self.update_suggested_tags()
-        self.reselect_files_in_treeview(selected_file_paths)
+        self.change_tags(selected_file_paths, tag, True)
 
     def remove_tag(self, tag):
         """Removes a tag from the selected files."""
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_file_paths = self.get_selected_paths()
+        if not selected_file_paths:
             messagebox.showinfo("Info", "Please select one or more files.")
             return
-        selected_file_paths = [
-            self.file_tree.item(item, 'tags')[0] for item in selected_items]
-        for item in selected_items:
-            file_path = self.file_tree.item(item, 'tags')[0]
-            for file in self.files:
-                if file["path"] == file_path:
-                    if remove_tag_from_file(file["path"], tag):
-                        file["tags"] = [t for t in file["tags"] if t != tag]
-        self.update_file_tree()
-        self.update_current_tags()
-        self.update_suggested_tags()
-        self.update_popular_tags()
-        self.update_tag_filter_combo()
-        self.reselect_files_in_treeview(selected_file_paths)
+        self.change_tags(selected_file_paths, tag, False)
 
     def preview_file(self):
-        """Previews the selected file."""
+        """Previews the selected file. Decoding runs in the background and
+        is cancelled when the selection moves on."""
         if not self.current_file:
             return
+        if self.preview_token is not None:
+            self.preview_token.cancel()
+        self.preview_token = CancelToken(PREVIEW_DEADLINE)
+        if self.waveform_token is not None:
+            self.waveform_token.cancel()
+            self.waveform_token = None
+        if self.filmstrip_token is not None:
+            self.filmstrip_token.cancel()
+            self.filmstrip_token = None
         # Clear the preview canvas
         self.preview_canvas.delete("all")
+        self.preview_source = None
+        self.stop_zoom()
+        self.stop_animation()
         # Stop any playing audio
         self.stop_media_playback()
         # Hide media controls
         self.play_button.pack_forget()
+        self.hide_pdf_controls()
+        self.text_preview_state = None
         file_path = self.current_file["path"]
         file_type = self.current_file["type"]
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            # Not laid out yet; redraw_preview renders once it has a size,
+            # so no 1x1 preview is drawn or cached
+            self.preview_render_size = None
+            return
+        self.preview_render_size = (canvas_width, canvas_height)
         try:
             if file_type == "image":
                 self.preview_image(file_path)
@@ -1285,6 +4900,9 @@ class TagzApp:
                 self.preview_video(file_path)
             elif file_type == "document":
                 self.preview_document(file_path)
+            elif (file_type == "code"
+                  or self.current_file["ext"] in TEXT_PREVIEW_EXTS):
+                self.preview_text(file_path)
             else:
                 self.preview_canvas.create_text(
                     150, 150,
@@ -1299,112 +4917,323 @@ class TagzApp:
                 fill="red", font=("Arial", 12), width=280
             )
 
+    def submit_cached_preview(self, file_path, width, height, variant,
+                              create, on_done, on_error=None):
+        """Runs create() -> (image, meta) in the background through the
+        thumbnail cache; on_done receives (image, meta). Previews already
+        decoded in memory are shown straight away."""
+        cached = self.thumbnail_cache.peek(file_path, width, height, variant)
+        if cached is not None:
+            on_done(cached)
+            return
+        self.submit_preview(self.thumbnail_cache.get_or_create, file_path,
+                            width, height, variant, create, on_done=on_done,
+                            on_error=on_error, lane=get_preview_lane(variant))
+
+    def submit_preview(self, func, *args, on_done, on_error=None, lane=None):
+        """Runs a preview decoder in the background for the current
+        selection."""
+        self.scheduler.submit(func, *args, priority=PRIORITY_HIGH,
+                              token=self.preview_token, on_done=on_done,
+                              on_error=on_error or self.show_preview_error,
+                              lane=lane)
+
+    def show_preview_error(self, error):
+        """Shows a preview failure on the canvas."""
+        self.preview_canvas.create_text(
+            150, 150, text=f"Error loading image:\n{str(error)}",
+            fill="red", font=("Arial", 12), width=280
+        )
+
     def preview_image(self, file_path):
-        """Displays an image preview."""
-        try:
-            img = Image.open(file_path)
-            canvas_width = self.preview_canvas.winfo_width()
-            canvas_height = self.preview_canvas.winfo_height()
-            img_width, img_height = img.size
-            ratio = min(canvas_width/img_width, canvas_height/img_height)
-            new_width = int(img_width * ratio)
-            new_height = int(img_height * ratio)
-            img = img.resize((new_width, new_height),
-                             resample=Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            self.preview_canvas.create_image(
-                canvas_width // 2, canvas_height // 2,
-                image=photo, anchor="center"
-            )
-            self.preview_canvas.image = photo
-        except Exception as e:
-            self.preview_canvas.create_text(
-                150, 150, text=f"Error loading image:\n{str(e)}",
-                fill="red", font=("Arial", 12), width=280
-            )
+        """Displays an image preview. A cached or quickly decoded version is
+        painted first, then replaced by the full quality render. Animated
+        images then start playing."""
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
+        variant, create = get_preview_renderer(
+            self.current_file, canvas_width, canvas_height)
+        animated = self.current_file["ext"] in ANIMATED_EXTS
+        cached = self.thumbnail_cache.peek(file_path, canvas_width,
+                                           canvas_height, variant)
+        if cached is not None:
+            self.preview_image_from_pil(cached[0])
+            if animated:
+                self.start_animation(file_path, canvas_width, canvas_height)
+            return
+
+        def first_paint():
+            cached = self.thumbnail_cache.lookup(file_path, canvas_width,
+                                                 canvas_height, variant)
+            if cached is not None:
+                return cached[0], False
+            first = load_image_first_paint(file_path, canvas_width,
+                                           canvas_height)
+            if first is None:
+                # No cheap decode: make the final render once and cache it
+                return self.thumbnail_cache.get_or_create(
+                    file_path, canvas_width, canvas_height, variant,
+                    create)[0], False
+            return first
+
+        def refine():
+            self.submit_cached_preview(
+                file_path, canvas_width, canvas_height, variant, create,
+                on_done=lambda refined: self.preview_image_from_pil(
+                    refined[0]))
+
+        def on_first_paint(result):
+            img, needs_refine = result
+            self.preview_image_from_pil(img)
+            if animated:
+                self.start_animation(file_path, canvas_width, canvas_height,
+                                     on_still=refine if needs_refine
+                                     else None)
+            elif needs_refine:
+                refine()
+
+        self.submit_preview(first_paint, on_done=on_first_paint)
+
+    def start_animation(self, file_path, width, height, on_still=None):
+        """Plays an animated image in the preview. Frames are decoded in
+        the background as they are first needed; on_still is called
+        instead if the image has a single frame."""
+        token = CancelToken()
+        self.animation = {"token": token, "decoder": None, "opened": None,
+                          "index": 0, "after_id": None, "paused": False}
+        animation = self.animation
+
+        def open_decoder():
+            decoder = AnimationDecoder(file_path, width, height)
+            if decoder.frame_count < 2:
+                decoder.close()
+                return None
+            # Recorded here rather than in on_open, which is dropped if the
+            # animation is stopped meanwhile; stop_animation closes it
+            animation["opened"] = decoder
+            decoder.decode(0)
+            return decoder
+
+        def on_open(decoder):
+            if decoder is None:
+                self.animation = None
+                if on_still is not None:
+                    on_still()
+                return
+            animation["decoder"] = decoder
+            if self.zoom is not None or \
+                    not self.preview_canvas.winfo_viewable():
+                animation["paused"] = True
+                return
+            self.show_animation_frame(0)
+
+        self.scheduler.submit(open_decoder, lane=ANIMATION_LANE, token=token,
+                              on_done=on_open,
+                              on_error=lambda e: print(
+                                  f"Animation error: {e}"))
+
+    def show_animation_frame(self, index):
+        """Shows one frame and schedules the next after its delay. The next
+        frame is decoded in the meantime if it is not cached."""
+        animation = self.animation
+        if animation is None or animation["paused"]:
+            return
+        decoder = animation["decoder"]
+        animation["after_id"] = None
+        animation["index"] = index
+        cached = decoder.peek(index)
+        if cached is None:
+            self.scheduler.submit(
+                decoder.decode, index, lane=ANIMATION_LANE,
+                token=animation["token"],
+                on_done=lambda result: self.show_animation_frame(index),
+                on_error=lambda e: print(f"Animation error: {e}"))
+            return
+        frame, delay = cached
+        self.preview_image_from_pil(frame)
+        next_index = (index + 1) % decoder.frame_count
+        if decoder.peek(next_index) is None:
+            self.scheduler.submit(decoder.decode, next_index,
+                                  lane=ANIMATION_LANE,
+                                  token=animation["token"])
+        animation["after_id"] = self.root.after(
+            max(delay, ANIMATION_MIN_DELAY),
+            lambda: self.show_animation_frame(next_index))
+
+    def pause_animation(self):
+        """Stops the animation timer, keeping the current frame."""
+        animation = self.animation
+        if animation is None or animation["paused"]:
+            return
+        animation["paused"] = True
+        if animation["after_id"] is not None:
+            self.root.after_cancel(animation["after_id"])
+            animation["after_id"] = None
+
+    def resume_animation(self):
+        """Continues a paused animation from its current frame."""
+        animation = self.animation
+        if animation is None or not animation["paused"] or \
+                animation["decoder"] is None:
+            return
+        animation["paused"] = False
+        self.show_animation_frame(animation["index"])
+
+    def stop_animation(self):
+        """Ends playback and closes the animation's file."""
+        animation = self.animation
+        if animation is None:
+            return
+        self.pause_animation()
+        animation["token"].cancel()
+
+        def close_decoder():
+            if animation["opened"] is not None:
+                animation["opened"].close()
+
+        # Queued behind any open still running on the lane, so a decoder
+        # opened after the stop is closed as well
+        self.scheduler.submit(close_decoder, lane=ANIMATION_LANE)
+        self.animation = None
+
+    def on_preview_visibility(self, event):
+        """Pauses the animation while the window or preview is hidden."""
+        if event.widget not in (self.root, self.preview_canvas):
+            return
+        if event.type == tk.EventType.Unmap:
+            self.pause_animation()
+        elif self.zoom is None:
+            self.resume_animation()
 
     def preview_audio(self, file_path):
-        """Provides an audio preview interface."""
-        # Display audio icon or waveform placeholder
+        """Provides an audio preview interface. The waveform is decoded in
+        the background and cached with the thumbnails; until it arrives an
+        audio icon is shown."""
         self.preview_canvas.create_text(
             150, 100, text="🎵 Audio File 🎵",
-            fill="blue", font=("Arial", 20)
+            fill="blue", font=("Arial", 20), tags="audio_placeholder"
         )
         file_name = os.path.basename(file_path)
         self.preview_canvas.create_text(
             150, 150, text=file_name,
-            fill="black", font=("Arial", 12)
+            fill="black", font=("Arial", 12), tags="audio_placeholder"
         )
         # Show media controls
         self.current_audio = file_path
         self.play_button.config(text="▶ Play")
         self.play_button.pack(side="left", padx=5)
+        self.show_waveform(file_path)
+
+    def show_waveform(self, file_path):
+        """Replaces the audio placeholder with the file's waveform at the
+        current canvas size, decoded in the background and cached."""
+        file_name = os.path.basename(file_path)
+        width = self.preview_canvas.winfo_width()
+        height = self.preview_canvas.winfo_height()
+
+        def on_waveform(result):
+            if result[0] is None:
+                return
+            self.preview_canvas.delete("audio_placeholder")
+            self.preview_canvas.delete("waveform_caption")
+            self.preview_image_from_pil(result[0])
+            self.preview_canvas.create_text(
+                width // 2, 15, text=file_name,
+                fill="black", font=("Arial", 12), tags="waveform_caption"
+            )
+
+        cached = self.thumbnail_cache.peek(file_path, width, height,
+                                           "waveform")
+        if cached is not None:
+            on_waveform(cached)
+            return
+
+        def render(token):
+            return self.thumbnail_cache.get_or_create(
+                file_path, width, height, "waveform",
+                lambda: (render_waveform(file_path, width, height, token),
+                         None))
+
+        if self.waveform_token is not None:
+            self.waveform_token.cancel()
+        self.waveform_token = CancelToken()
+        self.scheduler.submit(
+            render, priority=PRIORITY_NORMAL, token=self.waveform_token,
+            pass_token=True, on_done=on_waveform,
+            on_error=lambda e: print(f"Waveform error: {e}"))
 
     def preview_video(self, file_path):
         """Provides a video preview (thumbnail)."""
-        try:
-            cap = cv2.VideoCapture(file_path)
-            ret, frame = cap.read()
-            if ret:
-                # Convert from BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame_rgb)
-                self.preview_image_from_pil(img)
-                cap.release()
-                self.show_video_controls()
-                return
-            else:
-                cap.release()
-                print(
-                    "OpenCV failed to read video frame, falling back to ffmpeg"
-                    )
-        except ImportError:
-            print("OpenCV not available, trying ffmpeg")
-        except Exception as e:
-            print(f"OpenCV error: {e}, falling back to ffmpeg")
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.jpg',
-                                             delete=False) as temp_file:
-                thumbnail_path = temp_file.name
-            result = subprocess.run([
-                "ffmpeg", "-i", file_path,
-                "-ss", "00:00:01.000", "-vframes", "1",
-                thumbnail_path
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode == 0:
-                self.preview_image(thumbnail_path)
-                self.show_video_controls()
-            else:
-                print(f"ffmpeg error: {result.stderr.decode()}")
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
+
+        def on_frame(result):
+            img, _ = result
+            if img is None:
                 self.show_generic_video_preview()
-            try:
-                os.remove(thumbnail_path)
-            except OSError as e:
-                print(f"Error deleting thumbnail: {e}")
-        except FileNotFoundError:
-            print("ffmpeg not found. "
-                  "Please ensure it is installed and in your PATH.")
-            self.show_generic_video_preview()
-        except Exception as e:
-            print(f"Error generating video thumbnail: {e}")
-            self.show_generic_video_preview()
+                return
+            self.preview_image_from_pil(img)
+            self.show_video_controls()
+            self.preview_video_filmstrip(file_path, canvas_width,
+                                         canvas_height)
+
+        variant, create = get_preview_renderer(
+            self.current_file, canvas_width, canvas_height,
+            self.video_thumbnail_offset)
+        self.submit_cached_preview(file_path, canvas_width, canvas_height,
+                                   variant, create, on_done=on_frame)
+
+    def preview_video_filmstrip(self, file_path, width, height):
+        """Replaces the video's poster frame with a filmstrip of evenly
+        spaced keyframes, rendered in the background and cached. The
+        render has no deadline and stops when the selection moves on."""
+        count = self.video_filmstrip_frames
+        if count < 2:
+            return
+        duration = self.current_file.get("length", 0)
+        variant = f"filmstrip{count}"
+        cached = self.thumbnail_cache.peek(file_path, width, height, variant)
+        if cached is not None:
+            self.preview_image_from_pil(cached[0])
+            return
+
+        def render(token):
+            return self.thumbnail_cache.get_or_create(
+                file_path, width, height, variant,
+                lambda: (load_video_filmstrip(file_path, width, height,
+                                              count, duration, token), None))
+
+        def on_rendered(result):
+            if result[0] is not None:
+                self.preview_image_from_pil(result[0])
+
+        if self.filmstrip_token is not None:
+            self.filmstrip_token.cancel()
+        self.filmstrip_token = CancelToken()
+        self.scheduler.submit(
+            render, priority=PRIORITY_NORMAL, token=self.filmstrip_token,
+            pass_token=True, on_done=on_rendered,
+            on_error=lambda e: print(f"Filmstrip error: {e}"))
 
     def preview_image_from_pil(self, img):
         """Helper to display a PIL Image in the preview."""
         try:
+            # Kept so a resize can redraw without decoding the file again
+            self.preview_source = img
+            if self.zoom is not None:
+                # Shown again when the zoomed view is left
+                return
             canvas_width = self.preview_canvas.winfo_width()
             canvas_height = self.preview_canvas.winfo_height()
-            img_width, img_height = img.size
-            ratio = min(canvas_width / img_width, canvas_height / img_height)
-            new_width = int(img_width * ratio)
-            new_height = int(img_height * ratio)
-            img = img.resize((new_width, new_height),
-                             resample=Resampling.LANCZOS)
+            img = fit_image(img, canvas_width, canvas_height)
             photo = ImageTk.PhotoImage(img)
+            # Replaces an earlier, lower quality paint of the same preview
+            self.preview_canvas.delete("preview_image")
             self.preview_canvas.create_image(
                 canvas_width // 2, canvas_height // 2,
-                image=photo, anchor="center"
+                image=photo, anchor="center", tags="preview_image"
             )
+            self.preview_canvas.tag_lower("preview_image")
             self.preview_canvas.image = photo
         except Exception as e:
             self.preview_canvas.create_text(
@@ -1412,6 +5241,214 @@ class TagzApp:
                 fill="red", font=("Arial", 12), width=280
             )
 
+    def on_preview_configure(self, event):
+        """Redraws the preview once the pane has stopped changing size."""
+        size = (event.width, event.height)
+        if size == self.preview_size:
+            return
+        self.preview_size = size
+        if self.preview_resize_after_id is not None:
+            self.root.after_cancel(self.preview_resize_after_id)
+        self.preview_resize_after_id = self.root.after(
+            PREVIEW_RESIZE_DEBOUNCE_MS, self.redraw_preview)
+
+    def redraw_preview(self):
+        """Fits the current preview to the canvas from the image already in
+        memory. If the canvas has grown past the size the preview was
+        rendered for, the stretched image is only a stand-in until a render
+        at the new size arrives."""
+        self.preview_resize_after_id = None
+        width, height = self.preview_size
+        if width <= 1 or height <= 1:
+            return
+        if self.current_file and self.preview_render_size is None:
+            # The selection arrived before the canvas had a size
+            self.preview_file()
+            return
+        self.preview_canvas.itemconfigure("text_window", width=width,
+                                          height=height)
+        if self.zoom is not None:
+            self.zoom["pyramid"].set_viewport(width, height)
+            self.render_zoom()
+            return
+        if self.preview_source is not None:
+            self.preview_image_from_pil(self.preview_source)
+        rendered_width, rendered_height = self.preview_render_size or (0, 0)
+        if width > rendered_width or height > rendered_height:
+            self.preview_render_size = (width, height)
+            self.rerender_preview()
+
+    def rerender_preview(self):
+        """Renders the current preview again at the canvas size, without
+        resetting playback or the PDF page."""
+        file = self.current_file
+        if file is None:
+            return
+        if self.pdf_page_count or file["type"] in ("image", "video"):
+            # The selection's token may be past its deadline by now, and
+            # renders at the old size are no longer wanted
+            self.preview_token.cancel()
+            self.preview_token = CancelToken(PREVIEW_DEADLINE)
+        if self.pdf_page_count:
+            self.show_pdf_page(self.pdf_page)
+        elif file["type"] == "image":
+            self.stop_animation()
+            self.preview_image(file["path"])
+        elif file["type"] == "video":
+            self.preview_video(file["path"])
+        elif file["type"] == "audio":
+            self.show_waveform(file["path"])
+
+    def on_preview_zoom(self, event):
+        """Zooms an image preview in or out around the mouse pointer, in
+        steps of two from the fitted size up to 100%, or the largest size
+        an untiled image can be decoded at."""
+        if not self.current_file or self.current_file["type"] != "image":
+            return None
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        width = self.preview_canvas.winfo_width()
+        height = self.preview_canvas.winfo_height()
+        if self.zoom is None:
+            if not zoom_in:
+                return "break"
+            try:
+                pyramid = ImagePyramid(self.current_file["path"])
+            except Exception as e:
+                print(f"Zoom error: {e}")
+                return "break"
+            full_width, full_height = pyramid.size
+            fit = min(width / full_width, height / full_height)
+            if fit >= pyramid.max_scale:
+                return "break"
+            self.pause_animation()
+            scales = [fit]
+            while scales[-1] * 2 < pyramid.max_scale:
+                scales.append(scales[-1] * 2)
+            scales.append(pyramid.max_scale)
+            pyramid.set_viewport(width, height)
+            self.zoom = {"pyramid": pyramid, "scales": scales, "level": 0,
+                         "cx": full_width / 2, "cy": full_height / 2,
+                         "photos": {}}
+        zoom = self.zoom
+        level = zoom["level"] + (1 if zoom_in else -1)
+        if level <= 0:
+            self.reset_zoom()
+            return "break"
+        level = min(level, len(zoom["scales"]) - 1)
+        old_scale = zoom["scales"][zoom["level"]]
+        new_scale = zoom["scales"][level]
+        # Keep the image point under the pointer where it is
+        pointer_x = zoom["cx"] + (event.x - width / 2) / old_scale
+        pointer_y = zoom["cy"] + (event.y - height / 2) / old_scale
+        zoom["cx"] = pointer_x - (event.x - width / 2) / new_scale
+        zoom["cy"] = pointer_y - (event.y - height / 2) / new_scale
+        zoom["level"] = level
+        self.render_zoom()
+        return "break"
+
+    def on_preview_press(self, event):
+        """Starts panning a zoomed preview."""
+        if self.zoom is not None:
+            self.zoom["drag"] = (event.x, event.y)
+
+    def on_preview_drag(self, event):
+        """Pans a zoomed preview with the mouse."""
+        zoom = self.zoom
+        if zoom is None or "drag" not in zoom:
+            return
+        scale = zoom["scales"][zoom["level"]]
+        last_x, last_y = zoom["drag"]
+        zoom["cx"] -= (event.x - last_x) / scale
+        zoom["cy"] -= (event.y - last_y) / scale
+        zoom["drag"] = (event.x, event.y)
+        self.render_zoom()
+
+    def render_zoom(self):
+        """Draws the tiles of the zoomed view that are ready and requests
+        the missing ones. Only tiles in view are kept as PhotoImages."""
+        zoom = self.zoom
+        canvas = self.preview_canvas
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        pyramid = zoom["pyramid"]
+        scale = zoom["scales"][zoom["level"]]
+        level_width = pyramid.size[0] * scale
+        level_height = pyramid.size[1] * scale
+        # Keep the view on the image, centring it along axes it fits
+        for axis, view, level_size in (("cx", width, level_width),
+                                       ("cy", height, level_height)):
+            full = level_size / scale
+            half = view / 2 / scale
+            if level_size <= view:
+                zoom[axis] = full / 2
+            else:
+                zoom[axis] = min(max(zoom[axis], half), full - half)
+        x0 = zoom["cx"] * scale - width / 2
+        y0 = zoom["cy"] * scale - height / 2
+        canvas.delete("preview_image", "zoom_tile")
+        photos = {}
+        missing = []
+        first_column, first_row = max(0, int(x0 // ZOOM_TILE)), \
+            max(0, int(y0 // ZOOM_TILE))
+        last_column = min(int((level_width - 1) // ZOOM_TILE),
+                          int((x0 + width) // ZOOM_TILE))
+        last_row = min(int((level_height - 1) // ZOOM_TILE),
+                       int((y0 + height) // ZOOM_TILE))
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                key = (scale, column, row)
+                photo = zoom["photos"].get(key)
+                if photo is None:
+                    tile = pyramid.peek(scale, column, row)
+                    if tile is None:
+                        missing.append((column, row))
+                        continue
+                    photo = ImageTk.PhotoImage(tile)
+                photos[key] = photo
+                canvas.create_image(column * ZOOM_TILE - x0,
+                                    row * ZOOM_TILE - y0, image=photo,
+                                    anchor="nw", tags="zoom_tile")
+        canvas.tag_lower("zoom_tile")
+        zoom["photos"] = photos
+        if self.zoom_token is not None:
+            self.zoom_token.cancel()
+        self.zoom_token = CancelToken()
+        for column, row in missing:
+            self.scheduler.submit(
+                pyramid.get_tile, scale, column, row, lane=ZOOM_LANE,
+                token=self.zoom_token,
+                on_done=lambda tile: self.schedule_zoom_render(),
+                on_error=lambda e: print(f"Zoom error: {e}"))
+
+    def schedule_zoom_render(self):
+        """Redraws the zoomed view once for a batch of finished tiles."""
+        if self.zoom_render_pending:
+            return
+        self.zoom_render_pending = True
+
+        def render():
+            self.zoom_render_pending = False
+            if self.zoom is not None:
+                self.render_zoom()
+
+        self.root.after_idle(render)
+
+    def stop_zoom(self):
+        """Leaves the zoomed view and drops pending tile renders."""
+        if self.zoom_token is not None:
+            self.zoom_token.cancel()
+            self.zoom_token = None
+        self.zoom = None
+        self.preview_canvas.delete("zoom_tile")
+
+    def reset_zoom(self):
+        """Returns from the zoomed view to the fitted preview."""
+        if self.zoom is None:
+            return
+        self.stop_zoom()
+        if self.preview_source is not None:
+            self.preview_image_from_pil(self.preview_source)
+        self.resume_animation()
+
     def show_video_controls(self):
         """Helper function to show video controls."""
         self.play_button.config(text="▶ Open", bg="red")
@@ -1432,55 +5469,160 @@ class TagzApp:
     def preview_document(self, file_path):
         """Provides a document preview."""
         file_ext = os.path.splitext(file_path)[1].lower()
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
         if file_ext == ".pdf":
-            try:
-                doc = fitz.open(file_path)
-                if doc.page_count > 0:
-                    page = doc[0]
-                    pix = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
-                    img = Image.frombytes("RGB", [pix.width, pix.height],
-                                          pix.samples)
-                    canvas_width = self.preview_canvas.winfo_width()
-                    canvas_height = self.preview_canvas.winfo_height()
-                    img_width, img_height = img.size
-                    ratio = min(canvas_width/img_width,
-                                canvas_height/img_height)
-                    new_width = int(img_width * ratio)
-                    new_height = int(img_height * ratio)
-                    img = img.resize((new_width, new_height),
-                                     resample=Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
-                    self.preview_canvas.create_image(
-                        canvas_width // 2, canvas_height // 2,
-                        image=photo, anchor="center"
-                    )
-                    self.preview_canvas.image = photo
-                    self.preview_canvas.create_text(
-                        canvas_width // 2, 20,
-                        text=f"Page 1 of {doc.page_count}",
-                        fill="black", font=("Arial", 10)
-                    )
-                    doc.close()
+            def on_rendered(result):
+                img, page_count = result
+                if img is None:
+                    self.show_generic_document_preview(file_path)
                     return
-            except ImportError:
-                pass
-            except Exception as e:
+                self.preview_image_from_pil(img)
+                self.pdf_page = 0
+                self.pdf_page_count = page_count
+                self.show_pdf_controls()
+                self.prefetch_pdf_pages(file_path, canvas_width,
+                                        canvas_height)
+
+            def on_error(e):
                 print(f"PDF preview error: {e}")
-        elif file_ext in [".txt", ".md", ".py", ".java", ".html", ".css",
-                          ".js"]:
-            try:
-                with open(file_path, 'r', encoding='utf-8',
-                          errors='replace') as f:
-                    lines = [line.strip() for line in f.readlines()[:20]]
-                content = "\n".join(lines)
-                self.preview_canvas.create_text(
-                    10, 10, text=content,
-                    fill="black", font=("Courier", 10),
-                    anchor="nw", width=self.preview_canvas.winfo_width() - 20
-                )
+                self.show_generic_document_preview(file_path)
+
+            variant, create = get_preview_renderer(
+                self.current_file, canvas_width, canvas_height)
+            self.submit_cached_preview(file_path, canvas_width,
+                                       canvas_height, variant, create,
+                                       on_done=on_rendered, on_error=on_error)
+            return
+        elif file_ext in TEXT_PREVIEW_EXTS:
+            self.preview_text(file_path)
+            return
+        self.show_generic_document_preview(file_path)
+
+    def preview_text(self, file_path):
+        """Shows the start of a text or code file in a scrollable view.
+        More of the file is read in chunks as the view nears the end of
+        what has been loaded."""
+        def on_read(result):
+            text, encoding, next_offset = result
+            if text is None:
+                self.show_generic_document_preview(file_path)
                 return
-            except Exception as e:
-                print(f"Text preview error: {e}")
+            self.text_preview_state = {"path": file_path,
+                                       "encoding": encoding,
+                                       "offset": next_offset,
+                                       "loading": False}
+            self.text_preview.config(state="normal")
+            self.text_preview.delete("1.0", "end")
+            self.text_preview.insert("1.0", text)
+            self.text_preview.config(state="disabled")
+            self.preview_canvas.create_window(
+                0, 0, window=self.text_preview_frame, anchor="nw",
+                width=self.preview_canvas.winfo_width(),
+                height=self.preview_canvas.winfo_height(),
+                tags="text_window")
+
+        def on_error(e):
+            print(f"Text preview error: {e}")
+            self.show_generic_document_preview(file_path)
+
+        self.submit_preview(read_text_preview, file_path,
+                            on_done=on_read, on_error=on_error)
+
+    def on_text_preview_scroll(self, last):
+        """Loads the next chunk of the previewed text when the view gets
+        close to the end of what has been read."""
+        state = self.text_preview_state
+        if state is None or state["loading"] or state["offset"] is None \
+                or last < 0.9:
+            return
+        state["loading"] = True
+
+        def on_chunk(result):
+            if self.text_preview_state is not state:
+                return
+            text, state["offset"] = result
+            state["loading"] = False
+            self.text_preview.config(state="normal")
+            self.text_preview.insert("end", text)
+            self.text_preview.config(state="disabled")
+
+        def on_error(e):
+            print(f"Text preview error: {e}")
+            state["offset"] = None
+
+        self.scheduler.submit(read_text_chunk, state["path"], state["offset"],
+                              state["encoding"], TEXT_CHUNK_BYTES,
+                              priority=PRIORITY_HIGH, on_done=on_chunk,
+                              on_error=on_error)
+
+    def show_pdf_controls(self):
+        """Shows page navigation for the previewed PDF."""
+        self.pdf_page_var.set(
+            f"Page {self.pdf_page + 1} of {self.pdf_page_count}")
+        self.pdf_prev_button.config(
+            state="normal" if self.pdf_page > 0 else "disabled")
+        self.pdf_next_button.config(
+            state="normal" if self.pdf_page + 1 < self.pdf_page_count
+            else "disabled")
+        if not self.pdf_page_label.winfo_ismapped():
+            self.pdf_prev_button.pack(side="left", padx=5)
+            self.pdf_page_label.pack(side="left", padx=5)
+            self.pdf_next_button.pack(side="left", padx=5)
+
+    def hide_pdf_controls(self):
+        """Hides page navigation and stops pending page renders."""
+        if self.pdf_token is not None:
+            self.pdf_token.cancel()
+            self.pdf_token = None
+        self.pdf_page_count = 0
+        self.pdf_prev_button.pack_forget()
+        self.pdf_page_label.pack_forget()
+        self.pdf_next_button.pack_forget()
+
+    def show_pdf_page(self, page_number):
+        """Shows another page of the previewed PDF, from memory if it was
+        prefetched, else rendered in the background."""
+        if not self.current_file or not \
+                0 <= page_number < self.pdf_page_count:
+            return
+        file_path = self.current_file["path"]
+        width = self.preview_canvas.winfo_width()
+        height = self.preview_canvas.winfo_height()
+        self.pdf_page = page_number
+        self.show_pdf_controls()
+
+        def on_rendered(result):
+            self.preview_image_from_pil(result[0])
+            self.prefetch_pdf_pages(file_path, width, height)
+
+        cached = self.pdf_renderer.peek(file_path, page_number, width, height)
+        if cached is not None:
+            on_rendered(cached)
+            return
+        if self.pdf_token is not None:
+            self.pdf_token.cancel()
+        self.pdf_token = CancelToken(PREVIEW_DEADLINE)
+        self.scheduler.submit(self.pdf_renderer.render, file_path,
+                              page_number, width, height, lane=PDF_LANE,
+                              token=self.pdf_token, on_done=on_rendered,
+                              on_error=self.show_preview_error)
+
+    def prefetch_pdf_pages(self, file_path, width, height):
+        """Renders the pages next to the current one in the background."""
+        if self.pdf_token is not None:
+            self.pdf_token.cancel()
+        self.pdf_token = CancelToken()
+        for page_number in (self.pdf_page + 1, self.pdf_page - 1):
+            if 0 <= page_number < self.pdf_page_count and \
+                    self.pdf_renderer.peek(file_path, page_number, width,
+                                           height) is None:
+                self.scheduler.submit(self.pdf_renderer.render, file_path,
+                                      page_number, width, height,
+                                      lane=PDF_LANE, token=self.pdf_token)
+
+    def show_generic_document_preview(self, file_path):
+        """Helper function to display a placeholder for documents."""
         file_name = os.path.basename(file_path)
         self.preview_canvas.create_text(
             150, 100, text="📄 Document 📄",
@@ -1575,6 +5717,7 @@ class TagzApp:
                         global_files.append(
                             {
                                 "name": file_name,
+                                "name_lower": file_name.lower(),
                                 "basename": name,
                                 "path": file_path,
                                 "ext": ext.lower(),
@@ -1583,6 +5726,7 @@ class TagzApp:
                                 "type": file_type,
                                 "length": length,
                                 "modified": modified,
+                                "metadata": {},
                                 "tags": tags,
                                 "directory": os.path.dirname(
                                     file_path
@@ -1597,6 +5741,14 @@ class TagzApp:
         return global_files
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--search":
+        sys.exit(run_headless_search(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark-suggestions":
+        old, new, cached = benchmark_suggested_tags()
+        print(f"original: {old * 1000:.1f} ms, single pass: "
+              f"{new * 1000:.1f} ms ({old / new:.1f}x), "
+              f"memoized: {cached * 1000:.1f} ms")
+        sys.exit(0)
     root = tk.Tk()
     app = TagzApp(root)
     root.mainloop()